@@ -1,8 +1,30 @@
+import os
+# Keeps pygame's banner off stdout, where --benchmark writes its JSON report
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
 import pygame
 import random
 import sys
-import os
 import math
+import time
+import json
+import ast
+import zlib
+import sqlite3
+import struct
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+def command_line_value(flag, env_var):
+    # Value given as --flag=VALUE, falling back to the environment variable
+    return next((arg.split("=", 1)[1] for arg in sys.argv[1:] if arg.startswith(flag + "=")), os.environ.get(env_var) or None)
+
+# Headless mode runs the simulation with no window or audio output (CI soak tests and benchmarks)
+BENCHMARK = "--benchmark" in sys.argv or os.environ.get("STAR_FIGHTER_BENCHMARK") == "1"
+HEADLESS = BENCHMARK or "--headless" in sys.argv or os.environ.get("STAR_FIGHTER_HEADLESS") == "1"
+if HEADLESS:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
 
 # Init
 pygame.init()
@@ -20,6 +42,10 @@ GAME_OVER_SOUND = None
 DEBUG_PRINT = False
 fullscreen_debounce_timer = 0
 FULLSCREEN_DEBOUNCE_DELAY = 500  # milliseconds
+# Integer scaling keeps pixels square and crisp in fullscreen, falling back to
+# fractional scaling when the screen is smaller than the game
+INTEGER_SCALING = "--integer-scaling" in sys.argv or os.environ.get("STAR_FIGHTER_INTEGER_SCALING") == "1"
+SCALED_SURFACE = None  # Preallocated fullscreen scale target, sized per display mode
 
 # Screen
 WIDTH, HEIGHT = 600, 900
@@ -27,47 +53,9 @@ GAME_SURFACE = pygame.Surface((WIDTH, HEIGHT))
 SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Star Fighter")
 
-# Background music setup
-def load_music(file_path):
-    try:
-        pygame.mixer.music.load(file_path)
-    except pygame.error:
-        pass
-
-def play_menu_music():
-    global is_menu_music_playing
-    if not is_menu_music_playing:
-        try:
-            # Stop game over sound and music
-            if GAME_OVER_SOUND:
-                GAME_OVER_SOUND.stop()
-            pygame.mixer.music.stop()
-            load_music("assets/main_menu.mp3")
-            pygame.mixer.music.play(-1)
-            is_menu_music_playing = True
-        except pygame.error as e:
-            if DEBUG_PRINT:
-                print(f"Error playing menu music: {e}")
-            is_menu_music_playing = False
-
-def play_game_music():
-    global is_menu_music_playing
-    try:
-        # Stop game over sound and music
-        if GAME_OVER_SOUND:
-            GAME_OVER_SOUND.stop()
-        pygame.mixer.music.fadeout(500)
-        load_music("assets/game_music.mp3")
-        pygame.mixer.music.set_volume(0.3)
-        pygame.mixer.music.play(-1)
-        is_menu_music_playing = False
-    except pygame.error as e:
-        if DEBUG_PRINT:
-            print(f"Error playing game music: {e}")
-
 # Function to calculate scaling and offsets for centering
 def update_fullscreen_scaling():
-    global SCALE_FACTOR, OFFSET_X, OFFSET_Y
+    global SCALE_FACTOR, OFFSET_X, OFFSET_Y, SCALED_SURFACE
     if IS_FULLSCREEN:
         # Get the monitor's resolution
         display_info = pygame.display.Info()
@@ -84,6 +72,8 @@ def update_fullscreen_scaling():
         
         # Ensure scale factor is positive
         SCALE_FACTOR = max(0.1, SCALE_FACTOR)
+        if INTEGER_SCALING and SCALE_FACTOR >= 1:
+            SCALE_FACTOR = math.floor(SCALE_FACTOR)
         
         # Calculate the scaled game dimensions
         scaled_width = int(WIDTH * SCALE_FACTOR)
@@ -92,11 +82,17 @@ def update_fullscreen_scaling():
         # Calculate offsets to center the game
         OFFSET_X = (screen_width - scaled_width) // 2
         OFFSET_Y = (screen_height - scaled_height) // 2
+
+        # Scale into the same surface every frame, and paint the letterbox bars
+        # once here since render_game only ever touches the centered area
+        SCALED_SURFACE = pygame.Surface((scaled_width, scaled_height), 0, GAME_SURFACE)
+        SCREEN.fill(BLACK)
     else:
         # Reset for windowed mode
         SCALE_FACTOR = 1.0
         OFFSET_X = 0
         OFFSET_Y = 0
+        SCALED_SURFACE = None
     
     if DEBUG_PRINT:
         print(f"Scaling: IS_FULLSCREEN={IS_FULLSCREEN}, SCALE_FACTOR={SCALE_FACTOR}, OFFSET_X={OFFSET_X}, OFFSET_Y={OFFSET_Y}")
@@ -117,6 +113,7 @@ def toggle_fullscreen():
                 SCREEN = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
             # Update scaling parameters
             update_fullscreen_scaling()
+            refresh_display_format()
             # Force display update
             render_game()
             # Reset debounce timer
@@ -129,16 +126,31 @@ def toggle_fullscreen():
             IS_FULLSCREEN = not IS_FULLSCREEN  # Revert state on failure
             SCREEN = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
             update_fullscreen_scaling()
+            refresh_display_format()
             render_game()
             fullscreen_debounce_timer = current_time
 
-# Function to render the game surface to the screen
-def render_game():
+# Function to render the game surface to the screen. In windowed mode a list
+# of rects limits the copy and display update to those regions.
+present_count = 0
+
+def render_game(rects=None):
+    global present_count
+    present_count += 1
+    # A running transition is composited on top and always presents the whole frame
+    update_transition()
+    if transition:
+        transition.draw(GAME_SURFACE)
+        rects = None
     # Scale and blit the GAME_SURFACE to the SCREEN with centering
     if IS_FULLSCREEN:
-        scaled_surface = pygame.transform.scale(GAME_SURFACE, (int(WIDTH * SCALE_FACTOR), int(HEIGHT * SCALE_FACTOR)))
-        SCREEN.fill(BLACK)  # Clear screen with black (letterboxes)
-        SCREEN.blit(scaled_surface, (OFFSET_X, OFFSET_Y))
+        pygame.transform.scale(GAME_SURFACE, SCALED_SURFACE.get_size(), SCALED_SURFACE)
+        SCREEN.blit(SCALED_SURFACE, (OFFSET_X, OFFSET_Y))
+    elif rects is not None:
+        for rect in rects:
+            SCREEN.blit(GAME_SURFACE, rect, rect)
+        pygame.display.update(rects)
+        return
     else:
         SCREEN.blit(GAME_SURFACE, (0, 0))
     pygame.display.flip()
@@ -154,25 +166,256 @@ ORANGE = (255, 165, 0)
 MAGENTA = (255, 0, 255)
 PURPLE = (128, 0, 128)
 
+# Scene transitions: fades, level cards and the pre-game countdown are timed
+# overlay states that render_game draws over whatever the current loop drew,
+# so every loop keeps pumping events while one runs. Any key skips a skippable
+# transition. Cards are composed once into the preallocated overlay, so each
+# frame costs a single blit.
+TRANSITION_SURFACE = pygame.Surface((WIDTH, HEIGHT))
+FADE_DURATION = 500  # milliseconds
+transition = None
+
+class Transition:
+    def __init__(self, duration, card=None, color=BLACK, pauses_game=False, skippable=True, assets=None, then=None):
+        self.duration = duration
+        self.card = card  # Draws the card onto the overlay; None fades from color to the scene
+        self.color = color
+        self.pauses_game = pauses_game  # GameplayScene holds the simulation while it shows
+        self.skippable = skippable
+        self.assets = assets  # AssetLoader to wait for, with its progress drawn on the card
+        self.then = then
+        self.start = 0
+
+    def begin(self):
+        self.start = pygame.time.get_ticks()
+        TRANSITION_SURFACE.set_alpha(None)
+        TRANSITION_SURFACE.fill(self.color)
+        if self.card:
+            self.card(TRANSITION_SURFACE)
+
+    def finished(self):
+        if self.assets and not self.assets.done():
+            return False
+        return pygame.time.get_ticks() - self.start >= self.duration
+
+    def can_skip(self):
+        return self.skippable and not (self.assets and not self.assets.done())
+
+    def draw(self, surface):
+        if self.assets:
+            self.assets.poll()
+            draw_loading_bar(TRANSITION_SURFACE, self.assets.progress())
+        if not self.card:
+            elapsed = pygame.time.get_ticks() - self.start
+            TRANSITION_SURFACE.set_alpha(max(0, 255 - 255 * elapsed // self.duration))
+        surface.blit(TRANSITION_SURFACE, (0, 0))
+
+def start_transition(new_transition):
+    global transition
+    if HEADLESS:
+        return
+    transition = new_transition
+    transition.begin()
+
+def update_transition():
+    # Moves on to the chained transition once the current one has run its course
+    global transition
+    while transition and transition.finished():
+        transition = transition.then
+        if transition:
+            transition.begin()
+
+def skip_transition():
+    global transition
+    transition = None
+
+def game_paused_by_transition():
+    update_transition()
+    return transition is not None and transition.pauses_game
+
+def poll_events():
+    # Every loop reads its events through here: a key press that skips the
+    # running transition is consumed instead of reaching the scene
+    events = pygame.event.get()
+    if transition and transition.can_skip():
+        for i, event in enumerate(events):
+            if event.type == pygame.KEYDOWN and event.key != pygame.K_F11:
+                skip_transition()
+                return events[:i] + events[i + 1:]
+    return events
+
 # Load sound and image
 def load_image(path, fallback_color=BLACK, size=(50, 50)):
     try:
         return pygame.image.load(path)
-    except pygame.error:
+    except (pygame.error, FileNotFoundError):
         surf = pygame.Surface(size)
         surf.fill(fallback_color)
         return surf
 
 def load_sound(path):
+    if HEADLESS:
+        return None
     try:
         return pygame.mixer.Sound(path)
-    except pygame.error:
+    except (pygame.error, FileNotFoundError):
         return None
 
+# Sound effects: play_sound() only queues a request. Once per frame the
+# dispatcher plays every queued sound once, however often it was requested,
+# on a reserved pool of mixer channels with a per-sound and a global voice
+# limit. Channel 0 stays reserved for the game over sound and the music
+# tracks each keep a channel of their own.
+MIXER_CHANNELS = 16
+SOUND_VOICE_LIMIT = 3  # Voices a single sound may hold at once
+MUSIC_TRACKS = {  # Track -> (channel, volume)
+    "MENU_MUSIC": (1, 1.0),
+    "GAME_MUSIC": (2, 0.3),
+}
+MUSIC_FADE_MS = 500
+
+class SoundDispatcher:
+    def __init__(self):
+        pygame.mixer.set_num_channels(MIXER_CHANNELS)
+        # Reserve every channel so nothing plays on one the dispatcher did not pick
+        pygame.mixer.set_reserved(MIXER_CHANNELS)
+        self.channels = [pygame.mixer.Channel(i) for i in range(1 + len(MUSIC_TRACKS), MIXER_CHANNELS)]
+        self.started = [0] * len(self.channels)  # Start time of each channel's current voice
+        self.pending = []  # Sounds requested since the last flush, without duplicates
+
+    def request(self, sound):
+        if sound and sound not in self.pending:
+            self.pending.append(sound)
+
+    def flush(self):
+        if not self.pending:
+            return
+        now = pygame.time.get_ticks()
+        for sound in self.pending:
+            voices = [i for i, channel in enumerate(self.channels) if channel.get_busy() and channel.get_sound() is sound]
+            if len(voices) >= SOUND_VOICE_LIMIT:
+                # Retrigger this sound's oldest voice rather than stacking another copy
+                index = min(voices, key=self.started.__getitem__)
+            else:
+                free = [i for i, channel in enumerate(self.channels) if not channel.get_busy()]
+                # With the pool full, the oldest voice of any sound is stolen
+                index = free[0] if free else min(range(len(self.channels)), key=self.started.__getitem__)
+            self.channels[index].play(sound)
+            self.started[index] = now
+        self.pending.clear()
+
+    def stop(self):
+        self.pending.clear()
+        for channel in self.channels:
+            channel.stop()
+
+audio = SoundDispatcher()
+
+def play_sound(sound):
+    # Missing sounds (and every sound in headless mode) are silently skipped
+    audio.request(sound)
+
+# Background music: the tracks are decoded into Sounds by the asset loader
+# and loop on their own channels, so switching tracks never loads a stream on
+# the game thread. Changes crossfade by ramping channel volumes each frame; a
+# paused track fades out and pauses in place, resuming where it left off.
+class MusicManager:
+    def __init__(self):
+        self.current = None
+        self.levels = dict.fromkeys(MUSIC_TRACKS, 0.0)  # Fade level of each track, 0 to 1
+        self.started = set()  # Tracks loaded onto their channel (playing or paused)
+        self.paused = set()  # Tracks to pause rather than stop once faded out
+
+    def channel(self, name):
+        return pygame.mixer.Channel(MUSIC_TRACKS[name][0])
+
+    def play(self, name, pause_current=False, restart=False):
+        if HEADLESS:
+            return
+        if restart and name in self.started:
+            self.channel(name).stop()
+            self.started.discard(name)
+            self.levels[name] = 0.0
+        elif name == self.current:
+            return
+        if pause_current and self.current:
+            self.paused.add(self.current)
+        self.current = name
+        self.paused.discard(name)
+        # The game over sound fades out with the old track
+        GAME_OVER_CHANNEL.fadeout(MUSIC_FADE_MS)
+
+    def stop(self):
+        self.current = None
+        self.paused.clear()
+
+    def fading(self):
+        return any(self.levels[name] != (name == self.current) for name in self.started)
+
+    def update(self, frame_ms):
+        if self.current and self.current not in self.started and asset_loader.futures[self.current].done():
+            # Decoded in the background, so installing it here does not block
+            asset_loader.require(self.current)
+            sound = globals()[self.current]
+            if sound:
+                self.channel(self.current).set_volume(0)
+                self.channel(self.current).play(sound, loops=-1)
+                self.started.add(self.current)
+        step = frame_ms / MUSIC_FADE_MS
+        for name in list(self.started):
+            channel = self.channel(name)
+            if name == self.current:
+                if self.levels[name] == 0:
+                    channel.unpause()
+                self.levels[name] = min(1.0, self.levels[name] + step)
+            else:
+                self.levels[name] = max(0.0, self.levels[name] - step)
+                if self.levels[name] == 0:
+                    if name in self.paused:
+                        channel.pause()
+                    else:
+                        channel.stop()
+                        self.started.discard(name)
+            channel.set_volume(self.levels[name] * MUSIC_TRACKS[name][1])
+
+music = MusicManager()
+
 # FPS
 FPS = 60
 clock = pygame.time.Clock()
 
+# Fixed simulation timestep: every frame-counted timer assumes 60 ticks per second
+TICK_MS = 1000 / FPS
+MAX_TICKS_PER_FRAME = 5  # Catch-up cap so one slow frame never spirals
+
+# Gameplay randomness: every subsystem draws from its own stream, all derived
+# from one run seed, so a run is reproduced exactly by its seed and extra draws
+# in one subsystem never shift another's sequence. Pass --seed=N (or set
+# STAR_FIGHTER_SEED) to pin the seed; otherwise each game picks a fresh one.
+# Every RNG_EPOCH_TICKS of play the streams are reseeded from the run seed and
+# the tick, so a snapshot taken on an epoch boundary (every replay keyframe)
+# needs no stream state: that is about 12 KB of the 14 KB a snapshot takes.
+RNG_STREAMS = ("spawn", "ai", "loot", "hazards", "scenery")
+RNG_EPOCH_TICKS = 30 * FPS
+RUN_SEED = command_line_value("--seed", "STAR_FIGHTER_SEED")
+RUN_SEED = int(RUN_SEED) if RUN_SEED is not None else None
+
+class RngService:
+    def __init__(self, seed=None):
+        self.reseed(seed)
+
+    def reseed(self, seed=None):
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        for name in RNG_STREAMS:
+            # String seeds hash the same in every process
+            setattr(self, name, random.Random(f"{self.seed}:{name}"))
+
+    def start_epoch(self, tick):
+        for name in RNG_STREAMS:
+            getattr(self, name).seed(f"{self.seed}:{name}:{tick}")
+
+rng = RngService(RUN_SEED)
+
 # Cached surfaces
 font = pygame.font.SysFont("arial", 24)
 MUZZLE_FLASH_SURFACE = pygame.Surface((10, 10), pygame.SRCALPHA)
@@ -189,64 +432,229 @@ SNIPER_BULLET_SURFACE = pygame.Surface((10, 144), pygame.SRCALPHA)
 pygame.draw.rect(SNIPER_BULLET_SURFACE, (255, 50, 50, 120), (0, 0, 10, 144))
 pygame.draw.rect(SNIPER_BULLET_SURFACE, RED, (3, 24, 4, 96))
 pygame.draw.rect(SNIPER_BULLET_SURFACE, WHITE, (4, 26, 2, 92))
+BOMB_FLASH_SURFACE = pygame.Surface((WIDTH, HEIGHT))
+BOMB_FLASH_SURFACE.fill(WHITE)
 
-# Load assets
-PLAYER_IMGS = [load_image(f"assets/player{i}.png", RED) for i in range(1, 5)]
-BULLET_IMG = load_image("assets/bullet.png")
-ENEMY_IMGS = [load_image(f"assets/enemy{i}.png", RED) for i in range(1, 8)]
-BOSS_IMGS = [load_image(f"assets/boss{i}.png", RED) for i in range(1, 9)]
-BACKGROUNDS = [load_image(f"assets/background{i}.png", BLACK, (WIDTH, HEIGHT)) for i in range(1, 11)] or [pygame.Surface((WIDTH, HEIGHT)).fill(BLACK)]
+# Load assets: the start and loading screens are decoded up front so the window
+# shows a picture straight away; everything else is decoded on a worker pool
+# and installed into its global the first time a scene asks for it
 START_SCREEN = load_image("assets/start_screen.png")
-MAIN_MENU_IMG = load_image("assets/main_menu.png")
-HIGH_SCORES_IMG = load_image("assets/high_scores.png")
-CONTROLS_IMG = load_image("assets/controls.png")
-ABOUT_IMG = load_image("assets/about.png", BLACK, (WIDTH, HEIGHT))
-SELECT_SHIP_IMG = load_image("assets/select_ship.png")
+GAME_SURFACE.blit(START_SCREEN, ((WIDTH - START_SCREEN.get_width()) // 2, (HEIGHT - START_SCREEN.get_height()) // 2))
+render_game()
 LOADING_SCREEN = load_image("assets/loading_screen.png")
-ASTEROID_IMG = load_image("assets/asteroid.png")
-HEALTH_PACK_IMG = load_image("assets/health_pack.png")
-POWERUP_IMG = load_image("assets/powerup.png")
-SHIELD_IMG = load_image("assets/shield_powerup.png")
-MISSILE_POWERUP_IMG = load_image("assets/missile_powerup.png")
-MISSILE_IMG = load_image("assets/missile.png")
-HEART_IMG = load_image("assets/heart.png")
-GAME_OVER_IMG = load_image("assets/game_over.png")
-GAME_PAUSED_IMG = load_image("assets/game_paused.png")
-DOUBLE_ICON = pygame.transform.scale(load_image("assets/powerup.png"), (24, 24))
-SHIELD_ICON = pygame.transform.scale(load_image("assets/shield_powerup.png"), (24, 24))
-MISSILE_ICON = pygame.transform.scale(load_image("assets/missile_powerup.png"), (24, 24))
-SPEED_POWERUP_IMG = load_image("assets/speed_powerup.png")
-SPEED_ICON = pygame.transform.scale(load_image("assets/speed_powerup.png"), (24, 24))
-BOMB_POWERUP_IMG = load_image("assets/bomb_powerup.png")
-BOMB_ICON = pygame.transform.scale(load_image("assets/bomb_powerup.png"), (24, 24))
-
-# Load sounds
-SHOOT_SOUND = load_sound("assets/shoot.wav")
-ASTEROID_COLLISION_SOUND = load_sound("assets/asteroid_collision.wav")
-EXPLOSION_SOUND = load_sound("assets/explosion.wav")
-BOMB_EXPLOSION_SOUND = load_sound("assets/bomb_explosion.wav")
-PLAYER_EXPLOSION_SOUND = load_sound("assets/player_explosion.wav")
-BOSS_EXPLOSION_SOUND = load_sound("assets/boss_explosion.wav")
-BOSS_SHOOT_SOUND = load_sound("assets/boss_shoot.wav")
-ENEMY_BOMB_SOUND = load_sound("assets/enemy_bomb.wav")
-SNIPER_LASER_SOUND = load_sound("assets/sniper_shoot.wav")
-FIGHTER_SHOOT_SOUND = load_sound("assets/fighter_shoot.wav")
-LEECH_TETHER_SOUND = load_sound("assets/leech_tether.wav")
-ARTILLERY_SHOT_SOUND = load_sound("assets/artillery_shot.wav")
-MISSILE_SHOT_SOUND = load_sound("assets/missile_shot.wav")
-POWERUP_COLLECT_SOUND = load_sound("assets/powerup_collect.wav")
-HEALTH_PACK_COLLECT_SOUND = load_sound("assets/health_pack_collect.wav")
-GAME_OVER_SOUND = load_sound("assets/game_over.mp3")
-PLAYER_COLLISION_SOUND = load_sound("assets/player_collision.wav")
+
+def load_icon(path):
+    return pygame.transform.scale(load_image(path), (24, 24))
+
+ASSET_MANIFEST = {
+    "PLAYER_IMGS": lambda: [load_image(f"assets/player{i}.png", RED) for i in range(1, 5)],
+    "SELECT_SHIP_IMG": lambda: load_image("assets/select_ship.png"),
+    "MAIN_MENU_IMG": lambda: load_image("assets/main_menu.png"),
+    "HIGH_SCORES_IMG": lambda: load_image("assets/high_scores.png"),
+    "CONTROLS_IMG": lambda: load_image("assets/controls.png"),
+    "ABOUT_IMG": lambda: load_image("assets/about.png", BLACK, (WIDTH, HEIGHT)),
+    "BULLET_IMG": lambda: load_image("assets/bullet.png"),
+    "ENEMY_IMGS": lambda: [load_image(f"assets/enemy{i}.png", RED) for i in range(1, 8)],
+    "BOSS_IMGS": lambda: [load_image(f"assets/boss{i}.png", RED) for i in range(1, 9)],
+    "BACKGROUNDS": lambda: [load_image(f"assets/background{i}.png", BLACK, (WIDTH, HEIGHT)) for i in range(1, 11)] or [pygame.Surface((WIDTH, HEIGHT)).fill(BLACK)],
+    "ASTEROID_IMG": lambda: load_image("assets/asteroid.png"),
+    "HEALTH_PACK_IMG": lambda: load_image("assets/health_pack.png"),
+    "POWERUP_IMG": lambda: load_image("assets/powerup.png"),
+    "SHIELD_IMG": lambda: load_image("assets/shield_powerup.png"),
+    "MISSILE_POWERUP_IMG": lambda: load_image("assets/missile_powerup.png"),
+    "MISSILE_IMG": lambda: load_image("assets/missile.png"),
+    "HEART_IMG": lambda: load_image("assets/heart.png"),
+    "GAME_OVER_IMG": lambda: load_image("assets/game_over.png"),
+    "GAME_PAUSED_IMG": lambda: load_image("assets/game_paused.png"),
+    "DOUBLE_ICON": lambda: load_icon("assets/powerup.png"),
+    "SHIELD_ICON": lambda: load_icon("assets/shield_powerup.png"),
+    "MISSILE_ICON": lambda: load_icon("assets/missile_powerup.png"),
+    "SPEED_POWERUP_IMG": lambda: load_image("assets/speed_powerup.png"),
+    "SPEED_ICON": lambda: load_icon("assets/speed_powerup.png"),
+    "BOMB_POWERUP_IMG": lambda: load_image("assets/bomb_powerup.png"),
+    "BOMB_ICON": lambda: load_icon("assets/bomb_powerup.png"),
+    # Sounds
+    "SHOOT_SOUND": lambda: load_sound("assets/shoot.wav"),
+    "ASTEROID_COLLISION_SOUND": lambda: load_sound("assets/asteroid_collision.wav"),
+    "EXPLOSION_SOUND": lambda: load_sound("assets/explosion.wav"),
+    "BOMB_EXPLOSION_SOUND": lambda: load_sound("assets/bomb_explosion.wav"),
+    "PLAYER_EXPLOSION_SOUND": lambda: load_sound("assets/player_explosion.wav"),
+    "BOSS_EXPLOSION_SOUND": lambda: load_sound("assets/boss_explosion.wav"),
+    "BOSS_SHOOT_SOUND": lambda: load_sound("assets/boss_shoot.wav"),
+    "ENEMY_BOMB_SOUND": lambda: load_sound("assets/enemy_bomb.wav"),
+    "SNIPER_LASER_SOUND": lambda: load_sound("assets/sniper_shoot.wav"),
+    "FIGHTER_SHOOT_SOUND": lambda: load_sound("assets/fighter_shoot.wav"),
+    "LEECH_TETHER_SOUND": lambda: load_sound("assets/leech_tether.wav"),
+    "ARTILLERY_SHOT_SOUND": lambda: load_sound("assets/artillery_shot.wav"),
+    "MISSILE_SHOT_SOUND": lambda: load_sound("assets/missile_shot.wav"),
+    "POWERUP_COLLECT_SOUND": lambda: load_sound("assets/powerup_collect.wav"),
+    "HEALTH_PACK_COLLECT_SOUND": lambda: load_sound("assets/health_pack_collect.wav"),
+    "GAME_OVER_SOUND": lambda: load_sound("assets/game_over.mp3"),
+    "MENU_MUSIC": lambda: load_sound("assets/main_menu.mp3"),
+    "GAME_MUSIC": lambda: load_sound("assets/game_music.mp3"),
+    "PLAYER_COLLISION_SOUND": lambda: load_sound("assets/player_collision.wav"),
+}
+# Every manifest global is None until installed; play_sound() already skips None
+globals().update(dict.fromkeys(ASSET_MANIFEST))
+
+class AssetLoader:
+    def __init__(self, manifest, workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset-loader")
+        self.futures = {name: self.executor.submit(load) for name, load in manifest.items()}
+        self.installed = set()
+
+    def progress(self):
+        return sum(future.done() for future in self.futures.values()) / len(self.futures)
+
+    def done(self):
+        return len(self.installed) == len(self.futures)
+
+    def install(self, name):
+        # Runs on the main thread: display conversion and globals are not thread-safe
+        globals()[name] = self.futures[name].result()
+        self.installed.add(name)
+        if name in IMAGE_ASSET_NAMES:
+            convert_assets([name])
+
+    def require(self, *names):
+        # Blocks only on the assets that have not finished decoding yet
+        for name in names:
+            if name not in self.installed:
+                self.install(name)
+
+    def poll(self):
+        # Installs whatever the workers have finished without blocking
+        for name, future in self.futures.items():
+            if name not in self.installed and future.done():
+                self.install(name)
+        if self.done():
+            self.executor.shutdown(wait=False)
+
+    def require_all(self):
+        self.require(*self.futures)
+        self.executor.shutdown(wait=False)
+
+asset_loader = AssetLoader(ASSET_MANIFEST)
 
 # Precompute sin table for enemy movement
 SIN_TABLE = [math.sin(i * 0.05) * 3 for i in range(360)]
 
-# Background scroll
+# Precomputed animation frames, keyed by the enemy image they were built from:
+# the 10 Leech pulse scales and the Sniper blink alpha variants
+LEECH_PULSE_FRAMES = {}
+SNIPER_BLINK_FRAMES = {}
+
+def build_animation_caches():
+    LEECH_PULSE_FRAMES.clear()
+    SNIPER_BLINK_FRAMES.clear()
+    leech_image = ENEMY_IMGS[5]
+    frames = []
+    for pulse_timer in range(10):
+        pulse_scale = 1.0 + 0.05 * math.sin(pulse_timer * 0.628)
+        new_size = (int(leech_image.get_width() * pulse_scale), int(leech_image.get_height() * pulse_scale))
+        frames.append(pygame.transform.scale(leech_image, new_size))
+    LEECH_PULSE_FRAMES[leech_image] = frames
+    sniper_image = ENEMY_IMGS[4]
+    variants = {}
+    for alpha in (128, 255):
+        variants[alpha] = sniper_image.copy()
+        variants[alpha].set_alpha(alpha)
+    SNIPER_BLINK_FRAMES[sniper_image] = variants
+
+# Asset pipeline: every image is converted to the display pixel format so blits
+# skip per-pixel format conversion. Conversion is redone whenever a display
+# mode change alters that format.
+IMAGE_ASSET_NAMES = [
+    "PLAYER_IMGS", "BULLET_IMG", "ENEMY_IMGS", "BOSS_IMGS", "BACKGROUNDS",
+    "START_SCREEN", "MAIN_MENU_IMG", "HIGH_SCORES_IMG", "CONTROLS_IMG", "ABOUT_IMG",
+    "SELECT_SHIP_IMG", "LOADING_SCREEN", "ASTEROID_IMG", "HEALTH_PACK_IMG", "POWERUP_IMG",
+    "SHIELD_IMG", "MISSILE_POWERUP_IMG", "MISSILE_IMG", "HEART_IMG", "GAME_OVER_IMG",
+    "GAME_PAUSED_IMG", "DOUBLE_ICON", "SHIELD_ICON", "MISSILE_ICON", "SPEED_POWERUP_IMG",
+    "SPEED_ICON", "BOMB_POWERUP_IMG", "BOMB_ICON", "MUZZLE_FLASH_SURFACE", "TRAIL_SURFACE",
+    "SHIELD_SURFACE", "ARTILLERY_SHELL_SURFACE", "ARTILLERY_EXPLOSION_SURFACE",
+    "SNIPER_BULLET_SURFACE", "BOMB_FLASH_SURFACE",
+]
+display_format = None
+
+def convert_surface(surface):
+    colorkey = surface.get_colorkey()
+    if colorkey is not None:
+        # Colorkeyed art blits fastest run-length encoded
+        converted = surface.convert()
+        converted.set_colorkey(colorkey, pygame.RLEACCEL)
+    elif surface.get_flags() & pygame.SRCALPHA:
+        # Keep per-pixel alpha only where some pixel is actually transparent
+        alpha = pygame.surfarray.pixels_alpha(surface)
+        translucent = alpha.min() < 255
+        del alpha
+        converted = surface.convert_alpha() if translucent else surface.convert()
+    else:
+        converted = surface.convert()
+    return converted
+
+def convert_assets(names=None):
+    # Returns {id(old surface): new surface} for every surface that was replaced.
+    # With names, only those globals are converted (freshly installed assets).
+    global display_format
+    display_format = (SCREEN.get_bitsize(), SCREEN.get_masks())
+    replaced = {}
+    def convert(surface):
+        if id(surface) not in replaced:
+            replaced[id(surface)] = convert_surface(surface)
+        return replaced[id(surface)]
+    module = globals()
+    for name in names or IMAGE_ASSET_NAMES:
+        value = module[name]
+        if value is None:
+            continue  # Still loading; converted when installed
+        if isinstance(value, list):
+            value[:] = [convert(surface) for surface in value]
+        else:
+            module[name] = convert(value)
+    if names is None:
+        for key, surface in PROJECTILE_IMAGES.items():
+            PROJECTILE_IMAGES[key] = convert(surface)
+    if ENEMY_IMGS is not None and (names is None or "ENEMY_IMGS" in names):
+        build_animation_caches()
+    return replaced
+
+def refresh_display_format():
+    # Called after set_mode: reconvert only if the new mode changed the pixel format
+    global BG
+    if display_format == (SCREEN.get_bitsize(), SCREEN.get_masks()):
+        return
+    replaced = convert_assets()
+    def remap(surface):
+        return replaced.get(id(surface), surface)
+    if BG:
+        BG = remap(BG)
+    for sprite in [player] + [sprite for group in all_sprite_groups() for sprite in group]:
+        if sprite is None:
+            continue
+        if isinstance(sprite, Enemy):
+            # Animation frames were rebuilt, so map them by frame rather than by surface
+            blink_alpha = sprite.image.get_alpha() if sprite.is_sniper and sprite.image is not sprite.type_data[0] else None
+            sprite.type_data = (remap(sprite.type_data[0]),) + sprite.type_data[1:]
+            if sprite.is_leech:
+                sprite.image = LEECH_PULSE_FRAMES[sprite.type_data[0]][sprite.pulse_timer]
+            elif blink_alpha is not None:
+                sprite.image = SNIPER_BLINK_FRAMES[sprite.type_data[0]][blink_alpha]
+            else:
+                sprite.image = remap(sprite.image)
+        else:
+            sprite.image = remap(sprite.image)
+    projectiles.remap_images(remap)
+
+
+# Background scroll, in pixels per tick. --static-background (or
+# STAR_FIGHTER_STATIC_BACKGROUND=1, for kiosks) holds it still so gameplay
+# frames can use dirty-rect updates.
 bg_y = 0
+BG_SCROLL_PIXELS = 2
+STATIC_BACKGROUND = "--static-background" in sys.argv or os.environ.get("STAR_FIGHTER_STATIC_BACKGROUND") == "1"
+BG_SCROLL_SPEED = 0 if STATIC_BACKGROUND else BG_SCROLL_PIXELS
 
 # Game variables
-missile_hits_tracker = {}
 BG = None
 score = 0
 level = 1
@@ -269,26 +677,78 @@ delay_timer = 0
 selected_ship = None
 debug_mode = False
 fps_debug = False
-last_score = -1
-last_level = -1
-score_text = None
-level_text = None
-last_frame_time = 0
-is_menu_music_playing = False
 bomb_flash_timer = 0
 asteroid_spawn_timer = 0
+sim_tick = 0  # Ticks simulated since reset_game
 ASTEROID_SPAWN_DELAY = 90  # Spawn every 1.5 seconds at 60 FPS
 max_asteroids = 0  # Will be set based on level
 
+# Text rendering: rendered strings are kept in a bounded LRU cache, and digits
+# are blitted from a per-font glyph atlas so changing numbers (score, timers,
+# debug counters) never need a fresh font.render call
+TEXT_CACHE_SIZE = 256
+text_cache = OrderedDict()
+GLYPH_ATLAS_CHARS = "0123456789.-"
+glyph_atlases = {}
+
+def render_text(text_font, text, color, antialias=True):
+    key = (text_font, text, color, antialias)
+    surface = text_cache.get(key)
+    if surface is None:
+        surface = text_cache[key] = text_font.render(text, antialias, color)
+        if len(text_cache) > TEXT_CACHE_SIZE:
+            text_cache.popitem(last=False)
+    else:
+        text_cache.move_to_end(key)
+    return surface
+
+def glyph_atlas(text_font, color, antialias=True):
+    # One surface holding every atlas glyph, plus each glyph's source rect
+    key = (text_font, color, antialias)
+    atlas = glyph_atlases.get(key)
+    if atlas is None:
+        image = text_font.render(GLYPH_ATLAS_CHARS, antialias, color)
+        glyphs = {}
+        for i, char in enumerate(GLYPH_ATLAS_CHARS):
+            left = text_font.size(GLYPH_ATLAS_CHARS[:i])[0] if i else 0
+            right = text_font.size(GLYPH_ATLAS_CHARS[:i + 1])[0]
+            glyphs[char] = pygame.Rect(left, 0, right - left, image.get_height())
+        atlas = glyph_atlases[key] = (image, glyphs)
+    return atlas
+
+def blit_text(surface, text_font, text, color, pos, antialias=True):
+    # Draws text with numeric runs taken from the glyph atlas; returns the drawn width
+    image, glyphs = glyph_atlas(text_font, color, antialias)
+    x, y = pos
+    start = 0
+    for i, char in enumerate(text):
+        if char not in glyphs:
+            continue
+        if i > start:
+            run = render_text(text_font, text[start:i], color, antialias)
+            surface.blit(run, (x, y))
+            x += run.get_width()
+        area = glyphs[char]
+        surface.blit(image, (x, y), area)
+        x += area.width
+        start = i + 1
+    if start < len(text):
+        run = render_text(text_font, text[start:], color, antialias)
+        surface.blit(run, (x, y))
+        x += run.get_width()
+    return x - pos[0]
+
 # Utility functions
 def fade_screen(color=(0, 0, 0)):
-    fade_surface = pygame.Surface((WIDTH, HEIGHT))
-    fade_surface.fill(color)
-    for alpha in range(0, 255, 5):
-        fade_surface.set_alpha(alpha)
-        GAME_SURFACE.blit(fade_surface, (0, 0))
-        render_game()
-        pygame.time.delay(10)
+    # Non-blocking: the next frames fade in from color
+    start_transition(Transition(FADE_DURATION, color=color))
+
+def draw_loading_card(surface):
+    surface.blit(LOADING_SCREEN, ((WIDTH - LOADING_SCREEN.get_width()) // 2, 0))
+
+def pregame_countdown():
+    # The countdown doubles as the wait for any assets still decoding
+    return Transition(3000, card=draw_loading_card, pauses_game=True, assets=asset_loader)
 
 def draw_health_bar(surface, x, y, current_health, max_health):
     bar_width = 150
@@ -306,70 +766,419 @@ def draw_timer_bar(surface, x, y, timer, max_timer, color):
     pygame.draw.rect(surface, color, (x, y, fill, bar_height))
     pygame.draw.rect(surface, WHITE, (x, y, bar_width, bar_height), 2)
 
+def draw_loading_bar(surface, progress):
+    bar_width = WIDTH - 200
+    bar_height = 12
+    x, y = 100, HEIGHT - 60
+    pygame.draw.rect(surface, GREEN, (x, y, progress * bar_width, bar_height))
+    pygame.draw.rect(surface, WHITE, (x, y, bar_width, bar_height), 2)
+
+def debug_counts():
+    # What the F2 overlay lists; the trace recorder logs it every frame
+    return {
+        "player_health": player.health,
+        "player_lives": player.lives,
+        "player_invincible": player.invincible,
+        "player_shield": player.shield,
+        "player_missile_shot": player.missile_shot,
+        "player_speed_boost": player.speed_boost,
+        "player_tethered": player.is_tethered,
+        "player_bomb_count": player.bomb_count,
+        "boss_health": boss_group.sprites()[0].health if boss_group else None,
+        "wave": wave,
+        "max_waves": max_waves,
+        "level": level,
+        "enemies_spawned": enemies_spawned,
+        "enemies_per_wave": enemies_per_wave,
+        "boss_spawned": boss_spawned,
+        "level_transition_delay": level_transition_delay,
+        "delay_timer": delay_timer,
+        "bullets": len(bullets),
+        "missiles": len(missiles),
+        "boss_bullets": projectiles.count(KIND_BOSS_BULLET),
+        "enemy_bullets": projectiles.count(KIND_ENEMY_BULLET),
+        "bombs": projectiles.count(KIND_BOMB),
+        "artillery_shells": len(artillery_shells),
+        "speed_powerups": len(speed_powerups),
+        "bomb_powerups": len(bomb_powerups),
+    }
+
 def draw_debug_info():
     if not debug_mode:
         return
+    counts = debug_counts()
+    boss_health = counts["boss_health"]
     debug_texts = [
-        (f"Player Health: {player.health}", None),
-        (f"Player Lives: {player.lives}", None),
-        (f"Player Invincible: {player.invincible}", None),
-        (f"Player Shield: {player.shield}", None),
-        (f"Player Missile Shot: {player.missile_shot}", None),
-        (f"Player Speed Boost: {player.speed_boost}", None),
-        (f"Player Tethered: {player.is_tethered}", None),
-        (f"Player Bomb Count: {player.bomb_count}", None),
-        (f"Boss Health: {boss_group.sprites()[0].health if boss_group else 'N/A'}", None),
-        (f"Wave: {wave}/{max_waves}, Level: {level}", None),
-        (f"Enemies Spawned: {enemies_spawned}/{enemies_per_wave}", None),
-        (f"Boss Spawned: {boss_spawned}", None),
-        (f"Level Transition Delay: {level_transition_delay}", None),
-        (f"Delay Timer: {delay_timer}", None),
-        (f"Bullets: {len(bullets)}", None),
-        (f"Missiles: {len(missiles)}", None),
-        (f"Boss Bullets: {len(boss_bullets)}", None),
-        (f"Enemy Bullets: {len(enemy_bullets)}", None),
-        (f"Bombs: {len(bombs)}", None),
-        (f"Artillery Shells: {len(artillery_shells)}", None),
-        (f"Speed Power-ups: {len(speed_powerups)}", None),
-        (f"Bomb Power-ups: {len(bomb_powerups)}", None)
+        f"Player Health: {counts['player_health']}",
+        f"Player Lives: {counts['player_lives']}",
+        f"Player Invincible: {counts['player_invincible']}",
+        f"Player Shield: {counts['player_shield']}",
+        f"Player Missile Shot: {counts['player_missile_shot']}",
+        f"Player Speed Boost: {counts['player_speed_boost']}",
+        f"Player Tethered: {counts['player_tethered']}",
+        f"Player Bomb Count: {counts['player_bomb_count']}",
+        f"Boss Health: {boss_health if boss_health is not None else 'N/A'}",
+        f"Wave: {counts['wave']}/{counts['max_waves']}, Level: {counts['level']}",
+        f"Enemies Spawned: {counts['enemies_spawned']}/{counts['enemies_per_wave']}",
+        f"Boss Spawned: {counts['boss_spawned']}",
+        f"Level Transition Delay: {counts['level_transition_delay']}",
+        f"Delay Timer: {counts['delay_timer']}",
+        f"Bullets: {counts['bullets']}",
+        f"Missiles: {counts['missiles']}",
+        f"Boss Bullets: {counts['boss_bullets']}",
+        f"Enemy Bullets: {counts['enemy_bullets']}",
+        f"Bombs: {counts['bombs']}",
+        f"Artillery Shells: {counts['artillery_shells']}",
+        f"Speed Power-ups: {counts['speed_powerups']}",
+        f"Bomb Power-ups: {counts['bomb_powerups']}"
     ]
-    for i, (text, cached) in enumerate(debug_texts):
-        if not cached:
-            cached = font.render(text, True, YELLOW)
-            debug_texts[i] = (text, cached)
-        GAME_SURFACE.blit(cached, (10, 160 + i * 30))
+    for i, text in enumerate(debug_texts):
+        blit_text(GAME_SURFACE, font, text, YELLOW, (10, 160 + i * 30))
+
+# Frame profiler for the F1 overlay: each phase of a gameplay frame is timed
+# with perf_counter marks, the last PROFILE_WINDOW frames are kept, and the
+# overlay shows the newest frame as a stacked bar against the frame budget plus
+# each phase's p50/p99. A mark charges the time since the previous mark to its
+# phase, so the phases add up to the whole frame. The profiler is enabled while
+# the overlay is shown or a trace is recorded; otherwise a mark is one flag
+# check.
+PROFILE_PHASES = ("input", "waves", "updates", "collisions", "pickups", "projectiles", "autosave", "audio",
+                  "background", "sprites", "hud", "present")
+(PHASE_INPUT, PHASE_WAVES, PHASE_UPDATES, PHASE_COLLISIONS, PHASE_PICKUPS, PHASE_PROJECTILES, PHASE_AUTOSAVE,
+ PHASE_AUDIO, PHASE_BACKGROUND, PHASE_SPRITES, PHASE_HUD, PHASE_PRESENT) = range(len(PROFILE_PHASES))
+PROFILE_COLORS = ((200, 200, 200), (255, 160, 0), (0, 200, 255), (255, 50, 50), (255, 0, 255),
+                  (255, 255, 0), (160, 80, 40), (255, 140, 180), (90, 90, 255), (0, 255, 0), (0, 160, 120),
+                  (255, 255, 255))
+PROFILE_WINDOW = 240  # Frames the percentiles cover
+PROFILE_SUMMARY_FRAMES = 30  # Percentiles are recomputed this often, so they stay readable
+PROFILE_FONT = pygame.font.SysFont("arial", 16)
+PROFILE_BAR_RECT = pygame.Rect(10, 162, WIDTH - 20, 12)  # Spans two frame budgets
+PROFILE_TABLE_RECT = pygame.Rect(WIDTH - 200, 180, 190, 18 * (len(PROFILE_PHASES) + 1))
+
+class FrameProfiler:
+    def __init__(self):
+        self.history = np.zeros((PROFILE_WINDOW, len(PROFILE_PHASES)))  # Seconds per phase, a ring of frames
+        self.frames = 0
+        self.current = [0.0] * len(PROFILE_PHASES)
+        self.start = self.last = 0.0
+        self.summary = None  # (p50, p99) milliseconds per phase
+        self.enabled = False
+
+    def begin_frame(self):
+        # Runs even while disabled, so enabling it mid-frame starts from a clean mark
+        self.current = [0.0] * len(PROFILE_PHASES)
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[phase] += now - self.last
+        if tracer.spans:
+            tracer.buffer.append((TRACE_SPAN, phase, self.last, now))
+        self.last = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.history[self.frames % PROFILE_WINDOW] = self.current
+        self.frames += 1
+        if self.summary is None or self.frames % PROFILE_SUMMARY_FRAMES == 0:
+            recorded = self.history[:min(self.frames, PROFILE_WINDOW)] * 1000
+            self.summary = np.percentile(recorded, (50, 99), axis=0).T.tolist()
+        if tracer.enabled:
+            tracer.frame(self.start, self.last, self.current)
+
+    def last_frame(self):
+        # Milliseconds per phase of the newest recorded frame
+        if not self.frames:
+            return None
+        return (self.history[(self.frames - 1) % PROFILE_WINDOW] * 1000).tolist()
+
+profiler = FrameProfiler()
+
+# Trace recording (--trace=PATH): profiler spans, a record per gameplay frame
+# with the F2 overlay's counts, and notable game events are appended to an
+# in-memory ring buffer, which a writer thread drains to PATH every
+# TRACE_FLUSH_SECONDS. The file is Chrome Trace Event JSON, for
+# chrome://tracing or ui.perfetto.dev, or for a .jsonl path one JSON object
+# per frame or event. The game thread only ever appends to the buffer; if the
+# writer falls TRACE_BUFFER_RECORDS behind, the oldest records are dropped
+# rather than stalling a frame.
+TRACE_PATH = command_line_value("--trace", "STAR_FIGHTER_TRACE")
+TRACE_BUFFER_RECORDS = 1 << 16
+TRACE_FLUSH_SECONDS = 0.5
+TRACE_SPAN, TRACE_FRAME, TRACE_EVENT = range(3)
+# debug_counts() fields grouped into the counter tracks of a Chrome trace
+TRACE_COUNTERS = {
+    "player": ("player_health", "player_lives", "player_bomb_count"),
+    "boss": ("boss_health",),
+    "wave": ("level", "wave", "max_waves", "enemies_spawned", "enemies_per_wave", "delay_timer"),
+    "entities": ("bullets", "missiles", "boss_bullets", "enemy_bullets", "bombs", "artillery_shells", "speed_powerups", "bomb_powerups"),
+    "flags": ("player_invincible", "player_shield", "player_missile_shot", "player_speed_boost", "player_tethered",
+              "boss_spawned", "level_transition_delay"),
+}
+
+class TraceRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.enabled = path is not None
+        self.jsonl = self.enabled and path.endswith(".jsonl")
+        self.spans = self.enabled and not self.jsonl  # JSONL frames carry per-phase totals instead
+        self.buffer = deque(maxlen=TRACE_BUFFER_RECORDS)
+        self.origin = time.perf_counter()
+        self.last_flush = self.origin
+        self.executor = None
+        self.writing = None
+        # Only touched from the writer thread
+        self.file = None
+        self.separator = ""
+        self.counters = {}  # Last values written per counter track
+
+    def frame(self, start, end, phases):
+        self.buffer.append((TRACE_FRAME, start, end, list(phases), debug_counts()))
+        if end - self.last_flush >= TRACE_FLUSH_SECONDS:
+            self.last_flush = end
+            self.flush()
+
+    def event(self, name, **args):
+        if self.enabled:
+            self.buffer.append((TRACE_EVENT, name, time.perf_counter(), args))
+
+    def flush(self):
+        # Hands the buffer to the writer thread without waiting for it
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+        if self.writing is None or self.writing.done():
+            self.writing = self.executor.submit(self.write)
+
+    def micros(self, t):
+        return round((t - self.origin) * 1e6, 1)
+
+    def chrome_events(self, record):
+        if record[0] == TRACE_SPAN:
+            _, phase, start, end = record
+            yield {"name": PROFILE_PHASES[phase], "ph": "X", "ts": self.micros(start), "dur": round((end - start) * 1e6, 1), "pid": 1, "tid": 1}
+        elif record[0] == TRACE_FRAME:
+            _, start, end, phases, counts = record
+            yield {"name": "frame", "ph": "X", "ts": self.micros(start), "dur": round((end - start) * 1e6, 1), "pid": 1, "tid": 1}
+            # Counter tracks only get a sample when one of their values changes
+            for track, names in TRACE_COUNTERS.items():
+                values = {name: int(counts[name] or 0) for name in names}
+                if self.counters.get(track) != values:
+                    self.counters[track] = values
+                    yield {"name": track, "ph": "C", "ts": self.micros(start), "pid": 1, "args": values}
+        else:
+            _, name, t, args = record
+            yield {"name": name, "ph": "i", "s": "g", "ts": self.micros(t), "pid": 1, "tid": 1, "args": args}
+
+    def jsonl_events(self, record):
+        if record[0] == TRACE_FRAME:
+            _, start, end, phases, counts = record
+            yield {"type": "frame", "ts": self.micros(start), "dur": round((end - start) * 1e6, 1),
+                   "phases": {name: round(seconds * 1e6, 1) for name, seconds in zip(PROFILE_PHASES, phases)}, "counts": counts}
+        elif record[0] == TRACE_EVENT:
+            _, name, t, args = record
+            yield {"type": "event", "name": name, "ts": self.micros(t), "args": args}
+
+    def write(self):
+        # Writer thread: drains the buffer to the file
+        try:
+            if self.file is None:
+                self.file = open(self.path, "w")
+                if not self.jsonl:
+                    # JSON array format; viewers accept it without the closing bracket, so a crash still leaves a usable trace
+                    self.file.write("[\n")
+            chunks = []
+            to_events = self.jsonl_events if self.jsonl else self.chrome_events
+            # Only what was buffered when the flush started, so a flush always ends
+            for _ in range(len(self.buffer)):
+                for event in to_events(self.buffer.popleft()):
+                    if self.jsonl:
+                        chunks.append(json.dumps(event, separators=(",", ":")) + "\n")
+                    else:
+                        chunks.append(self.separator + json.dumps(event, separators=(",", ":")))
+                        self.separator = ",\n"
+            self.file.write("".join(chunks))
+            self.file.flush()
+        except OSError as e:
+            # Tracing stops; the game carries on
+            self.enabled = self.spans = False
+            self.buffer.clear()
+            if DEBUG_PRINT:
+                print(f"Error writing trace: {e}")
+
+    def finish(self):
+        self.write()
+        if self.file:
+            if not self.jsonl:
+                self.file.write("\n]\n")
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        # Writes out everything still buffered
+        if not self.enabled and self.executor is None:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+        self.executor.submit(self.finish)
+        self.executor.shutdown(wait=True)
+
+tracer = TraceRecorder(TRACE_PATH)
+
+def trace_event(name, **args):
+    tracer.event(name, **args)
 
 def draw_fps_info():
     if not fps_debug:
         return
-    frame_time = pygame.time.get_ticks() - last_frame_time
+    phases = profiler.last_frame()
+    frame_time = sum(phases) if phases else 0.0
     fps = clock.get_fps()
-    fps_text = font.render(f"FPS: {fps:.1f} Frame Time: {frame_time:.1f}ms", True, YELLOW)
-    GAME_SURFACE.blit(fps_text, (10, 130))
+    blit_text(GAME_SURFACE, font, f"FPS: {fps:.1f} Frame Time: {frame_time:.1f}ms", YELLOW, (10, 130))
+    if not phases:
+        return
+    # Stacked bar of the newest frame; the white tick is the frame budget
+    scale = PROFILE_BAR_RECT.width / (2 * TICK_MS)
+    x = PROFILE_BAR_RECT.left
+    for ms, color in zip(phases, PROFILE_COLORS):
+        width = min(ms * scale, PROFILE_BAR_RECT.right - x)
+        if width > 0:
+            pygame.draw.rect(GAME_SURFACE, color, (x, PROFILE_BAR_RECT.top, math.ceil(width), PROFILE_BAR_RECT.height))
+            x += width
+    pygame.draw.rect(GAME_SURFACE, WHITE, PROFILE_BAR_RECT, 1)
+    budget_x = PROFILE_BAR_RECT.left + PROFILE_BAR_RECT.width // 2
+    pygame.draw.line(GAME_SURFACE, WHITE, (budget_x, PROFILE_BAR_RECT.top - 3), (budget_x, PROFILE_BAR_RECT.bottom + 2), 2)
+    # Rolling p50/p99 per phase
+    left, top = PROFILE_TABLE_RECT.topleft
+    blit_text(GAME_SURFACE, PROFILE_FONT, "phase", YELLOW, (left + 14, top))
+    blit_text(GAME_SURFACE, PROFILE_FONT, "p50", YELLOW, (left + 100, top))
+    blit_text(GAME_SURFACE, PROFILE_FONT, "p99", YELLOW, (left + 145, top))
+    for i, (name, color, (p50, p99)) in enumerate(zip(PROFILE_PHASES, PROFILE_COLORS, profiler.summary)):
+        y = top + 18 * (i + 1)
+        pygame.draw.rect(GAME_SURFACE, color, (left, y + 4, 10, 10))
+        blit_text(GAME_SURFACE, PROFILE_FONT, name, WHITE, (left + 14, y))
+        blit_text(GAME_SURFACE, PROFILE_FONT, f"{p50:.2f}", WHITE, (left + 100, y))
+        blit_text(GAME_SURFACE, PROFILE_FONT, f"{p99:.2f}", RED if p99 > TICK_MS else WHITE, (left + 145, y))
+
+# Scenes: every screen is a Scene run by one SceneManager loop, which owns the
+# frame limiter, event polling and the keys all screens share (quit, F11 and
+# its debounce). Scenes sit on a stack so sub-screens (ship selection, pause,
+# high scores, controls, about, initials entry) return to whatever they covered.
+# While nothing animates, the loop blocks in pygame.event.wait instead of
+# redrawing an unchanged menu 60 times a second.
+IDLE_WAIT_MS = 250  # Longest an idle screen sleeps between updates
+
+class Scene:
+    animated = False  # Changes without input, so it has to draw every frame
+
+    def enter(self):
+        pass
 
-# Start screen
-def start_screen():
-    global fullscreen_debounce_timer
-    play_menu_music()
-    while True:
-        clock.tick(FPS)
-        GAME_SURFACE.blit(START_SCREEN, ((WIDTH - START_SCREEN.get_width()) // 2, (HEIGHT - START_SCREEN.get_height()) // 2))
-        render_game()
+    def resume(self):
+        # Called when the scene pushed on top of this one is popped
+        pass
+
+    def leave(self):
+        # Called when the scene is removed from the stack
+        pass
+
+    def handle_event(self, event):
+        pass
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
+    def update(self, frame_ms):
+        pass
+
+    def draw(self):
+        pass
+
+class SceneManager:
+    def __init__(self):
+        self.stack = []
+        self.running = False
+        self.redraw = True
+
+    def current(self):
+        return self.stack[-1]
+
+    def push(self, scene):
+        self.stack.append(scene)
+        self.redraw = True
+        scene.enter()
+
+    def pop(self):
+        self.stack.pop().leave()
+        self.redraw = True
+        self.current().resume()
+
+    def switch(self, scene):
+        # Replaces the whole stack
+        while self.stack:
+            self.stack.pop().leave()
+        self.push(scene)
+
+    def quit(self):
+        self.running = False
+        for scene in reversed(self.stack):
+            scene.leave()
+
+    def idle(self):
+        return not self.current().animated and transition is None and asset_loader.done() and not music.fading()
+
+    def run(self, scene):
+        global fullscreen_debounce_timer
+        self.switch(scene)
+        self.running = True
+        while self.running:
+            if self.idle() and not self.redraw:
+                event = pygame.event.wait(IDLE_WAIT_MS)
+                events = ([event] if event.type != pygame.NOEVENT else []) + poll_events()
+                frame_ms = clock.tick()
+            else:
+                frame_ms = clock.tick(FPS)
+                events = poll_events()
+            profiler.begin_frame()
+
+            for event in events:
+                if event.type == pygame.QUIT:
+                    self.quit()
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F11:
                     toggle_fullscreen()
-                if event.key == pygame.K_RETURN: # Changed from any key to Enter for consistency
-                    fade_screen()
+                else:
+                    self.current().handle_event(event)
+                if not self.running:
                     return
 
-        # Update debounce timer
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
+            # Update debounce timer
+            if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
+                fullscreen_debounce_timer = 0
+
+            self.current().update(frame_ms)
+            audio.flush()
+            music.update(frame_ms)
+            if self.redraw or events or not self.idle():
+                self.redraw = False
+                self.current().draw()
+
+scenes = SceneManager()
+
+# Start screen
+class StartScreen(Scene):
+    def enter(self):
+        music.play("MENU_MUSIC")
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN: # Changed from any key to Enter for consistency
+            fade_screen()
+            scenes.switch(MainMenu())
+
+    def update(self, frame_ms):
+        asset_loader.poll()
+
+    def draw(self):
+        GAME_SURFACE.blit(START_SCREEN, ((WIDTH - START_SCREEN.get_width()) // 2, (HEIGHT - START_SCREEN.get_height()) // 2))
+        render_game()
 
 # Classes
 class Player(pygame.sprite.Sprite):
@@ -457,29 +1266,28 @@ class Player(pygame.sprite.Sprite):
     def shoot(self, mash=False):
         damage = 15 if mash else 10
         if self.double_shot:
-            bullets.add(Bullet(self.rect.centerx - 10, self.rect.top, damage))
-            bullets.add(Bullet(self.rect.centerx + 10, self.rect.top, damage))
+            bullets.add(Bullet.acquire(self.rect.centerx - 10, self.rect.top, damage))
+            bullets.add(Bullet.acquire(self.rect.centerx + 10, self.rect.top, damage))
         else:
-            bullets.add(Bullet(self.rect.centerx, self.rect.top, damage))
-        SHOOT_SOUND.play()
+            bullets.add(Bullet.acquire(self.rect.centerx, self.rect.top, damage))
+        play_sound(SHOOT_SOUND)
 
     def shoot_missile(self):
-        missiles.add(Missile(self.rect.centerx, self.rect.top))
-        MISSILE_SHOT_SOUND.play()
+        missiles.add(Missile.acquire(self.rect.centerx, self.rect.top))
+        play_sound(MISSILE_SHOT_SOUND)
 
     def use_bomb(self):
         global score, bomb_flash_timer, wave, level_transition_delay, delay_timer
         if self.bomb_count > 0:
             self.bomb_count -= 1
             bomb_flash_timer = 10
-            if BOMB_EXPLOSION_SOUND:
-                BOMB_EXPLOSION_SOUND.play()
+            trace_event("bomb", enemies=len(enemies), asteroids=len(asteroids), bosses=len(boss_group))
+            play_sound(BOMB_EXPLOSION_SOUND)
             # Play EXPLOSION_SOUND for each asteroid destroyed
             for asteroid in asteroids:
-                if EXPLOSION_SOUND:
-                    EXPLOSION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Asteroid destroyed by bomb, playing explosion.wav")
+                play_sound(EXPLOSION_SOUND)
+                if DEBUG_PRINT:
+                    print("Asteroid destroyed by bomb, playing explosion.wav")
             for enemy in enemies:
                 if enemy.health <= 20:
                     score += enemy.score_value
@@ -498,13 +1306,11 @@ class Player(pygame.sprite.Sprite):
                 if boss.health <= 0:
                     score += int(250 * (1.25 ** (level - 1)))
                     boss.kill()
-                    if BOSS_EXPLOSION_SOUND:
-                        BOSS_EXPLOSION_SOUND.play()
+                    play_sound(BOSS_EXPLOSION_SOUND)
                     wave += 1
                     level_transition_delay = True
                     delay_timer = 180
-            enemy_bullets.empty()
-            bombs.empty()
+            projectiles.clear(KIND_ENEMY_BULLET, KIND_BOMB)
             artillery_shells.empty()
             asteroids.empty()
 
@@ -537,9 +1343,43 @@ class Player(pygame.sprite.Sprite):
                               self.rect.centery - SHIELD_SURFACE.get_height() // 2)
                 surface.blit(SHIELD_SURFACE, shield_pos)
 
-class Bullet(pygame.sprite.Sprite):
+class PooledSprite(pygame.sprite.Sprite):
+    # Sprites fired every few frames go back to a per-class free list once they
+    # leave their last group, and acquire() reuses them instead of allocating.
+    # The free list is a dict so a sprite is never listed twice.
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.pool = {}
+        cls.allocated = 0  # Instances ever created; stays near the peak on screen
+
+    @classmethod
+    def acquire(cls, *args):
+        if cls.pool:
+            sprite, _ = cls.pool.popitem()
+            sprite.reset(*args)
+            return sprite
+        cls.allocated += 1
+        return cls(*args)
+
+    # Group.remove() and Group.empty() go through remove_internal(), but
+    # Sprite.kill() clears the sprite's groups without calling it
+    def kill(self):
+        was_alive = self.alive()
+        super().kill()
+        if was_alive:
+            self.pool[self] = None
+
+    def remove_internal(self, group):
+        super().remove_internal(group)
+        if not self.alive():
+            self.pool[self] = None
+
+class Bullet(PooledSprite):
     def __init__(self, x, y, damage=10):
         super().__init__()
+        self.reset(x, y, damage)
+
+    def reset(self, x, y, damage=10):
         self.image = BULLET_IMG
         self.rect = self.image.get_rect(center=(x, y))
         self.speed = -10
@@ -550,129 +1390,248 @@ class Bullet(pygame.sprite.Sprite):
         if self.rect.bottom < 0:
             self.kill()
 
-class Missile(pygame.sprite.Sprite):
+class Missile(PooledSprite):
     def __init__(self, x, y):
         super().__init__()
+        self.reset(x, y)
+
+    def reset(self, x, y):
         self.image = MISSILE_IMG
         self.rect = self.image.get_rect(center=(x, y))
         self.speed = 10
         self.damage = 20  # Used only for bosses
-        self.target = None
         # Find initial closest target (enemy, boss, or asteroid)
-        targets = list(enemies) + list(boss_group) + list(asteroids)
-        if targets:
-            self.target = min(targets, key=lambda t: ((self.rect.x - t.rect.x) ** 2 + (self.rect.y - t.rect.y) ** 2) ** 0.5, default=None)
+        self.target = target_index.nearest([(self.rect.x, self.rect.y)])[0]
 
-    def update(self):
-        if not self.target or not self.target.alive():
-            # Find new closest target
-            targets = list(enemies) + list(boss_group) + list(asteroids)
-            if targets:
-                self.target = min(targets, key=lambda t: ((self.rect.x - t.rect.x) ** 2 + (self.rect.y - t.rect.y) ** 2) ** 0.5, default=None)
-            else:
-                self.target = None
-
-        if self.target:
-            # Calculate direction to target
-            dx = self.target.rect.centerx - self.rect.centerx
-            dy = self.target.rect.centery - self.rect.centery
-            dist = (dx ** 2 + dy ** 2) ** 0.5
-            if dist > 0:
-                # Move toward target at constant speed
-                self.rect.x += (dx / dist) * self.speed
-                self.rect.y += (dy / dist) * self.speed
-        else:
+class TargetIndex:
+    # Homing targets (enemies, bosses, asteroids) gathered once per tick so
+    # every missile shares one nearest-target query instead of rebuilding and
+    # scanning the target list itself
+    def __init__(self):
+        self.targets = None
+
+    def clear(self):
+        self.targets = None
+
+    def build(self):
+        self.targets = list(enemies) + list(boss_group) + list(asteroids)
+        self.corners = np.array([(t.rect.x, t.rect.y) for t in self.targets], dtype=np.float64).reshape(-1, 2)
+
+    def nearest(self, points):
+        # Closest live target to each (x, y) top-left corner, or None when there are none
+        if self.targets is None:
+            self.build()
+        # Targets killed since the build (e.g. by a bomb) are skipped
+        alive = np.array([t.alive() for t in self.targets], dtype=bool)
+        if not alive.any():
+            return [None] * len(points)
+        offsets = np.asarray(points, dtype=np.float64)[:, None, :] - self.corners[None, :, :]
+        distances = (offsets ** 2).sum(axis=2)
+        distances[:, ~alive] = np.inf
+        return [self.targets[i] for i in distances.argmin(axis=1).tolist()]
+
+def steer_missiles():
+    # Retarget missiles whose target died, then steer every missile at once
+    flying = missiles.sprites()
+    if not flying:
+        return
+    retarget = [m for m in flying if not m.target or not m.target.alive()]
+    if retarget:
+        for missile, target in zip(retarget, target_index.nearest([(m.rect.x, m.rect.y) for m in retarget])):
+            missile.target = target
+
+    homing = [m for m in flying if m.target]
+    if homing:
+        # Move toward target centers at constant speed
+        positions = np.array([(m.rect.centerx, m.rect.centery, m.target.rect.centerx, m.target.rect.centery, m.speed) for m in homing], dtype=np.float64)
+        dx = positions[:, 2] - positions[:, 0]
+        dy = positions[:, 3] - positions[:, 1]
+        dist = np.hypot(dx, dy)
+        moving = dist > 0
+        scale = np.divide(positions[:, 4], dist, out=np.zeros_like(dist), where=moving)
+        for missile, step_x, step_y, move in zip(homing, (dx * scale).tolist(), (dy * scale).tolist(), moving.tolist()):
+            if move:
+                missile.rect.x += step_x
+                missile.rect.y += step_y
+
+    for missile in flying:
+        if not missile.target:
             # Move straight up if no target
-            self.rect.y -= self.speed
-
-        if self.rect.bottom < 0:
-            self.kill()
+            missile.rect.y -= missile.speed
+        if missile.rect.bottom < 0:
+            missile.kill()
+
+# Enemy projectiles (boss bullets, enemy bullets, bombs) live in one
+# structure-of-arrays store so moving, culling and player hits are a handful
+# of vectorized operations per tick instead of one sprite update each.
+KIND_BOSS_BULLET = 0
+KIND_ENEMY_BULLET = 1
+KIND_BOMB = 2
+
+# Pre-rendered projectile images shared by every shot, keyed by (kind, color, size)
+PROJECTILE_IMAGES = {}
+
+def projectile_image(kind, color, size):
+    key = (kind, color, size)
+    image = PROJECTILE_IMAGES.get(key)
+    if image is None:
+        if kind == KIND_BOMB:
+            image = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.draw.circle(image, color, (size[0] // 2, size[1] // 2), min(size) // 2)
+        else:
+            image = pygame.Surface(size)
+            image.fill(color)
+        image = convert_surface(image)
+        PROJECTILE_IMAGES[key] = image
+    return image
+
+class ProjectileStore:
+    def __init__(self, capacity=256):
+        self.images = []
+        self.image_ids = {}
+        self.free = []
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        # Grow every array to the new capacity, keeping existing slots
+        old = getattr(self, "alive", np.zeros(0, dtype=bool)).size
+        def grow(name, dtype):
+            array = np.zeros(capacity, dtype=dtype)
+            if old:
+                array[:old] = getattr(self, name)
+            setattr(self, name, array)
+        for name in ("x", "y", "vx", "vy"):
+            grow(name, np.float64)
+        for name in ("w", "h", "damage", "age"):
+            grow(name, np.int32)
+        grow("kind", np.int8)
+        grow("image", np.int16)
+        grow("trail", bool)
+        grow("alive", bool)
+        # Hand out low slots first so live projectiles stay packed
+        self.free.extend(range(capacity - 1, old - 1, -1))
+
+    def spawn(self, kind, x, y, vx, vy, image, damage, trail=False):
+        if not self.free:
+            self.allocate(self.alive.size * 2)
+        i = self.free.pop()
+        image_id = self.image_ids.get(image)
+        if image_id is None:
+            image_id = self.image_ids[image] = len(self.images)
+            self.images.append(image)
+        w, h = image.get_size()
+        # Positions are the top-left corner, matching get_rect(center=(x, y))
+        self.x[i] = x - w // 2
+        self.y[i] = y - h // 2
+        self.w[i] = w
+        self.h[i] = h
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.damage[i] = damage
+        self.kind[i] = kind
+        self.image[i] = image_id
+        self.trail[i] = trail
+        self.age[i] = 0
+        self.alive[i] = True
+
+    def add_boss_bullet(self, x, y, angle=0):
+        speed = 7
+        self.spawn(KIND_BOSS_BULLET, x, y, speed * math.sin(math.radians(angle)), speed * math.cos(math.radians(angle)), projectile_image(KIND_BOSS_BULLET, RED, (5, 15)), 10)
+
+    def add_enemy_bullet(self, x, y, color=YELLOW, angle=90, speed=5, width=5, height=10, damage=10):
+        is_sniper_bullet = (color == RED)
+        if is_sniper_bullet:
+            image = SNIPER_BULLET_SURFACE
+        else:
+            image = projectile_image(KIND_ENEMY_BULLET, color, (width, height))
+        self.spawn(KIND_ENEMY_BULLET, x, y, speed * math.cos(math.radians(angle)), speed * math.sin(math.radians(angle)), image, damage, is_sniper_bullet)
 
-class BossBullet(pygame.sprite.Sprite):
-    def __init__(self, x, y, angle=0):
-        super().__init__()
-        self.image = pygame.Surface((5, 15))
-        self.image.fill(RED)
-        self.rect = self.image.get_rect(center=(x, y))
-        self.speed = 7
-        self.angle = angle
-        self.vx = self.speed * math.sin(math.radians(self.angle))
-        self.vy = self.speed * math.cos(math.radians(self.angle))
+    def add_bomb(self, x, y, angle=0, color=RED):
+        speed = 3
+        angle_rad = math.radians(angle)
+        self.spawn(KIND_BOMB, x, y, speed * math.sin(angle_rad), speed * math.cos(angle_rad), projectile_image(KIND_BOMB, color, (10, 10)), 15)
 
     def update(self):
-        self.rect.x += self.vx
-        self.rect.y += self.vy
-        if self.rect.top > HEIGHT or self.rect.bottom < 0 or self.rect.left > WIDTH or self.rect.right < 0:
-            self.kill()
+        alive = self.alive
+        self.x += self.vx
+        self.y += self.vy
+        self.age += 1
+        # Bombs only leave through the bottom edge; bullets leave through any edge
+        out = self.y > HEIGHT
+        out |= (self.kind != KIND_BOMB) & ((self.y + self.h < 0) | (self.x > WIDTH) | (self.x + self.w < 0))
+        out &= alive
+        if out.any():
+            self.kill(out)
+
+    def kill(self, mask):
+        self.alive &= ~mask
+        self.free.extend(np.flatnonzero(mask)[::-1].tolist())
+
+    def clear(self, *kinds):
+        mask = self.alive & np.isin(self.kind, kinds)
+        if mask.any():
+            self.kill(mask)
 
-class EnemyBullet(pygame.sprite.Sprite):
-    def __init__(self, x, y, color=YELLOW, angle=90, speed=5, width=5, height=10, damage=10):
-        super().__init__()
-        self.is_sniper_bullet = (color == RED)
-        if self.is_sniper_bullet:
-            self.image = SNIPER_BULLET_SURFACE
-        else:
-            self.image = pygame.Surface((width, height))
-            self.image.fill(color)
-        self.rect = self.image.get_rect(center=(x, y))
-        self.speed = speed
-        self.angle = angle
-        self.damage = damage
-        self.vx = self.speed * math.cos(math.radians(self.angle))
-        self.vy = self.speed * math.sin(math.radians(self.angle))
-        self.trail = []
-        self.last_pos = (x, y)
-
-    def update(self):
-        if self.rect.top > HEIGHT or self.rect.bottom < 0 or self.rect.left > WIDTH or self.rect.right < 0:
-            self.kill()
-            return
-        self.rect.x += self.vx
-        self.rect.y += self.vy
-        if self.is_sniper_bullet:
-            dist = ((self.rect.centerx - self.last_pos[0]) ** 2 + (self.rect.centery - self.last_pos[1]) ** 2) ** 0.5
-            if dist >= 4:
-                self.trail.append((self.rect.centerx, self.rect.centery, 255))
-                self.last_pos = (self.rect.centerx, self.rect.centery)
-            self.trail = [(x, y, max(0, a - 50)) for x, y, a in self.trail if a > 0]
-            if len(self.trail) > 6:
-                self.trail.pop(0)
+    def reset(self):
+        # Back to a fresh store's slot order, so a new game runs exactly like the first
+        self.alive[:] = False
+        self.free = list(range(self.alive.size - 1, -1, -1))
+        self.images = []
+        self.image_ids = {}
+
+    def count(self, kind):
+        return int(np.count_nonzero(self.alive & (self.kind == kind)))
+
+    def collide_rect(self, rect, kill=True):
+        # Returns the kinds and damages of every live projectile overlapping rect
+        hits = self.alive & (self.x < rect.right) & (self.x + self.w > rect.left) & (self.y < rect.bottom) & (self.y + self.h > rect.top)
+        kinds = self.kind[hits]
+        damages = self.damage[hits]
+        if kill and kinds.size:
+            self.kill(hits)
+        return kinds, damages
+
+    def remap_images(self, remap):
+        self.images = [remap(image) for image in self.images]
+        self.image_ids = {image: i for i, image in enumerate(self.images)}
+
+    def visible_rects(self):
+        # Screen areas covered by visible projectiles and their trails
+        visible = self.alive & (self.x <= WIDTH) & (self.x + self.w >= 0) & (self.y <= HEIGHT) & (self.y + self.h >= 0)
+        indices = np.flatnonzero(visible)
+        rects = [pygame.Rect(x, y, w + 1, h + 1) for x, y, w, h in zip(self.x[indices].astype(np.int32).tolist(), self.y[indices].astype(np.int32).tolist(), self.w[indices].tolist(), self.h[indices].tolist())]
+        for i in np.flatnonzero(visible & self.trail).tolist():
+            cx = int(self.x[i] + self.w[i] // 2)
+            cy = int(self.y[i] + self.h[i] // 2)
+            tail = pygame.Rect(cx, cy, 0, 0).union(pygame.Rect(int(cx - 5 * self.vx[i]), int(cy - 5 * self.vy[i]), 0, 0))
+            rects.append(tail.inflate(8, 8))
+        return rects
 
     def draw(self, surface):
-        if self.rect.top > HEIGHT or self.rect.bottom < 0 or self.rect.left > WIDTH or self.rect.right < 0:
-            return
-        surface.blit(self.image, self.rect)
-        if self.is_sniper_bullet:
-            for x, y, alpha in self.trail:
-                TRAIL_SURFACE.set_alpha(alpha)
-                surface.blit(TRAIL_SURFACE, (x - 3, y - 3))
-
-class Bomb(pygame.sprite.Sprite):
-    def __init__(self, x, y, angle=0, color=RED):
-        super().__init__()
-        self.image = pygame.Surface((10, 10), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, color, (5, 5), 5)
-        self.rect = self.image.get_rect(center=(x, y))
-        self.speed = 3
-        angle_rad = math.radians(angle)
-        self.vx = self.speed * math.sin(angle_rad)
-        self.vy = self.speed * math.cos(angle_rad)
-        self.damage = 15
-
-    def update(self):
-        self.rect.x += self.vx
-        self.rect.y += self.vy
-        if self.rect.top > HEIGHT:
-            self.kill()
+        visible = self.alive & (self.x <= WIDTH) & (self.x + self.w >= 0) & (self.y <= HEIGHT) & (self.y + self.h >= 0)
+        images = self.images
+        for kind in (KIND_BOSS_BULLET, KIND_ENEMY_BULLET, KIND_BOMB):
+            indices = np.flatnonzero(visible & (self.kind == kind))
+            if indices.size:
+                xs = self.x[indices].astype(np.int32).tolist()
+                ys = self.y[indices].astype(np.int32).tolist()
+                surface.blits([(images[i], (x, y)) for i, x, y in zip(self.image[indices].tolist(), xs, ys)], False)
+        # Sniper trails trace the last six tick positions with fading alpha
+        for i in np.flatnonzero(visible & self.trail).tolist():
+            cx = self.x[i] + self.w[i] // 2
+            cy = self.y[i] + self.h[i] // 2
+            for k in range(min(int(self.age[i]), 6)):
+                TRAIL_SURFACE.set_alpha(max(0, 205 - 50 * k))
+                surface.blit(TRAIL_SURFACE, (int(cx - k * self.vx[i]) - 3, int(cy - k * self.vy[i]) - 3))
 
 class Asteroid(pygame.sprite.Sprite):
     def __init__(self):
         super().__init__()
         self.image = ASTEROID_IMG
-        self.rect = self.image.get_rect(center=(random.randint(20, WIDTH - 20), -40))
+        self.rect = self.image.get_rect(center=(rng.hazards.randint(20, WIDTH - 20), -40))
         self.health = 3
-        self.speed = random.uniform(4, 8)  # Increased speed range
-        self.angle = random.uniform(45, 135)  # Narrower angle range (downward)
+        self.speed = rng.hazards.uniform(4, 8)  # Increased speed range
+        self.angle = rng.hazards.uniform(45, 135)  # Narrower angle range (downward)
         self.vx = self.speed * math.cos(math.radians(self.angle))
         self.vy = self.speed * math.sin(math.radians(self.angle))
         self.damage = 15
@@ -683,9 +1642,12 @@ class Asteroid(pygame.sprite.Sprite):
         if self.rect.top > HEIGHT + 40 or self.rect.bottom < -40 or self.rect.left > WIDTH + 40 or self.rect.right < -40:
             self.kill()
 
-class ArtilleryShell(pygame.sprite.Sprite):
+class ArtilleryShell(PooledSprite):
     def __init__(self, x, y, target_x, target_y):
         super().__init__()
+        self.reset(x, y, target_x, target_y)
+
+    def reset(self, x, y, target_x, target_y):
         self.image = ARTILLERY_SHELL_SURFACE
         self.rect = self.image.get_rect(center=(x, y))
         self.speed = 3
@@ -723,7 +1685,7 @@ class ArtilleryShell(pygame.sprite.Sprite):
         if not self.exploded:
             self.exploded = True
             self.explosion_timer = 10
-            EXPLOSION_SOUND.play()
+            play_sound(EXPLOSION_SOUND)
 
     def draw(self, surface):
         if self.exploded:
@@ -734,32 +1696,39 @@ class ArtilleryShell(pygame.sprite.Sprite):
         else:
             surface.blit(self.image, self.rect)
 
+def enemy_types():
+    # (image, speed range, health, unused, can shoot, tank, bomber, score, first level)
+    return [
+        (ENEMY_IMGS[0], (4, 7), 10, 1.0, False, False, False, 10, 1),
+        (ENEMY_IMGS[1], (2, 5), 20, 1.0, True, False, False, 10, 1),
+        (ENEMY_IMGS[2], (1, 3), 30, 1.0, True, True, False, 20, 2),
+        (ENEMY_IMGS[3], (1, 3), 40, 1.0, True, False, True, 15, 3),
+        (ENEMY_IMGS[4], (2, 4), 20, 1.0, True, False, False, 15, 4),
+        (ENEMY_IMGS[5], (3, 6), 20, 1.0, True, False, False, 15, 5),
+        (ENEMY_IMGS[6], (0, 0), 50, 1.0, True, False, False, 20, 6)
+    ]
+
 class Enemy(pygame.sprite.Sprite):
-    def __init__(self):
+    def __init__(self, type_index=None):
         super().__init__()
-        enemy_types = [
-            (ENEMY_IMGS[0], (4, 7), 10, 1.0, False, False, False, 10, 1),
-            (ENEMY_IMGS[1], (2, 5), 20, 1.0, True, False, False, 10, 1),
-            (ENEMY_IMGS[2], (1, 3), 30, 1.0, True, True, False, 20, 2),
-            (ENEMY_IMGS[3], (1, 3), 40, 1.0, True, False, True, 15, 3),
-            (ENEMY_IMGS[4], (2, 4), 20, 1.0, True, False, False, 15, 4),
-            (ENEMY_IMGS[5], (3, 6), 20, 1.0, True, False, False, 15, 5),
-            (ENEMY_IMGS[6], (0, 0), 50, 1.0, True, False, False, 20, 6)
-        ]
-        available_types = [t for t in enemy_types if t[8] <= level] or [enemy_types[0], enemy_types[1]]
-        weight_map = {1: 0.25, 2: 0.2, 3: 0.15, 4: 0.1, 5: 0.05}
-        weights = [weight_map.get(t[8], 0.05) for t in available_types]
-        weight_sum = sum(weights)
-        weights = [w / weight_sum if weight_sum > 0 else 1.0 / len(weights) for w in weights]
-        self.type_data = random.choices(available_types, weights=weights, k=1)[0]
+        types = enemy_types()
+        if type_index is not None:
+            # A fixed type, for benchmark scenarios
+            self.type_data = types[type_index]
+        else:
+            available_types = [t for t in types if t[8] <= level] or [types[0], types[1]]
+            weight_map = {1: 0.25, 2: 0.2, 3: 0.15, 4: 0.1, 5: 0.05}
+            weights = [weight_map.get(t[8], 0.05) for t in available_types]
+            weight_sum = sum(weights)
+            weights = [w / weight_sum if weight_sum > 0 else 1.0 / len(weights) for w in weights]
+            self.type_data = rng.spawn.choices(available_types, weights=weights, k=1)[0]
         self.image = self.type_data[0]
-        self.original_image = self.image.copy()
         if self.type_data[0] == ENEMY_IMGS[6]:
-            self.rect = self.image.get_rect(center=(random.randint(20, WIDTH - 20), 100))
+            self.rect = self.image.get_rect(center=(rng.spawn.randint(20, WIDTH - 20), 100))
             self.base_speed = 0
         else:
-            self.rect = self.image.get_rect(center=(random.randint(20, WIDTH - 20), -40))
-            self.base_speed = random.randint(self.type_data[1][0], self.type_data[1][1]) + level // 2
+            self.rect = self.image.get_rect(center=(rng.spawn.randint(20, WIDTH - 20), -40))
+            self.base_speed = rng.spawn.randint(self.type_data[1][0], self.type_data[1][1]) + level // 2
         self.speed = self.base_speed
         self.health = round(self.type_data[2] * (1.0 + (level - self.type_data[8]) * 0.1))
         self.can_shoot = self.type_data[4]
@@ -773,12 +1742,12 @@ class Enemy(pygame.sprite.Sprite):
         self.shooting_pause_timer = 0
         self.timer = 0
         self.muzzle_flash_timer = 0
+        self.missile_hits = 0  # Tougher types take two missiles
         if self.is_leech:
             self.tethered_enemy = None
             self.shoot_timer = 0
             self.shoot_delay = 120
             self.pulse_timer = 0
-            self.pulse_scale = 1.0
         elif self.is_artillery:
             self.shoot_timer = 0
             self.shoot_delay = 300
@@ -812,29 +1781,26 @@ class Enemy(pygame.sprite.Sprite):
                     self.tethered_enemy = player
                     self.shoot_timer = 0
                     if self.tethered_enemy is player and not hasattr(self, 'tether_sound_played'):
-                        LEECH_TETHER_SOUND.play()
+                        play_sound(LEECH_TETHER_SOUND)
                         self.tether_sound_played = True
             self.pulse_timer += 1
             if self.pulse_timer >= 10:
                 self.pulse_timer = 0
-            self.pulse_scale = 1.0 + 0.05 * math.sin(self.pulse_timer * 0.628)
-            new_size = (int(self.original_image.get_width() * self.pulse_scale), 
-                       int(self.original_image.get_height() * self.pulse_scale))
-            self.image = pygame.transform.scale(self.original_image, new_size)
+            self.image = LEECH_PULSE_FRAMES[self.type_data[0]][self.pulse_timer]
             self.rect = self.image.get_rect(center=self.rect.center)
         elif self.is_sniper:
             if self.aim_timer > 0:
                 self.speed = 0
                 self.aim_timer -= 1
                 self.flash_timer += 1
-                if self.flash_timer % 5 == 0:
-                    alpha = 128 if self.image.get_alpha() == 255 else 255
-                    self.image = self.original_image.copy()
-                    self.image.set_alpha(alpha)
+                # The blink is cosmetic, so headless runs skip it
+                if self.flash_timer % 5 == 0 and not HEADLESS:
+                    alpha = 128 if self.image is not SNIPER_BLINK_FRAMES[self.type_data[0]][128] else 255
+                    self.image = SNIPER_BLINK_FRAMES[self.type_data[0]][alpha]
                 if self.aim_timer == 0:
                     self.recoil_timer = 1
-                    self.image = self.original_image.copy()
-                    self.image.set_alpha(255)
+                    if not HEADLESS:
+                        self.image = SNIPER_BLINK_FRAMES[self.type_data[0]][255]
             elif self.recoil_timer > 0:
                 self.speed = 0
                 if self.rect.top > -80:
@@ -848,12 +1814,12 @@ class Enemy(pygame.sprite.Sprite):
                 self.shoot_pause_timer -= 1
                 if self.shoot_pause_timer <= 0:
                     bullet_height = max(1, HEIGHT - (self.rect.bottom - 20))
-                    enemy_bullets.add(EnemyBullet(
+                    projectiles.add_enemy_bullet(
                         self.rect.centerx, self.rect.bottom - 20,
                         color=RED, angle=90, speed=10,
                         width=4, height=96, damage=15
-                    ))
-                    SNIPER_LASER_SOUND.play()
+                    )
+                    play_sound(SNIPER_LASER_SOUND)
                     self.is_shooting = True
                     self.shooting_pause_timer = 30
                     self.muzzle_flash_timer = 3
@@ -906,27 +1872,27 @@ class Enemy(pygame.sprite.Sprite):
         elif self.is_bomber:
             angles = [-30, 0, 30]
             for angle in angles:
-                bombs.add(Bomb(self.rect.centerx, self.rect.bottom, angle, MAGENTA))
-            ENEMY_BOMB_SOUND.play()
+                projectiles.add_bomb(self.rect.centerx, self.rect.bottom, angle, MAGENTA)
+            play_sound(ENEMY_BOMB_SOUND)
             self.muzzle_flash_timer = 3
         elif self.is_tank:
-            bombs.add(Bomb(self.rect.centerx, self.rect.bottom, color=ORANGE))
-            ENEMY_BOMB_SOUND.play()
+            projectiles.add_bomb(self.rect.centerx, self.rect.bottom, color=ORANGE)
+            play_sound(ENEMY_BOMB_SOUND)
         elif self.is_artillery:
-            artillery_shells.add(ArtilleryShell(self.rect.centerx, self.rect.bottom, player.rect.centerx, player.rect.centery))
-            ARTILLERY_SHOT_SOUND.play()
+            artillery_shells.add(ArtilleryShell.acquire(self.rect.centerx, self.rect.bottom, player.rect.centerx, player.rect.centery))
+            play_sound(ARTILLERY_SHOT_SOUND)
             self.muzzle_flash_timer = 3
         elif self.type_data[0] == ENEMY_IMGS[1]:
-            enemy_bullets.add(EnemyBullet(self.rect.centerx, self.rect.bottom, YELLOW, 90, 5))
-            FIGHTER_SHOOT_SOUND.play()
+            projectiles.add_enemy_bullet(self.rect.centerx, self.rect.bottom, YELLOW, 90, 5)
+            play_sound(FIGHTER_SHOOT_SOUND)
         else:
-            enemy_bullets.add(EnemyBullet(self.rect.centerx, self.rect.bottom, YELLOW, 90, 5))
-            ENEMY_BOMB_SOUND.play()
+            projectiles.add_enemy_bullet(self.rect.centerx, self.rect.bottom, YELLOW, 90, 5)
+            play_sound(ENEMY_BOMB_SOUND)
 
 class Boss(pygame.sprite.Sprite):
     def __init__(self):
         super().__init__()
-        self.image = random.choice(BOSS_IMGS)
+        self.image = rng.spawn.choice(BOSS_IMGS)
         self.rect = self.image.get_rect(center=(WIDTH // 2, -150))
         self.speed_y = 2
         self.health = 300 + level * 75
@@ -960,7 +1926,7 @@ class Boss(pygame.sprite.Sprite):
         else:
             self.speed_x = 10
             self.shoot_delay = max(25, 45 - level * 5)
-            if random.random() < 0.05:
+            if rng.ai.random() < 0.05:
                 self.direction *= -1
 
         if self.rect.top < 50:
@@ -978,22 +1944,22 @@ class Boss(pygame.sprite.Sprite):
         if self.phase == 3:
             self.bomb_timer += 1
             if self.bomb_timer >= self.bomb_delay:
-                bombs.add(Bomb(self.rect.centerx, self.rect.bottom))
-                BOSS_SHOOT_SOUND.play()
+                projectiles.add_bomb(self.rect.centerx, self.rect.bottom)
+                play_sound(BOSS_SHOOT_SOUND)
                 self.bomb_timer = 0
 
     def shoot(self):
         if self.phase == 1:
-            boss_bullets.add(BossBullet(self.rect.centerx, self.rect.bottom))
+            projectiles.add_boss_bullet(self.rect.centerx, self.rect.bottom)
         elif self.phase == 2:
             angles = [0, -30, 30]
             for angle in angles:
-                boss_bullets.add(BossBullet(self.rect.centerx, self.rect.bottom, angle))
+                projectiles.add_boss_bullet(self.rect.centerx, self.rect.bottom, angle)
         else:
             angles = [0, -45, -22.5, 22.5, 45]
             for angle in angles:
-                boss_bullets.add(BossBullet(self.rect.centerx, self.rect.bottom, angle))
-        BOSS_SHOOT_SOUND.play()
+                projectiles.add_boss_bullet(self.rect.centerx, self.rect.bottom, angle)
+        play_sound(BOSS_SHOOT_SOUND)
 
     def draw_health_bar(self, surface):
         bar_width = self.rect.width
@@ -1082,6 +2048,65 @@ class BombPowerUp(pygame.sprite.Sprite):
         if self.rect.top > HEIGHT:
             self.kill()
 
+# Collision tests
+class BatchCollider:
+    # Every collision query in resolve_collisions goes through here. Each query
+    # tests one rect against a whole group with Rect.collidelistall, which
+    # loops in C; at the sizes real scenes reach (a few thousand pairs at
+    # most) that beats bucketing sprites into a grid in Python. Hits come
+    # back in group order, as pygame's own functions return them, so every
+    # loot roll that follows sees the same order.
+    def spritecollide(self, sprite, group, dokill):
+        # Same contract as pygame.sprite.spritecollide
+        if not group:
+            return []
+        others = group.sprites()
+        hits = [others[i] for i in sprite.rect.collidelistall([other.rect for other in others])]
+        if dokill:
+            for other in hits:
+                other.kill()
+        return hits
+
+    def groupcollide(self, groupa, groupb, dokilla, dokillb):
+        # Same contract as pygame.sprite.groupcollide
+        crashed = {}
+        if not groupa or not groupb:
+            return crashed
+        sprites = groupa.sprites()
+        others = groupb.sprites()
+        if len(sprites) <= len(others):
+            rects = [other.rect for other in others]
+            for sprite in sprites:
+                hits = [others[i] for i in sprite.rect.collidelistall(rects)]
+                if dokillb:
+                    # Sprites killed by an earlier sprite in groupa are still in rects
+                    hits = [other for other in hits if other in groupb]
+                    for other in hits:
+                        other.kill()
+                if hits:
+                    crashed[sprite] = hits
+        else:
+            # Fewer sprites in groupb (many bullets, few enemies): test each of
+            # them against groupa instead, then regroup the hits in groupa order
+            rects = [sprite.rect for sprite in sprites]
+            found = {}
+            for other in others:
+                hit_by = other.rect.collidelistall(rects)
+                if dokillb:
+                    hit_by = hit_by[:1]  # The first sprite in groupa to touch it kills it
+                for i in hit_by:
+                    found.setdefault(i, []).append(other)
+            for i in sorted(found):
+                crashed[sprites[i]] = found[i]
+            if dokillb:
+                for hits in found.values():
+                    for other in hits:
+                        other.kill()
+        if dokilla:
+            for sprite in crashed:
+                sprite.kill()
+        return crashed
+
 # Groups
 player = None
 player_group = pygame.sprite.GroupSingle()
@@ -1096,27 +2121,68 @@ shield_powerups = pygame.sprite.Group()
 missile_powerups = pygame.sprite.Group()
 speed_powerups = pygame.sprite.Group()
 bomb_powerups = pygame.sprite.Group()
-boss_bullets = pygame.sprite.Group()
-enemy_bullets = pygame.sprite.Group()
-bombs = pygame.sprite.Group()
+projectiles = ProjectileStore()
 artillery_shells = pygame.sprite.Group()
+collider = BatchCollider()
+target_index = TargetIndex()
+
+def all_sprite_groups():
+    return (bullets, missiles, enemies, boss_group, health_packs, asteroids, powerups, shield_powerups,
+            missile_powerups, speed_powerups, bomb_powerups, artillery_shells)
+
+# Convert the loaded images now that the display exists
+convert_assets()
 
 # Ship selection menu
-def ship_selection_menu():
-    global fullscreen_debounce_timer
-    fade_screen()
-    option_font = pygame.font.SysFont("arial", 28)
-    selected_ship = 0
-    selected_option = 0
-    options = ["Ships", "Back"]
-    display_ships = [pygame.transform.scale(img, (int(img.get_width() * 1.5), int(img.get_height() * 1.5))) for img in PLAYER_IMGS]
-    back_text = option_font.render("Back", True, WHITE)
-    back_text_selected = option_font.render("Back", True, GREEN)
+class ShipSelectionMenu(Scene):
+    def enter(self):
+        asset_loader.require("SELECT_SHIP_IMG", "PLAYER_IMGS")
+        fade_screen()
+        option_font = pygame.font.SysFont("arial", 28)
+        self.selected_ship = 0
+        self.selected_option = 0
+        self.display_ships = [pygame.transform.scale(img, (int(img.get_width() * 1.5), int(img.get_height() * 1.5))) for img in PLAYER_IMGS]
+        self.back_text = option_font.render("Back", True, WHITE)
+        self.back_text_selected = option_font.render("Back", True, GREEN)
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_UP:
+            if self.selected_option == 1:
+                self.selected_option = 0
+            elif self.selected_ship == 2:
+                self.selected_ship = 0
+            elif self.selected_ship == 3:
+                self.selected_ship = 1
+            else:
+                self.selected_ship = self.selected_ship + 2
+        if event.key == pygame.K_DOWN:
+            if self.selected_option == 0:
+                if self.selected_ship == 0:
+                    self.selected_ship = 2
+                elif self.selected_ship == 1:
+                    self.selected_ship = 3
+                else:
+                    self.selected_option = 1
+        if event.key == pygame.K_LEFT and self.selected_option == 0:
+            self.selected_ship = (self.selected_ship - 1) % len(PLAYER_IMGS)
+        if event.key == pygame.K_RIGHT and self.selected_option == 0:
+            self.selected_ship = (self.selected_ship + 1) % len(PLAYER_IMGS)
+        if event.key == pygame.K_RETURN:
+            fade_screen()
+            if self.selected_option == 1:
+                scenes.pop()
+            else:
+                scenes.switch(GameplayScene(PLAYER_IMGS[self.selected_ship]))
+        elif event.key == pygame.K_ESCAPE:
+            fade_screen()
+            scenes.pop()
 
-    while True:
+    def draw(self):
         GAME_SURFACE.blit(SELECT_SHIP_IMG, ((WIDTH - SELECT_SHIP_IMG.get_width()) // 2, (HEIGHT - SELECT_SHIP_IMG.get_height()) // 2))
 
-        for i, ship_img in enumerate(display_ships):
+        for i, ship_img in enumerate(self.display_ships):
             if i < 2:
                 x = WIDTH//2 - 100 if i == 0 else WIDTH//2 + 100
                 y = HEIGHT//2 - 80 - ship_img.get_height()//2
@@ -1124,198 +2190,146 @@ def ship_selection_menu():
                 x = WIDTH//2 - 100 if i == 2 else WIDTH//2 + 100
                 y = HEIGHT//2 + 80 - ship_img.get_height()//2
             GAME_SURFACE.blit(ship_img, (x - ship_img.get_width()//2, y))
-            if selected_option == 0 and i == selected_ship:
+            if self.selected_option == 0 and i == self.selected_ship:
                 pygame.draw.rect(GAME_SURFACE, GREEN, (x - ship_img.get_width()//2 - 5, y - 5, ship_img.get_width() + 10, ship_img.get_height() + 10), 3)
 
-        GAME_SURFACE.blit(back_text_selected if selected_option == 1 else back_text, (WIDTH//2 - back_text.get_width()//2, 600))
+        GAME_SURFACE.blit(self.back_text_selected if self.selected_option == 1 else self.back_text, (WIDTH//2 - self.back_text.get_width()//2, 600))
 
         render_game()
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                if event.key == pygame.K_UP:
-                    if selected_option == 1:
-                        selected_option = 0
-                    elif selected_ship == 2:
-                        selected_ship = 0
-                    elif selected_ship == 3:
-                        selected_ship = 1
-                    else:
-                        selected_ship = selected_ship + 2
-                if event.key == pygame.K_DOWN:
-                    if selected_option == 0:
-                        if selected_ship == 0:
-                            selected_ship = 2
-                        elif selected_ship == 1:
-                            selected_ship = 3
-                        else:
-                            selected_option = 1
-                if event.key == pygame.K_LEFT and selected_option == 0:
-                    selected_ship = (selected_ship - 1) % len(PLAYER_IMGS)
-                if event.key == pygame.K_RIGHT and selected_option == 0:
-                    selected_ship = (selected_ship + 1) % len(PLAYER_IMGS)
-                if event.key == pygame.K_RETURN:
-                    fade_screen()
-                    if selected_option == 1:
-                        return "main_menu"
-                    return PLAYER_IMGS[selected_ship]
-                if event.key == pygame.K_ESCAPE:
-                    fade_screen()
-                    return "main_menu"
-
-        # Update debounce timer
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
-
 # Controls screen
-def controls_screen():
-    global fullscreen_debounce_timer
-    fade_screen()
-    control_font = pygame.font.SysFont("arial", 28)
-    option_font = pygame.font.SysFont("arial", 28)
-    
-    control_texts = [
-        control_font.render("Left Arrow: Move Left", True, WHITE),
-        control_font.render("Right Arrow: Move Right", True, WHITE),
-        control_font.render("Up Arrow: Move Up", True, WHITE),
-        control_font.render("Down Arrow: Move Down", True, WHITE),
-        control_font.render("Space: Shoot", True, WHITE),
-        control_font.render("M: Fire Missile (with powerup)", True, WHITE),
-        control_font.render("B: Use Bomb (with powerup)", True, WHITE),
-        control_font.render("P or ESC: Pause", True, WHITE),
-        control_font.render("F11: Toggle Fullscreen", True, WHITE),
-        control_font.render("F1: FPS, F2: Debug", True, WHITE),
-        control_font.render("Up/Down Arrows: Navigate Menus", True, WHITE),
-        control_font.render("Enter: Select Menu Option", True, WHITE)
-    ]
-    back_text = option_font.render("Back", True, WHITE)
-    back_text_selected = option_font.render("Back", True, GREEN)
-    selected = 0
+class ControlsScreen(Scene):
+    def enter(self):
+        asset_loader.require("CONTROLS_IMG")
+        fade_screen()
+        control_font = pygame.font.SysFont("arial", 28)
+        option_font = pygame.font.SysFont("arial", 28)
+        
+        self.control_texts = [
+            control_font.render("Left Arrow: Move Left", True, WHITE),
+            control_font.render("Right Arrow: Move Right", True, WHITE),
+            control_font.render("Up Arrow: Move Up", True, WHITE),
+            control_font.render("Down Arrow: Move Down", True, WHITE),
+            control_font.render("Space: Shoot", True, WHITE),
+            control_font.render("M: Fire Missile (with powerup)", True, WHITE),
+            control_font.render("B: Use Bomb (with powerup)", True, WHITE),
+            control_font.render("P or ESC: Pause", True, WHITE),
+            control_font.render("F11: Toggle Fullscreen", True, WHITE),
+            control_font.render("F1: FPS, F2: Debug", True, WHITE),
+            control_font.render("Up/Down Arrows: Navigate Menus", True, WHITE),
+            control_font.render("Enter: Select Menu Option", True, WHITE)
+        ]
+        self.back_text = option_font.render("Back", True, WHITE)
+        self.back_text_selected = option_font.render("Back", True, GREEN)
+        self.selected = 0
 
-    while True:
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_UP or event.key == pygame.K_DOWN:
+            self.selected = 1 - self.selected
+        if event.key == pygame.K_RETURN or event.key == pygame.K_ESCAPE:
+            fade_screen()
+            scenes.pop()
+
+    def draw(self):
         GAME_SURFACE.blit(CONTROLS_IMG, ((WIDTH - CONTROLS_IMG.get_width()) // 2, (HEIGHT - CONTROLS_IMG.get_height()) // 2))
 
-        for i, text in enumerate(control_texts):
+        for i, text in enumerate(self.control_texts):
             GAME_SURFACE.blit(text, (WIDTH//2 - text.get_width()//2, 140 + i * 35))
 
-        GAME_SURFACE.blit(back_text_selected if selected else back_text, (WIDTH//2 - back_text.get_width()//2, 560))
+        GAME_SURFACE.blit(self.back_text_selected if self.selected else self.back_text, (WIDTH//2 - self.back_text.get_width()//2, 560))
 
         render_game()
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                if event.key == pygame.K_UP or event.key == pygame.K_DOWN:
-                    selected = 1 - selected
-                if event.key == pygame.K_RETURN or event.key == pygame.K_ESCAPE:
-                    fade_screen()
-                    return
-
-        # Update debounce timer
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
-
 # About Screen
-def about_screen():
-    global fullscreen_debounce_timer
-    fade_screen()
-    instruction_font = pygame.font.SysFont("arial", 24)
-    text_font = pygame.font.SysFont("arial", 22)
-    instruction_text = instruction_font.render("Press ESC to return to menu", True, WHITE)
-
-    # Define scrolling text content
-    scroll_text = [
-        ("Game Overview", True),
-        ("Star Fighter is a vertical-scrolling space shooter where you,", False),
-        ("as Commander Aria Vex, pilot the Aetherion to battle the Xerath", False),
-        ("Dominion’s forces in the Nebula Sector. Survive waves of enemies,", False),
-        ("defeat powerful bosses, and collect power-ups to strengthen your ship.", False),
-        ("Progress through increasingly difficult levels, earn high scores, and", False),
-        ("save humanity from annihilation. The game features immersive visuals,", False),
-        ("dynamic audio, and a variety of gameplay mechanics to test your skill", False),
-        ("and strategy.", False),
-        ("", False),
-        ("Game Credits", True),
-        ("Lead Developer: Rizwan N", False),
-        ("Art Designer: Rizwan N", False),
-        ("Music and Sound Effects: freesound.org", False),
-        ("Game Design: Rizwan N", False),
-        ("Thanks: Grok AI, Open AI", False),
-        ("", False),
-        ("Created with Pygame and Python", False),
-        ("Version 1.0 - May 2025", False),
-        ("", False),
-        ("", False),
-        ("Special Thanks", True),
-        ("Thank you for playing Star Fighter! As Commander Aria Vex, you hold", False),
-        ("humanity’s fate in your hands. Unravel the Dominion’s secrets, destroy", False),
-        ("The Oblivion, and save the galaxy. Launch Aetherion and write your", False),
-        ("legend among the stars!", False)
-    ]
+class AboutScreen(Scene):
+    animated = True  # The credits scroll continuously
 
-    # Pre-render text surfaces
-    text_surfaces = []
-    for text, is_heading in scroll_text:
-        color = GREEN if is_heading else WHITE
-        surface = text_font.render(text, True, color)
-        text_surfaces.append((surface, is_heading))
+    def enter(self):
+        asset_loader.require("ABOUT_IMG")
+        fade_screen()
+        instruction_font = pygame.font.SysFont("arial", 24)
+        text_font = pygame.font.SysFont("arial", 22)
+        self.instruction_text = instruction_font.render("Press ESC to return to menu", True, WHITE)
+
+        # Define scrolling text content
+        scroll_text = [
+            ("Game Overview", True),
+            ("Star Fighter is a vertical-scrolling space shooter where you,", False),
+            ("as Commander Aria Vex, pilot the Aetherion to battle the Xerath", False),
+            ("Dominion’s forces in the Nebula Sector. Survive waves of enemies,", False),
+            ("defeat powerful bosses, and collect power-ups to strengthen your ship.", False),
+            ("Progress through increasingly difficult levels, earn high scores, and", False),
+            ("save humanity from annihilation. The game features immersive visuals,", False),
+            ("dynamic audio, and a variety of gameplay mechanics to test your skill", False),
+            ("and strategy.", False),
+            ("", False),
+            ("Game Credits", True),
+            ("Lead Developer: Rizwan N", False),
+            ("Art Designer: Rizwan N", False),
+            ("Music and Sound Effects: freesound.org", False),
+            ("Game Design: Rizwan N", False),
+            ("Thanks: Grok AI, Open AI", False),
+            ("", False),
+            ("Created with Pygame and Python", False),
+            ("Version 1.0 - May 2025", False),
+            ("", False),
+            ("", False),
+            ("Special Thanks", True),
+            ("Thank you for playing Star Fighter! As Commander Aria Vex, you hold", False),
+            ("humanity’s fate in your hands. Unravel the Dominion’s secrets, destroy", False),
+            ("The Oblivion, and save the galaxy. Launch Aetherion and write your", False),
+            ("legend among the stars!", False)
+        ]
 
-    # Scroll parameters
-    scroll_speed = 1  # Pixels per frame
-    text_y = HEIGHT - 120  # Start at bottom of display area (y=780)
-    total_text_height = sum(surface.get_height() + (20 if is_heading else 10) for surface, is_heading in text_surfaces)
-    display_area_height = (HEIGHT - 120) - 170  # 780 - 170 = 610 pixels
-    scroll_loop_height = total_text_height + display_area_height  # Total height including gap for looping
+        # Pre-render text surfaces
+        self.text_surfaces = []
+        for text, is_heading in scroll_text:
+            color = GREEN if is_heading else WHITE
+            surface = text_font.render(text, True, color)
+            self.text_surfaces.append((surface, is_heading))
+
+        # Scroll parameters
+        self.scroll_speed = 1  # Pixels per frame
+        self.text_y = HEIGHT - 120  # Start at bottom of display area (y=780)
+        self.total_text_height = sum(surface.get_height() + (20 if is_heading else 10) for surface, is_heading in self.text_surfaces)
+        display_area_height = (HEIGHT - 120) - 170  # 780 - 170 = 610 pixels
+        self.scroll_loop_height = self.total_text_height + display_area_height  # Total height including gap for looping
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            fade_screen()
+            scenes.pop()
+
+    def update(self, frame_ms):
+        # Update scroll position
+        self.text_y -= self.scroll_speed
+        if self.text_y <= 170 - self.total_text_height:
+            self.text_y += self.scroll_loop_height  # Loop back to bottom of display area
 
-    while True:
+    def draw(self):
         GAME_SURFACE.blit(ABOUT_IMG, ((WIDTH - ABOUT_IMG.get_width()) // 2, (HEIGHT - ABOUT_IMG.get_height()) // 2))
 
         # Draw scrolling text within y=170 to y=780
-        y = int(text_y)
-        for surface, is_heading in text_surfaces:
+        y = int(self.text_y)
+        for surface, is_heading in self.text_surfaces:
             # Only draw if the text is within the display area
             if y > 170 - surface.get_height() and y < HEIGHT - 120:
                 x = WIDTH // 2 - surface.get_width() // 2
                 GAME_SURFACE.blit(surface, (x, y))
             y += surface.get_height() + (20 if is_heading else 10)
 
-        # Update scroll position
-        text_y -= scroll_speed
-        if text_y <= 170 - total_text_height:
-            text_y += scroll_loop_height  # Loop back to bottom of display area
-
         # Draw static instruction text
-        GAME_SURFACE.blit(instruction_text, (WIDTH // 2 - instruction_text.get_width() // 2, HEIGHT - 50))
+        GAME_SURFACE.blit(self.instruction_text, (WIDTH // 2 - self.instruction_text.get_width() // 2, HEIGHT - 50))
 
         render_game()
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                if event.key == pygame.K_ESCAPE:
-                    fade_screen()
-                    return
-
-        # Update debounce timer
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
-
 # Reset game state
-def reset_game(ship_image):
-    global score, level, wave, max_waves, enemies_per_wave, base_enemies, enemies_spawned, boss_spawned, powerup_timer, missile_timer, bg_y, game_started, level_transition_delay, delay_timer, player, player_group, last_score, last_level, score_text, level_text, bomb_flash_timer, BG, asteroid_spawn_timer, max_asteroids
+def reset_game(ship_image, seed=RUN_SEED):
+    global score, level, wave, max_waves, enemies_per_wave, base_enemies, enemies_spawned, boss_spawned, spawn_timer, powerup_timer, missile_timer, bg_y, game_started, level_transition_delay, delay_timer, player, player_group, bomb_flash_timer, BG, asteroid_spawn_timer, max_asteroids, sim_tick
+    rng.reseed(seed)
+    sim_tick = 0
     score = 0
     level = 1
     wave = 1
@@ -1324,6 +2338,7 @@ def reset_game(ship_image):
     enemies_per_wave = math.ceil(base_enemies * 0.5)
     enemies_spawned = 0
     boss_spawned = False
+    spawn_timer = 0
     powerup_timer = 0
     missile_timer = 0
     asteroid_spawn_timer = 0
@@ -1333,15 +2348,11 @@ def reset_game(ship_image):
     level_transition_delay = False
     delay_timer = 0
     bomb_flash_timer = 0
-    last_score = -1
-    last_level = -1
-    score_text = None
-    level_text = None
     player = Player(ship_image)
     player_group = pygame.sprite.GroupSingle(player)
     # Random BG initialization
     if BACKGROUNDS:
-        BG = random.choice(BACKGROUNDS)
+        BG = rng.scenery.choice(BACKGROUNDS)
     else:
         BG = pygame.Surface((WIDTH, HEIGHT))
         BG.fill(BLACK)
@@ -1355,361 +2366,390 @@ def reset_game(ship_image):
     missile_powerups.empty()
     speed_powerups.empty()
     bomb_powerups.empty()
-    boss_bullets.empty()
-    enemy_bullets.empty()
-    bombs.empty()
+    projectiles.reset()
     artillery_shells.empty()
     asteroids.empty()
-    play_game_music()
+    music.play("GAME_MUSIC", restart=True)
 
 # Input initials for high score
-def input_initials(score):
-    global fullscreen_debounce_timer
-    instruction_font = pygame.font.SysFont("arial", 24)
-    input_font = pygame.font.SysFont("arial", 36)
-    
-    instruction_text = instruction_font.render("Enter 3 initials (A-Z), Press ENTER or ESC", True, WHITE)
-    score_text = instruction_font.render(f"Score: {score}", True, WHITE)
-    NEW_HIGH_SCORE_IMG = pygame.image.load("assets/new_high_score.png")
-    
-    pygame.mixer.music.stop()
-    pygame.mixer.stop()
-    global is_menu_music_playing
-    is_menu_music_playing = False
-    if GAME_OVER_SOUND and not GAME_OVER_CHANNEL.get_busy():
-        if DEBUG_PRINT:
-            print("Playing game_over.wav in input_initials")
-        GAME_OVER_CHANNEL.play(GAME_OVER_SOUND)
-    
-    initials = ["A", "A", "A"]
-    current_pos = 0
-    
-    while True:
-        GAME_SURFACE.blit(NEW_HIGH_SCORE_IMG, ((WIDTH - NEW_HIGH_SCORE_IMG.get_width()) // 2, 0))
+class InitialsEntry(Scene):
+    def __init__(self, score):
+        self.score = score
+
+    def enter(self):
+        instruction_font = pygame.font.SysFont("arial", 24)
+        self.input_font = pygame.font.SysFont("arial", 36)
+        
+        self.instruction_text = instruction_font.render("Enter 3 initials (A-Z), Press ENTER or ESC", True, WHITE)
+        self.score_text = instruction_font.render(f"Score: {self.score}", True, WHITE)
+        self.new_high_score_img = convert_surface(load_image("assets/new_high_score.png"))
+        
+        music.stop()
+        audio.stop()
+        if GAME_OVER_SOUND and not GAME_OVER_CHANNEL.get_busy():
+            if DEBUG_PRINT:
+                print("Playing game_over.wav in input_initials")
+            GAME_OVER_CHANNEL.play(GAME_OVER_SOUND)
+        
+        self.initials = ["A", "A", "A"]
+        self.current_pos = 0
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_LEFT and self.current_pos > 0:
+            self.current_pos -= 1
+        if event.key == pygame.K_RIGHT and self.current_pos < 2:
+            self.current_pos += 1
+        if event.key == pygame.K_UP:
+            current_letter = self.initials[self.current_pos]
+            next_letter = chr(ord(current_letter) + 1) if ord(current_letter) < ord('Z') else 'A'
+            self.initials[self.current_pos] = next_letter
+        if event.key == pygame.K_DOWN:
+            current_letter = self.initials[self.current_pos]
+            next_letter = chr(ord(current_letter) - 1) if ord(current_letter) > ord('A') else 'Z'
+            self.initials[self.current_pos] = next_letter
+        if event.key == pygame.K_RETURN or event.key == pygame.K_ESCAPE:
+            # Do not stop game over sound, let it continue
+            high_scores.add("".join(self.initials), self.score)
+            scenes.pop()
+
+    def draw(self):
+        GAME_SURFACE.blit(self.new_high_score_img, ((WIDTH - self.new_high_score_img.get_width()) // 2, 0))
         
-        GAME_SURFACE.blit(instruction_text, (WIDTH//2 - instruction_text.get_width()//2, HEIGHT//2 + 120))
-        GAME_SURFACE.blit(score_text, (WIDTH//2 - score_text.get_width()//2, HEIGHT//2 + 40))
+        GAME_SURFACE.blit(self.instruction_text, (WIDTH//2 - self.instruction_text.get_width()//2, HEIGHT//2 + 120))
+        GAME_SURFACE.blit(self.score_text, (WIDTH//2 - self.score_text.get_width()//2, HEIGHT//2 + 40))
         
-        for i, letter in enumerate(initials):
-            color = GREEN if i == current_pos else WHITE
-            letter_text = input_font.render(letter, True, color)
+        for i, letter in enumerate(self.initials):
+            color = GREEN if i == self.current_pos else WHITE
+            letter_text = render_text(self.input_font, letter, color)
             GAME_SURFACE.blit(letter_text, (WIDTH//2 - 60 + i * 40, HEIGHT//2 - 40))
         
         render_game()
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                if GAME_OVER_CHANNEL.get_busy():
-                    GAME_OVER_CHANNEL.stop()
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                if event.key == pygame.K_LEFT and current_pos > 0:
-                    current_pos -= 1
-                if event.key == pygame.K_RIGHT and current_pos < 2:
-                    current_pos += 1
-                if event.key == pygame.K_UP:
-                    current_letter = initials[current_pos]
-                    next_letter = chr(ord(current_letter) + 1) if ord(current_letter) < ord('Z') else 'A'
-                    initials[current_pos] = next_letter
-                if event.key == pygame.K_DOWN:
-                    current_letter = initials[current_pos]
-                    next_letter = chr(ord(current_letter) - 1) if ord(current_letter) > ord('A') else 'Z'
-                    initials[current_pos] = next_letter
-                if event.key == pygame.K_RETURN or event.key == pygame.K_ESCAPE:
-                    # Do not stop game over sound, let it continue
-                    initials_str = "".join(initials)
-                    return initials_str
-
-        # Update debounce timer
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
-
-# Save high score with initials
-def save_high_score(initials, score, scores):
-    global fullscreen_debounce_timer
-    high_score_file = "high_scores.txt"
-    scores.append((initials.upper(), score))
-    scores = sorted(scores, key=lambda x: x[1], reverse=True)[:5]
-    
+
+# High scores: every finished game is appended to a SQLite database, one
+# leaderboard per cabinet. The top of the board is cached in memory and all
+# database work runs on one background thread, so saving never stalls a frame.
+HIGH_SCORE_DB = "high_scores.db"
+LEGACY_HIGH_SCORE_FILE = "high_scores.txt"  # Imported once when the database is created
+HIGH_SCORE_SLOTS = 5
+CABINET_ID = os.environ.get("STAR_FIGHTER_CABINET", "default")
+
+def read_legacy_high_scores(path):
+    scores = []
     try:
-        with open(high_score_file, "w", encoding="utf-8") as file:
-            for init, s in scores:
-                file.write(f"{init},{s}\n")
-    except Exception:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    try:
+                        init, s = line.strip().split(",")
+                        if len(init) == 3 and init.isalpha() and s.isdigit():
+                            scores.append((init.upper(), int(s)))
+                    except ValueError:
+                        continue
+    except OSError:
         pass
+    return scores
+
+class HighScoreStore:
+    def __init__(self, path, cabinet=CABINET_ID, slots=HIGH_SCORE_SLOTS):
+        self.path = path
+        self.cabinet = cabinet
+        self.slots = slots
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="high-scores")
+        self.connection = None  # Only touched from the worker thread
+        self.loading = None
+        self.cache = None  # Top entries as (initials, score), best first
+
+    def preload(self):
+        if self.loading is None:
+            self.loading = self.executor.submit(self.open)
+
+    def open(self):
+        try:
+            create = not os.path.exists(self.path)
+            self.connection = sqlite3.connect(self.path)
+            # Write-ahead logging keeps the table intact if the game dies mid-write
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            with self.connection:
+                self.connection.execute("CREATE TABLE IF NOT EXISTS scores (id INTEGER PRIMARY KEY, cabinet TEXT NOT NULL, initials TEXT NOT NULL, score INTEGER NOT NULL)")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_rank ON scores (cabinet, score DESC)")
+                if create:
+                    self.connection.executemany("INSERT INTO scores (cabinet, initials, score) VALUES (?, ?, ?)",
+                                                [(self.cabinet, init, s) for init, s in read_legacy_high_scores(LEGACY_HIGH_SCORE_FILE)])
+        except sqlite3.Error as e:
+            # Scores still work for this session, they just are not kept
+            if DEBUG_PRINT:
+                print(f"Error opening high scores: {e}")
+            self.connection = None
+        return self.query_top(self.slots)
+
+    def query(self, sql, args):
+        if self.connection is None:
+            return []
+        try:
+            return self.connection.execute(sql, args).fetchall()
+        except sqlite3.Error as e:
+            if DEBUG_PRINT:
+                print(f"Error reading high scores: {e}")
+            return []
+
+    def query_top(self, k, offset=0):
+        # Ties keep the order the scores were set in
+        return self.query("SELECT initials, score FROM scores WHERE cabinet = ? ORDER BY score DESC, id LIMIT ? OFFSET ?",
+                          (self.cabinet, k, offset))
+
+    def insert(self, initials, score):
+        if self.connection is None:
+            return
+        try:
+            with self.connection:
+                self.connection.execute("INSERT INTO scores (cabinet, initials, score) VALUES (?, ?, ?)", (self.cabinet, initials, score))
+        except sqlite3.Error as e:
+            if DEBUG_PRINT:
+                print(f"Error saving high score: {e}")
+
+    def top(self, k=HIGH_SCORE_SLOTS, offset=0):
+        if self.cache is None:
+            self.preload()
+            self.cache = self.loading.result()
+        if offset + k <= self.slots:
+            return self.cache[offset:offset + k]
+        # Deeper pages come from the index; queued writes land first
+        return self.executor.submit(self.query_top, k, offset).result()
+
+    def query_rank(self, score):
+        # 1-based position a score would take on the board, counted from the index
+        rows = self.query("SELECT COUNT(*) FROM scores WHERE cabinet = ? AND score > ?", (self.cabinet, score))
+        return rows[0][0] + 1 if rows else 1
+
+    def rank(self, score):
+        # A future, so a screen can show the rank once the count is done
+        return self.executor.submit(self.query_rank, score)
+
+    def qualifies(self, score):
+        top = self.top()
+        return len(top) < self.slots or score > top[-1][1]
+
+    def add(self, initials, score):
+        # Scores below the board are stored too, but never reach the cache
+        top = self.top()
+        index = next((i for i, (_, s) in enumerate(top) if s < score), len(top))
+        self.cache = (top[:index] + [(initials.upper(), score)] + top[index:])[:self.slots]
+        self.executor.submit(self.insert, initials.upper(), score)
+
+    def close(self):
+        # Waits for queued writes to reach the database
+        if self.loading is not None:
+            self.executor.submit(lambda: self.connection and self.connection.close())
+        self.executor.shutdown(wait=True)
+
+high_scores = HighScoreStore(HIGH_SCORE_DB)
 
 # Main Menu
 def main():
-    global level
     pygame.display.set_caption("Star Fighter")
-    clock = pygame.time.Clock()
-    play_menu_music()
+    high_scores.preload()
+    if REPLAY_PATH:
+        replay = load_replay(REPLAY_PATH)
+        asset_loader.require("PLAYER_IMGS")
+        scenes.run(GameplayScene(PLAYER_IMGS[replay.ship], replay))
+    else:
+        scenes.run(StartScreen())
+    high_scores.close()
+    tracer.close()
+    save_writer.shutdown(wait=True)
+    if GAME_OVER_CHANNEL.get_busy():
+        GAME_OVER_CHANNEL.stop()
+    pygame.quit()
+    sys.exit()
+
+class MainMenu(Scene):
+    def enter(self):
+        asset_loader.require("MAIN_MENU_IMG")
+        music.play("MENU_MUSIC")
+        fade_screen()
+        option_font = pygame.font.SysFont("arial", 28)
+        self.saved_game = load_saved_game()
+        self.options = (["Continue"] if self.saved_game else []) + ["New Game", "High Scores", "Controls", "About", "Quit"]
+        self.option_texts = [option_font.render(opt, True, WHITE) for opt in self.options]
+        self.option_texts_selected = [option_font.render(opt, True, GREEN) for opt in self.options]
+        self.selected = 0
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_UP:
+            self.selected = (self.selected - 1) % len(self.options)
+        if event.key == pygame.K_DOWN:
+            self.selected = (self.selected + 1) % len(self.options)
+        if event.key == pygame.K_RETURN:
+            option = self.options[self.selected]
+            if option == "Continue":
+                scenes.switch(GameplayScene(None, resume=self.saved_game))
+            elif option == "New Game":
+                scenes.push(ShipSelectionMenu())
+            elif option == "High Scores":
+                fade_screen()
+                scenes.push(HighScoresScreen())
+            elif option == "Controls":
+                fade_screen()
+                scenes.push(ControlsScreen())
+            elif option == "About":
+                fade_screen()
+                scenes.push(AboutScreen())
+            elif option == "Quit":
+                scenes.quit()
+        if event.key == pygame.K_ESCAPE:
+            scenes.quit()
 
-    start_screen()
-    while True:
-        choice = main_menu()
-        if choice == "quit":
-            pygame.quit()
-            sys.exit()
-        elif choice == "new_game":
-            selected_ship = ship_selection_menu()
-            if selected_ship == "main_menu":
-                continue
-            elif selected_ship:
-                result = run_game(selected_ship)
-                if result == "game_over":
-                    result = game_over()
-                    if result == "retry":
-                        continue
-                    elif result == "main_menu":
-                        play_menu_music()
-                        continue
-                    elif result == "quit":
-                        pygame.quit()
-                        sys.exit()
-                elif result == "main_menu":
-                    play_menu_music()
-                    continue
-                elif result == "quit":
-                    pygame.quit()
-                    sys.exit()
-
-def main_menu():
-    global fullscreen_debounce_timer
-    play_menu_music()
-    fade_screen()
-    option_font = pygame.font.SysFont("arial", 28)
-    options = ["New Game", "High Scores", "Controls", "About", "Quit"]
-    option_texts = [option_font.render(opt, True, WHITE) for opt in options]
-    option_texts_selected = [option_font.render(opt, True, GREEN) for opt in options]
-    selected = 0
+    def update(self, frame_ms):
+        asset_loader.poll()
 
-    while True:
-        clock.tick(FPS)
+    def draw(self):
         GAME_SURFACE.blit(MAIN_MENU_IMG, ((WIDTH - MAIN_MENU_IMG.get_width()) // 2, (HEIGHT - MAIN_MENU_IMG.get_height()) // 2))
 
-        for i, (text, text_selected) in enumerate(zip(option_texts, option_texts_selected)):
-            GAME_SURFACE.blit(text_selected if i == selected else text, (WIDTH//2 - text.get_width()//2, 300 + i * 40))
+        for i, (text, text_selected) in enumerate(zip(self.option_texts, self.option_texts_selected)):
+            GAME_SURFACE.blit(text_selected if i == self.selected else text, (WIDTH//2 - text.get_width()//2, 300 + i * 40))
 
         render_game()
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                if event.key == pygame.K_UP:
-                    selected = (selected - 1) % len(options)
-                if event.key == pygame.K_DOWN:
-                    selected = (selected + 1) % len(options)
-                if event.key == pygame.K_RETURN:
-                    if options[selected] == "New Game":
-                        return "new_game"
-                    elif options[selected] == "High Scores":
-                        fade_screen()
-                        high_scores_screen()
-                    elif options[selected] == "Controls":
-                        fade_screen()
-                        controls_screen()
-                    elif options[selected] == "About":
-                        fade_screen()
-                        about_screen()
-                    elif options[selected] == "Quit":
-                        pygame.quit()
-                        sys.exit()
-                if event.key == pygame.K_ESCAPE:
-                    pygame.quit()
-                    sys.exit()
-
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
-
 # High Scores Screen
-def high_scores_screen():
-    global fullscreen_debounce_timer
-    score_font = pygame.font.SysFont("arial", 28)
-    instruction_font = pygame.font.SysFont("arial", 24)
-    
-    instruction_text = instruction_font.render("Press ENTER or ESC to return to menu", True, WHITE)
-    
-    high_score_file = "high_scores.txt"
-    scores = [("---", 0)] * 5
-    try:
-        if os.path.exists(high_score_file):
-            with open(high_score_file, "r", encoding="utf-8") as file:
-                temp_scores = []
-                for line in file:
-                    if line.strip():
-                        try:
-                            init, s = line.strip().split(",")
-                            if len(init) == 3 and init.isalpha() and s.isdigit():
-                                temp_scores.append((init.upper(), int(s)))
-                        except ValueError:
-                            continue
-                scores = temp_scores + [("---", 0)] * (5 - len(temp_scores))
-    except Exception:
-        pass
-    
-    score_texts = [score_font.render(f"{i+1}. {init} {score}", True, WHITE) for i, (init, score) in enumerate(scores[:5])]
+class HighScoresScreen(Scene):
+    def enter(self):
+        asset_loader.require("HIGH_SCORES_IMG")
+        score_font = pygame.font.SysFont("arial", 28)
+        instruction_font = pygame.font.SysFont("arial", 24)
+        
+        self.instruction_text = instruction_font.render("Press ENTER or ESC to return to menu", True, WHITE)
+        
+        scores = high_scores.top()
+        scores += [("---", 0)] * (HIGH_SCORE_SLOTS - len(scores))
+        
+        self.score_texts = [score_font.render(f"{i+1}. {init} {score}", True, WHITE) for i, (init, score) in enumerate(scores)]
 
-    while True:
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and (event.key == pygame.K_RETURN or event.key == pygame.K_ESCAPE):
+            fade_screen()
+            scenes.pop()
+
+    def draw(self):
         GAME_SURFACE.blit(HIGH_SCORES_IMG, ((WIDTH - HIGH_SCORES_IMG.get_width()) // 2, (HEIGHT - HIGH_SCORES_IMG.get_height()) // 2))
         
-        for i, text in enumerate(score_texts):
+        for i, text in enumerate(self.score_texts):
             GAME_SURFACE.blit(text, (WIDTH//2 - text.get_width()//2, 250 + i * 40))
         
-        GAME_SURFACE.blit(instruction_text, (WIDTH//2 - instruction_text.get_width()//2, 500))
+        GAME_SURFACE.blit(self.instruction_text, (WIDTH//2 - self.instruction_text.get_width()//2, 500))
         render_game()
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                if event.key == pygame.K_RETURN or event.key == pygame.K_ESCAPE:
-                    fade_screen()
-                    return
-
-        # Update debounce timer
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
-
 # Pause Menu
-def pause_menu():
-    global is_menu_music_playing, fullscreen_debounce_timer
-    pygame.mixer.music.pause()
-    play_menu_music()
-    option_font = pygame.font.SysFont("arial", 28)
-    options = ["Resume", "Restart", "Main Menu", "Quit"]
-    option_texts = [option_font.render(opt, True, WHITE) for opt in options]
-    option_texts_selected = [option_font.render(opt, True, GREEN) for opt in options]
-    selected = 0
-    
-    while True:
+class PauseMenu(Scene):
+    def __init__(self, game):
+        self.game = game
+
+    def enter(self):
+        music.play("MENU_MUSIC", pause_current=True)
+        option_font = pygame.font.SysFont("arial", 28)
+        self.options = ["Resume", "Restart", "Main Menu", "Quit"]
+        self.option_texts = [option_font.render(opt, True, WHITE) for opt in self.options]
+        self.option_texts_selected = [option_font.render(opt, True, GREEN) for opt in self.options]
+        self.selected = 0
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_UP:
+            self.selected = (self.selected - 1) % len(self.options)
+        if event.key == pygame.K_DOWN:
+            self.selected = (self.selected + 1) % len(self.options)
+        if event.key == pygame.K_RETURN:
+            option = self.options[self.selected]
+            if option == "Resume":
+                music.play("GAME_MUSIC")
+                scenes.pop()
+            elif option == "Restart":
+                scenes.pop()
+                self.game.restart()
+            elif option == "Main Menu":
+                scenes.switch(MainMenu())
+            elif option == "Quit":
+                scenes.quit()
+
+    def draw(self):
         GAME_SURFACE.fill((0, 0, 0))
         GAME_SURFACE.blit(GAME_PAUSED_IMG, ((WIDTH - GAME_PAUSED_IMG.get_width()) // 2, (HEIGHT - GAME_PAUSED_IMG.get_height()) // 2))
-        for i, (text, text_selected) in enumerate(zip(option_texts, option_texts_selected)):
-            GAME_SURFACE.blit(text_selected if i == selected else text, (WIDTH//2 - text.get_width()//2, HEIGHT//2 - 100 + i * 40))
+        for i, (text, text_selected) in enumerate(zip(self.option_texts, self.option_texts_selected)):
+            GAME_SURFACE.blit(text_selected if i == self.selected else text, (WIDTH//2 - text.get_width()//2, HEIGHT//2 - 100 + i * 40))
         render_game()
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                if event.key == pygame.K_UP:
-                    selected = (selected - 1) % len(options)
-                if event.key == pygame.K_DOWN:
-                    selected = (selected + 1) % len(options)
-                if event.key == pygame.K_RETURN:
-                    if options[selected] == "Resume":
-                        pygame.mixer.music.stop()
-                        play_game_music()
-                    elif options[selected] == "Restart":
-                        pass
-                    elif options[selected] == "Main Menu":
-                        pass
-                    return options[selected].lower()
-
-        # Update debounce timer
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
 
 # Game Over
-def game_over():
-    global score, is_menu_music_playing, fullscreen_debounce_timer
-    pygame.mixer.music.stop()
-    pygame.mixer.stop()
-    is_menu_music_playing = False
-    
-    high_score_file = "high_scores.txt"
-    scores = [("---", 0)] * 5
-    try:
-        if os.path.exists(high_score_file):
-            with open(high_score_file, "r", encoding="utf-8") as file:
-                temp_scores = []
-                for line in file:
-                    if line.strip():
-                        try:
-                            init, s = line.strip().split(",")
-                            if len(init) == 3 and init.isalpha() and s.isdigit():
-                                temp_scores.append((init.upper(), int(s)))
-                        except ValueError:
-                            continue
-                scores = temp_scores + [("---", 0)] * (5 - len(temp_scores))
-    except Exception as e:
-        if DEBUG_PRINT:
-            print(f"Error reading high scores: {e}")
+class GameOverScreen(Scene):
+    def __init__(self, ship_image):
+        self.ship_image = ship_image
 
-    if any(score > s[1] for s in scores) or len([s for s in scores if s[1] > 0]) < 5:
-        initials = input_initials(score)
-        save_high_score(initials, score, scores)
-    else:
-        save_high_score("---", score, scores)
-    
-    fade_screen((0, 0, 0))
-    option_font = pygame.font.SysFont("arial", 28)
-    options = ["Retry", "Main Menu", "Quit"]
-    option_texts = [option_font.render(opt, True, WHITE) for opt in options]
-    option_texts_selected = [option_font.render(opt, True, GREEN) for opt in options]
-    selected = 0
-
-    if GAME_OVER_SOUND and not GAME_OVER_CHANNEL.get_busy():
-        if DEBUG_PRINT:
-            print("Playing game_over.wav after fade in game_over")
-        GAME_OVER_CHANNEL.play(GAME_OVER_SOUND)
+    def enter(self):
+        music.stop()
+        audio.stop()
+        
+        option_font = pygame.font.SysFont("arial", 28)
+        self.options = ["Retry", "Main Menu", "Quit"]
+        self.option_texts = [option_font.render(opt, True, WHITE) for opt in self.options]
+        self.option_texts_selected = [option_font.render(opt, True, GREEN) for opt in self.options]
+        self.selected = 0
+
+        self.rank = high_scores.rank(score)
+        # Every game is stored; only scores that make the board get initials
+        if high_scores.qualifies(score):
+            scenes.push(InitialsEntry(score))
+        else:
+            high_scores.add("", score)
+            self.resume()
 
-    while True:
+    def resume(self):
+        # Reached directly, or once the initials have been entered and saved
+        fade_screen((0, 0, 0))
+        if GAME_OVER_SOUND and not GAME_OVER_CHANNEL.get_busy():
+            if DEBUG_PRINT:
+                print("Playing game_over.wav after fade in game_over")
+            GAME_OVER_CHANNEL.play(GAME_OVER_SOUND)
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_UP:
+            self.selected = (self.selected - 1) % len(self.options)
+        if event.key == pygame.K_DOWN:
+            self.selected = (self.selected + 1) % len(self.options)
+        if event.key == pygame.K_RETURN:
+            if GAME_OVER_CHANNEL.get_busy():
+                GAME_OVER_CHANNEL.stop()
+            option = self.options[self.selected]
+            if option == "Retry":
+                scenes.switch(GameplayScene(self.ship_image))
+            elif option == "Main Menu":
+                scenes.switch(MainMenu())
+            elif option == "Quit":
+                scenes.quit()
+        if event.key == pygame.K_ESCAPE:
+            if GAME_OVER_CHANNEL.get_busy():
+                GAME_OVER_CHANNEL.stop()
+            scenes.switch(MainMenu())
+
+    def draw(self):
         GAME_SURFACE.fill((0, 0, 0))
         GAME_SURFACE.blit(GAME_OVER_IMG, ((WIDTH - GAME_OVER_IMG.get_width()) // 2, (HEIGHT - GAME_OVER_IMG.get_height()) // 2))
-        score_text = font.render(f"Final Score: {score}", True, WHITE)
+        score_text = render_text(font, f"Final Score: {score}", WHITE)
         GAME_SURFACE.blit(score_text, (WIDTH//2 - score_text.get_width()//2, HEIGHT//2))
+        if self.rank.done():
+            rank_text = render_text(font, f"Rank: #{self.rank.result()}", WHITE)
+            GAME_SURFACE.blit(rank_text, (WIDTH//2 - rank_text.get_width()//2, HEIGHT//2 + 30))
 
-        for i, (text, text_selected) in enumerate(zip(option_texts, option_texts_selected)):
-            GAME_SURFACE.blit(text_selected if i == selected else text, (WIDTH//2 - text.get_width()//2, HEIGHT//2 + 60 + i * 40))
+        for i, (text, text_selected) in enumerate(zip(self.option_texts, self.option_texts_selected)):
+            GAME_SURFACE.blit(text_selected if i == self.selected else text, (WIDTH//2 - text.get_width()//2, HEIGHT//2 + 60 + i * 40))
 
         render_game()
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                if GAME_OVER_CHANNEL.get_busy():
-                    GAME_OVER_CHANNEL.stop()
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                if event.key == pygame.K_UP:
-                    selected = (selected - 1) % len(options)
-                if event.key == pygame.K_DOWN:
-                    selected = (selected + 1) % len(options)
-                if event.key == pygame.K_RETURN:
-                    if GAME_OVER_CHANNEL.get_busy():
-                        GAME_OVER_CHANNEL.stop()
-                    if options[selected] == "Retry":
-                        return "retry"
-                    elif options[selected] == "Main Menu":
-                        return "main_menu"
-                    elif options[selected] == "Quit":
-                        pygame.quit()
-                        sys.exit()
-                if event.key == pygame.K_ESCAPE:
-                    if GAME_OVER_CHANNEL.get_busy():
-                        GAME_OVER_CHANNEL.stop()
-                    return "main_menu"
-
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
-
 # Handle waves
 def handle_waves():
     global level, wave, max_waves, enemies_per_wave, base_enemies, enemies_spawned, boss_spawned, level_transition_delay, score, spawn_timer, BG, asteroid_spawn_timer, max_asteroids
@@ -1735,21 +2775,21 @@ def handle_waves():
         enemies_spawned = 0
         boss_spawned = False
         spawn_timer = 0
+        trace_event("wave_start", level=level, wave=wave, enemies=enemies_per_wave)
     if game_started and wave == max_waves and not boss_spawned and not enemies:
         boss = Boss()
         boss_group.add(boss)
         boss_spawned = True
-        enemy_bullets.empty()
-        bombs.empty()
+        trace_event("boss_spawn", level=level, health=boss.health)
+        projectiles.clear(KIND_ENEMY_BULLET, KIND_BOMB)
         artillery_shells.empty()
     if game_started and wave > max_waves:
-        GAME_SURFACE.fill(BLACK)
-        level_text = font.render(f"Level {level} Completed!", True, WHITE)
-        GAME_SURFACE.blit(level_text, (WIDTH//2 - level_text.get_width()//2, HEIGHT//2))
         score += 100
-        render_game()
-        pygame.time.delay(3000)
-        fade_screen()
+        level_text = render_text(font, f"Level {level} Completed!", WHITE)
+        def draw_level_card(surface):
+            surface.blit(level_text, (WIDTH//2 - level_text.get_width()//2, HEIGHT//2))
+        start_transition(Transition(3000, card=draw_level_card, pauses_game=True, then=Transition(FADE_DURATION)))
+        trace_event("level_complete", level=level, score=score)
         level += 1
         wave = 1
         max_waves = min(10, 6 + level - 1)
@@ -1761,7 +2801,7 @@ def handle_waves():
         # Set random background for new level
         if BACKGROUNDS:
             available_backgrounds = [bg for bg in BACKGROUNDS if bg != BG]
-            BG = random.choice(available_backgrounds if available_backgrounds else BACKGROUNDS)
+            BG = rng.scenery.choice(available_backgrounds if available_backgrounds else BACKGROUNDS)
         else:
             BG = pygame.Surface((WIDTH, HEIGHT))
             BG.fill(BLACK)
@@ -1770,9 +2810,7 @@ def handle_waves():
         player.tether_timer = 0
         bullets.empty()
         missiles.empty()
-        boss_bullets.empty()
-        enemy_bullets.empty()
-        bombs.empty()
+        projectiles.clear(KIND_BOSS_BULLET, KIND_ENEMY_BULLET, KIND_BOMB)
         artillery_shells.empty()
     if game_started and wave < max_waves and enemies_spawned < enemies_per_wave and not boss_spawned:
         spawn_timer += 1
@@ -1786,470 +2824,1477 @@ def handle_waves():
             asteroids.add(Asteroid())
             asteroid_spawn_timer = 0
 
-# Main game loop
-def run_game(selected_ship):
-    global game_started, enemies_spawned, enemies_per_wave, base_enemies, powerup_timer, missile_timer, score, bg_y, wave, boss_spawned, level_transition_delay, delay_timer, debug_mode, fps_debug, last_score, last_level, score_text, level_text, last_frame_time, player, player_group, level, max_waves, bomb_flash_timer, BG, asteroid_spawn_timer, max_asteroids, fullscreen_debounce_timer
-    reset_game(selected_ship)
-    countdown_start = pygame.time.get_ticks()
-    countdown_duration = 3000
-
-    while True:
-        frame_start = pygame.time.get_ticks()
-        clock.tick(FPS)
-        keys = pygame.key.get_pressed()
-
-        if keys[pygame.K_F1]:
-            fps_debug = not fps_debug
-            
-        if keys[pygame.K_F2]:
-            debug_mode = not debug_mode
-
-        # Update debounce timer
-        if fullscreen_debounce_timer > 0 and (pygame.time.get_ticks() - fullscreen_debounce_timer) >= FULLSCREEN_DEBOUNCE_DELAY:
-            fullscreen_debounce_timer = 0
-
-        time_elapsed = pygame.time.get_ticks() - countdown_start
-        if time_elapsed < countdown_duration:
-            GAME_SURFACE.fill(BLACK)
-            GAME_SURFACE.blit(LOADING_SCREEN, ((WIDTH - LOADING_SCREEN.get_width()) // 2, 0))
-            render_game()
-            continue
-
-        if not game_started:
-            game_started = True
-
-        if level_transition_delay:
-            delay_timer -= 1
-            if delay_timer <= 0:
-                level_transition_delay = False
-                fade_screen()
-                max_asteroids = max(5, min(8, level - 1)) if level >= 2 else 0
-
-        bg_y = (bg_y + 1) % BG.get_height()
+# Simulation tick: advances the game by one frame given the held keys and the
+# number of fresh SPACE presses (mash shots). Returns "game_over" when the
+# player runs out of lives, otherwise None. The tick runs in three phases,
+# timed separately by the benchmarks: moving everything, resolving
+# collisions, then moving the projectiles fired this tick.
+def update_game(keys, mash_shots=0):
+    global sim_tick
+    if sim_tick % RNG_EPOCH_TICKS == 0:
+        rng.start_epoch(sim_tick)
+    sim_tick += 1
+    update_world(keys, mash_shots)
+    if resolve_collisions() == "game_over":
+        return "game_over"
+    update_projectiles()
+    return None
+
+def update_world(keys, mash_shots=0):
+    global game_started, powerup_timer, missile_timer, bg_y, level_transition_delay, delay_timer, bomb_flash_timer, max_asteroids
+    if not game_started:
+        game_started = True
+
+    if bomb_flash_timer > 0:
+        bomb_flash_timer -= 1
+
+    # Homing targets are re-gathered on the first missile query of each tick
+    target_index.clear()
 
-        handle_waves()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return "quit"
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_F11:
-                    toggle_fullscreen()
-                if event.key == pygame.K_SPACE:
-                    player.shoot(mash=True)
-                if event.key == pygame.K_p or event.key == pygame.K_ESCAPE:
-                    pause_choice = pause_menu()
-                    if pause_choice == "resume":
-                        continue
-                    elif pause_choice == "restart":
-                        reset_game(selected_ship)
-                        countdown_start = pygame.time.get_ticks()
-                        game_started = False
-                        continue
-                    elif pause_choice == "main menu":
-                        return "main_menu"
-                    elif pause_choice == "quit":
-                        return "quit"
-
-        player_group.update(keys)
-        bullets.update()
-        missiles.update()
-        enemies.update()
-        boss_group.update()
-        health_packs.update()
-        powerups.update()
-        shield_powerups.update()
-        missile_powerups.update()
-        speed_powerups.update()
-        bomb_powerups.update()
-        asteroids.update()
-
-        if player.double_shot:
-            powerup_timer -= 1
-            if powerup_timer <= 0:
-                player.double_shot = False
-
-        if player.shield:
-            player.shield_timer -= 1
-            if player.shield_timer <= 0:
-                player.shield = False
+    if level_transition_delay:
+        delay_timer -= 1
+        if delay_timer <= 0:
+            level_transition_delay = False
+            fade_screen()
+            max_asteroids = max(5, min(8, level - 1)) if level >= 2 else 0
+
+    bg_y = (bg_y + BG_SCROLL_SPEED) % BG.get_height()
+
+    handle_waves()
+    profiler.mark(PHASE_WAVES)
+
+    for _ in range(mash_shots):
+        player.shoot(mash=True)
+
+    player_group.update(keys)
+    bullets.update()
+    steer_missiles()
+    enemies.update()
+    boss_group.update()
+    health_packs.update()
+    powerups.update()
+    shield_powerups.update()
+    missile_powerups.update()
+    speed_powerups.update()
+    bomb_powerups.update()
+    asteroids.update()
+
+    if player.double_shot:
+        powerup_timer -= 1
+        if powerup_timer <= 0:
+            player.double_shot = False
+
+    if player.shield:
+        player.shield_timer -= 1
+        if player.shield_timer <= 0:
+            player.shield = False
+
+    if player.missile_shot:
+        missile_timer -= 1
+        if missile_timer <= 0:
+            player.missile_shot = False
+
+    if player.speed_boost:
+        player.speed_timer -= 1
+        if player.speed_timer <= 0:
+            player.speed_boost = False
+            player.speed = player.base_speed
+    profiler.mark(PHASE_UPDATES)
+
+def resolve_collisions():
+    global enemies_spawned, powerup_timer, missile_timer, score, wave, level_transition_delay, delay_timer
+    if not player.shield and not player.invincible:
+        hits = collider.spritecollide(player, enemies, False)
+        boss_collision = collider.spritecollide(player, boss_group, False)
+        projectile_kinds, projectile_damages = projectiles.collide_rect(player.rect)
+        artillery_shell_hits = collider.spritecollide(player, artillery_shells, False)
+        asteroid_hits = collider.spritecollide(player, asteroids, True)
+
+        for hit in hits:
+            player.health -= 20
+            hit.kill()
+            if hit.is_leech and hit.tethered_enemy:
+                hit.tethered_enemy.is_tethered = False
+            play_sound(PLAYER_COLLISION_SOUND)
+            if DEBUG_PRINT:
+                print("Player hit enemy, playing player_collision.wav")
+        if boss_collision:
+            player.health -= 1
+            play_sound(PLAYER_COLLISION_SOUND)
+            if DEBUG_PRINT:
+                print("Player hit boss, playing player_collision.wav")
+        for kind, damage in zip(projectile_kinds.tolist(), projectile_damages.tolist()):
+            player.health -= damage
+            play_sound(PLAYER_COLLISION_SOUND)
+            if DEBUG_PRINT:
+                print(f"Player hit {('boss bullet', 'enemy bullet', 'bomb')[kind]}, playing player_collision.wav")
+        for hit in artillery_shell_hits:
+            if not hit.exploded:
+                player.health -= hit.damage
+                hit.explode()
+                play_sound(PLAYER_COLLISION_SOUND)
+                if DEBUG_PRINT:
+                    print("Player hit artillery shell, playing player_collision.wav")
+        for hit in asteroid_hits:
+            player.health -= hit.damage
+            play_sound(ASTEROID_COLLISION_SOUND)
+            if DEBUG_PRINT:
+                print("Asteroid hit player, playing asteroid_collision.wav")
+
+        if player.health <= 0:
+            play_sound(PLAYER_EXPLOSION_SOUND)
+            player.lives -= 1
+            trace_event("life_lost", lives=player.lives)
+            if player.lives <= 0:
+                profiler.mark(PHASE_COLLISIONS)
+                return "game_over"
+            player.reset()
+            enemies.empty()
+            projectiles.clear(KIND_ENEMY_BULLET, KIND_BOMB)
+            artillery_shells.empty()
+            asteroids.empty()
+            enemies_spawned = 0
 
-        if player.missile_shot:
-            missile_timer -= 1
-            if missile_timer <= 0:
-                player.missile_shot = False
+    bullet_hits = collider.groupcollide(bullets, enemies, True, False)
+    for bullet, hit_enemies in bullet_hits.items():
+        for enemy in hit_enemies:
+            enemy.health -= bullet.damage
+            if enemy.health <= 0:
+                score += enemy.score_value
+                play_sound(EXPLOSION_SOUND)
+                enemy.kill()
+                if enemy.is_leech and enemy.tethered_enemy:
+                    enemy.tethered_enemy.is_tethered = False
+                if rng.loot.random() < 0.05:
+                    health_packs.add(HealthPack(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.1:
+                    powerups.add(PowerUp(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.05:
+                    shield_powerups.add(ShieldPowerUp(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.05:
+                    missile_powerups.add(MissilePowerUp(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.05:
+                    speed_powerups.add(SpeedPowerUp(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.03:
+                    bomb_powerups.add(BombPowerUp(enemy.rect.centerx, enemy.rect.centery))
+
+    bullet_boss_hits = collider.groupcollide(bullets, boss_group, True, False)
+    for bullet, bosses in bullet_boss_hits.items():
+        for boss in bosses:
+            boss.health -= bullet.damage
+            if boss.health <= 0:
+                score += int(250 * (1.25 ** (level - 1)))
+                boss.kill()
+                play_sound(BOSS_EXPLOSION_SOUND)
+                wave += 1
+                level_transition_delay = True
+                delay_timer = 180
+
+    bullet_asteroid_hits = collider.groupcollide(bullets, asteroids, True, False)
+    for bullet, hit_asteroids in bullet_asteroid_hits.items():
+        for asteroid in hit_asteroids:
+            asteroid.health -= 1
+            if asteroid.health <= 0:
+                play_sound(EXPLOSION_SOUND)
+                if DEBUG_PRINT:
+                    print("Asteroid destroyed by bullet, playing explosion.wav")
+                asteroid.kill()
 
-        if player.speed_boost:
-            player.speed_timer -= 1
-            if player.speed_timer <= 0:
-                player.speed_boost = False
-                player.speed = player.base_speed
-
-        if not player.shield and not player.invincible:
-            hits = pygame.sprite.spritecollide(player, enemies, False)
-            boss_collision = pygame.sprite.spritecollide(player, boss_group, False)
-            boss_bullet_hits = pygame.sprite.spritecollide(player, boss_bullets, True)
-            enemy_bullet_hits = pygame.sprite.spritecollide(player, enemy_bullets, True)
-            bomb_hits = pygame.sprite.spritecollide(player, bombs, True)
-            artillery_shell_hits = pygame.sprite.spritecollide(player, artillery_shells, False)
-            asteroid_hits = pygame.sprite.spritecollide(player, asteroids, True)
-
-            for hit in hits:
-                player.health -= 20
-                hit.kill()
-                if hit.is_leech and hit.tethered_enemy:
-                    hit.tethered_enemy.is_tethered = False
-                if PLAYER_COLLISION_SOUND:
-                    PLAYER_COLLISION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Player hit enemy, playing player_collision.wav")
-            if boss_collision:
-                player.health -= 1
-                if PLAYER_COLLISION_SOUND:
-                    PLAYER_COLLISION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Player hit boss, playing player_collision.wav")
-            for hit in boss_bullet_hits:
-                player.health -= 10
-                if PLAYER_COLLISION_SOUND:
-                    PLAYER_COLLISION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Player hit boss bullet, playing player_collision.wav")
-            for hit in enemy_bullet_hits:
-                player.health -= hit.damage
-                if PLAYER_COLLISION_SOUND:
-                    PLAYER_COLLISION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Player hit enemy bullet, playing player_collision.wav")
-            for hit in bomb_hits:
-                player.health -= hit.damage
-                if PLAYER_COLLISION_SOUND:
-                    PLAYER_COLLISION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Player hit bomb, playing player_collision.wav")
-            for hit in artillery_shell_hits:
-                if not hit.exploded:
-                    player.health -= hit.damage
-                    hit.explode()
-                    if PLAYER_COLLISION_SOUND:
-                        PLAYER_COLLISION_SOUND.play()
-                        if DEBUG_PRINT:
-                            print("Player hit artillery shell, playing player_collision.wav")
-            for hit in asteroid_hits:
-                player.health -= hit.damage
-                if ASTEROID_COLLISION_SOUND:
-                    ASTEROID_COLLISION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Asteroid hit player, playing asteroid_collision.wav")
-
-            if player.health <= 0:
-                if PLAYER_EXPLOSION_SOUND:
-                    PLAYER_EXPLOSION_SOUND.play()
-                player.lives -= 1
-                if player.lives <= 0:
-                    game_over_choice = game_over()
-                    if game_over_choice == "retry":
-                        reset_game(selected_ship)
-                        countdown_start = pygame.time.get_ticks()
-                        game_started = False
-                        continue
-                    elif game_over_choice == "main_menu":
-                        return "main_menu"
-                    elif game_over_choice == "quit":
-                        return "quit"
-                else:
-                    player.reset()
-                    enemies.empty()
-                    enemy_bullets.empty()
-                    bombs.empty()
-                    artillery_shells.empty()
-                    asteroids.empty()
-                    enemies_spawned = 0
-
-        bullet_hits = pygame.sprite.groupcollide(bullets, enemies, True, False)
-        for bullet, hit_enemies in bullet_hits.items():
-            for enemy in hit_enemies:
-                enemy.health -= bullet.damage
-                if enemy.health <= 0:
+    missile_hits = collider.groupcollide(missiles, enemies, True, False)
+    for missile, hit_enemies in missile_hits.items():
+        for enemy in hit_enemies:
+            try:
+                enemy_type_id = enemy.type_data[8]
+                if enemy_type_id in [1, 2, 4, 5]:
+                    enemy.health = 0
                     score += enemy.score_value
-                    if EXPLOSION_SOUND:
-                        EXPLOSION_SOUND.play()
+                    play_sound(EXPLOSION_SOUND)
                     enemy.kill()
                     if enemy.is_leech and enemy.tethered_enemy:
                         enemy.tethered_enemy.is_tethered = False
-                    if random.random() < 0.05:
-                        health_packs.add(HealthPack(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.1:
-                        powerups.add(PowerUp(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.05:
-                        shield_powerups.add(ShieldPowerUp(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.05:
-                        missile_powerups.add(MissilePowerUp(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.05:
-                        speed_powerups.add(SpeedPowerUp(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.03:
-                        bomb_powerups.add(BombPowerUp(enemy.rect.centerx, enemy.rect.centery))
-
-        bullet_boss_hits = pygame.sprite.groupcollide(bullets, boss_group, True, False)
-        for bullet, bosses in bullet_boss_hits.items():
-            for boss in bosses:
-                boss.health -= bullet.damage
-                if boss.health <= 0:
-                    score += int(250 * (1.25 ** (level - 1)))
-                    boss.kill()
-                    if BOSS_EXPLOSION_SOUND:
-                        BOSS_EXPLOSION_SOUND.play()
-                    wave += 1
-                    level_transition_delay = True
-                    delay_timer = 180
-
-        bullet_asteroid_hits = pygame.sprite.groupcollide(bullets, asteroids, True, False)
-        for bullet, hit_asteroids in bullet_asteroid_hits.items():
-            for asteroid in hit_asteroids:
-                asteroid.health -= 1
-                if asteroid.health <= 0:
-                    if EXPLOSION_SOUND:
-                        EXPLOSION_SOUND.play()
-                        if DEBUG_PRINT:
-                            print("Asteroid destroyed by bullet, playing explosion.wav")
-                    asteroid.kill()
-
-        missile_hits = pygame.sprite.groupcollide(missiles, enemies, True, False)
-        for missile, hit_enemies in missile_hits.items():
-            for enemy in hit_enemies:
-                try:
-                    enemy_type_id = enemy.type_data[8]
-                    if enemy_type_id in [1, 2, 4, 5]:
+                elif enemy_type_id in [3, 6, 7]:
+                    enemy.missile_hits += 1
+                    if enemy.missile_hits >= 2:
                         enemy.health = 0
                         score += enemy.score_value
-                        if EXPLOSION_SOUND:
-                            EXPLOSION_SOUND.play()
+                        play_sound(EXPLOSION_SOUND)
                         enemy.kill()
                         if enemy.is_leech and enemy.tethered_enemy:
                             enemy.tethered_enemy.is_tethered = False
-                    elif enemy_type_id in [3, 6, 7]:
-                        enemy_id = id(enemy)
-                        missile_hits_tracker[enemy_id] = missile_hits_tracker.get(enemy_id, 0) + 1
-                        if missile_hits_tracker[enemy_id] >= 2:
-                            enemy.health = 0
-                            score += enemy.score_value
-                            if EXPLOSION_SOUND:
-                                EXPLOSION_SOUND.play()
-                            enemy.kill()
-                            if enemy.is_leech and enemy.tethered_enemy:
-                                enemy.tethered_enemy.is_tethered = False
-                            del missile_hits_tracker[enemy_id]
-                except (IndexError, AttributeError):
-                    enemy_type_id = -1
-                if enemy.health <= 0:
-                    if random.random() < 0.05:
-                        health_packs.add(HealthPack(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.1:
-                        powerups.add(PowerUp(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.05:
-                        shield_powerups.add(ShieldPowerUp(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.05:
-                        missile_powerups.add(MissilePowerUp(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.05:
-                        speed_powerups.add(SpeedPowerUp(enemy.rect.centerx, enemy.rect.centery))
-                    elif random.random() < 0.03:
-                        bomb_powerups.add(BombPowerUp(enemy.rect.centerx, enemy.rect.centery))
-
-        missile_boss_hits = pygame.sprite.groupcollide(missiles, boss_group, True, False)
-        for missile, bosses in missile_boss_hits.items():
-            for boss in bosses:
-                boss.health -= missile.damage
-                if boss.health <= 0:
-                    score += int(250 * (1.25 ** (level - 1)))
-                    boss.kill()
-                    if BOSS_EXPLOSION_SOUND:
-                        BOSS_EXPLOSION_SOUND.play()
-                    wave += 1
-                    level_transition_delay = True
-                    delay_timer = 180
-
-        missile_asteroid_hits = pygame.sprite.groupcollide(missiles, asteroids, True, False)
-        for missile, hit_asteroids in missile_asteroid_hits.items():
-            for asteroid in hit_asteroids:
-                asteroid.health = 0
-                if EXPLOSION_SOUND:
-                    EXPLOSION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Asteroid destroyed by missile, playing explosion.wav")
-                asteroid.kill()
-
-        asteroid_enemy_hits = pygame.sprite.groupcollide(asteroids, enemies, True, True)
-        for asteroid, hit_enemies in asteroid_enemy_hits.items():
-            for enemy in hit_enemies:
-                score += enemy.score_value
-                if ASTEROID_COLLISION_SOUND:
-                    ASTEROID_COLLISION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Asteroid hit enemy, playing asteroid_collision.wav")
-                if EXPLOSION_SOUND:
-                    EXPLOSION_SOUND.play()
-                    if DEBUG_PRINT:
-                        print("Enemy destroyed by asteroid, playing explosion.wav")
-                if enemy.is_leech and enemy.tethered_enemy:
-                    enemy.tethered_enemy.is_tethered = False
-
-        health_pack_collisions = pygame.sprite.spritecollide(player, health_packs, True)
-        for _ in health_pack_collisions:
-            player.health = min(player.health + 25, 100)
-            if HEALTH_PACK_COLLECT_SOUND:
-                HEALTH_PACK_COLLECT_SOUND.play()
-
-        powerup_collisions = pygame.sprite.spritecollide(player, powerups, True)
-        for _ in powerup_collisions:
-            player.double_shot = True
-            powerup_timer = DOUBLE_SHOT_DURATION
-            if POWERUP_COLLECT_SOUND:
-                POWERUP_COLLECT_SOUND.play()
-
-        shield_collisions = pygame.sprite.spritecollide(player, shield_powerups, True)
-        for _ in shield_collisions:
-            player.shield = True
-            player.shield_timer = SHIELD_DURATION
-            if POWERUP_COLLECT_SOUND:
-                POWERUP_COLLECT_SOUND.play()
-
-        missile_powerup_collisions = pygame.sprite.spritecollide(player, missile_powerups, True)
-        for _ in missile_powerup_collisions:
-            player.missile_shot = True
-            missile_timer = MISSILE_DURATION
-            if POWERUP_COLLECT_SOUND:
-                POWERUP_COLLECT_SOUND.play()
-
-        speed_powerup_collisions = pygame.sprite.spritecollide(player, speed_powerups, True)
-        for _ in speed_powerup_collisions:
-            player.speed_boost = True
-            player.speed_timer = player.SPEED_DURATION
-            player.speed = player.base_speed * 1.5
-            if POWERUP_COLLECT_SOUND:
-                POWERUP_COLLECT_SOUND.play()
-
-        bomb_powerup_collisions = pygame.sprite.spritecollide(player, bomb_powerups, True)
-        for _ in bomb_powerup_collisions:
-            if player.bomb_count < player.MAX_BOMBS:
-                player.bomb_count += 1
-            if POWERUP_COLLECT_SOUND:
-                POWERUP_COLLECT_SOUND.play()
-
-        boss_bullets.update()
-        enemy_bullets.update()
-        bombs.update()
-        artillery_shells.update()
-
-        bg_y = (bg_y + 1) % BG.get_height()
-        GAME_SURFACE.blit(BG, (0, -BG.get_height() + bg_y))
-        GAME_SURFACE.blit(BG, (0, bg_y))
-
-        if bomb_flash_timer > 0:
-            flash_surface = pygame.Surface((WIDTH, HEIGHT))
-            flash_surface.fill(WHITE)
-            flash_surface.set_alpha(int(128 * (bomb_flash_timer / 10)))
-            GAME_SURFACE.blit(flash_surface, (0, 0))
-            bomb_flash_timer -= 1
-
-        for bullet in bullets:
-            GAME_SURFACE.blit(bullet.image, bullet.rect)
-
-        for missile in missiles:
-            GAME_SURFACE.blit(missile.image, missile.rect)
-
-        for enemy in enemies:
-            enemy.draw(GAME_SURFACE)
-
-        for boss in boss_group:
-            boss.draw_health_bar(GAME_SURFACE)
-            GAME_SURFACE.blit(boss.image, boss.rect)
-
-        for health_pack in health_packs:
-            GAME_SURFACE.blit(health_pack.image, health_pack.rect)
-
-        for powerup in powerups:
-            GAME_SURFACE.blit(powerup.image, powerup.rect)
-
-        for shield_powerup in shield_powerups:
-            GAME_SURFACE.blit(shield_powerup.image, shield_powerup.rect)
-
-        for missile_powerup in missile_powerups:
-            GAME_SURFACE.blit(missile_powerup.image, missile_powerup.rect)
-
-        for speed_powerup in speed_powerups:
-            GAME_SURFACE.blit(speed_powerup.image, speed_powerup.rect)
-
-        for bomb_powerup in bomb_powerups:
-            GAME_SURFACE.blit(bomb_powerup.image, bomb_powerup.rect)
-
-        for asteroid in asteroids:
-            GAME_SURFACE.blit(asteroid.image, asteroid.rect)
-
-        for bullet in boss_bullets:
-            GAME_SURFACE.blit(bullet.image, bullet.rect)
-
-        for bullet in enemy_bullets:
-            bullet.draw(GAME_SURFACE)
-
-        for bomb in bombs:
-            GAME_SURFACE.blit(bomb.image, bomb.rect)
-
-        for shell in artillery_shells:
-            shell.draw(GAME_SURFACE)
-
-        player.draw(GAME_SURFACE)
-
-        if score != last_score:
-            score_text = font.render(f"Score: {score}", True, WHITE)
-            last_score = score
-        if level != last_level:
-            level_text = font.render(f"Level: {level}", True, WHITE)
-            last_level = level
+            except (IndexError, AttributeError):
+                enemy_type_id = -1
+            if enemy.health <= 0:
+                if rng.loot.random() < 0.05:
+                    health_packs.add(HealthPack(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.1:
+                    powerups.add(PowerUp(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.05:
+                    shield_powerups.add(ShieldPowerUp(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.05:
+                    missile_powerups.add(MissilePowerUp(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.05:
+                    speed_powerups.add(SpeedPowerUp(enemy.rect.centerx, enemy.rect.centery))
+                elif rng.loot.random() < 0.03:
+                    bomb_powerups.add(BombPowerUp(enemy.rect.centerx, enemy.rect.centery))
+
+    missile_boss_hits = collider.groupcollide(missiles, boss_group, True, False)
+    for missile, bosses in missile_boss_hits.items():
+        for boss in bosses:
+            boss.health -= missile.damage
+            if boss.health <= 0:
+                score += int(250 * (1.25 ** (level - 1)))
+                boss.kill()
+                play_sound(BOSS_EXPLOSION_SOUND)
+                wave += 1
+                level_transition_delay = True
+                delay_timer = 180
+
+    missile_asteroid_hits = collider.groupcollide(missiles, asteroids, True, False)
+    for missile, hit_asteroids in missile_asteroid_hits.items():
+        for asteroid in hit_asteroids:
+            asteroid.health = 0
+            play_sound(EXPLOSION_SOUND)
+            if DEBUG_PRINT:
+                print("Asteroid destroyed by missile, playing explosion.wav")
+            asteroid.kill()
+
+    asteroid_enemy_hits = collider.groupcollide(asteroids, enemies, True, True)
+    for asteroid, hit_enemies in asteroid_enemy_hits.items():
+        for enemy in hit_enemies:
+            score += enemy.score_value
+            play_sound(ASTEROID_COLLISION_SOUND)
+            if DEBUG_PRINT:
+                print("Asteroid hit enemy, playing asteroid_collision.wav")
+            play_sound(EXPLOSION_SOUND)
+            if DEBUG_PRINT:
+                print("Enemy destroyed by asteroid, playing explosion.wav")
+            if enemy.is_leech and enemy.tethered_enemy:
+                enemy.tethered_enemy.is_tethered = False
+
+    profiler.mark(PHASE_COLLISIONS)
+
+    health_pack_collisions = collider.spritecollide(player, health_packs, True)
+    for _ in health_pack_collisions:
+        player.health = min(player.health + 25, 100)
+        play_sound(HEALTH_PACK_COLLECT_SOUND)
+
+    powerup_collisions = collider.spritecollide(player, powerups, True)
+    for _ in powerup_collisions:
+        player.double_shot = True
+        powerup_timer = DOUBLE_SHOT_DURATION
+        play_sound(POWERUP_COLLECT_SOUND)
+
+    shield_collisions = collider.spritecollide(player, shield_powerups, True)
+    for _ in shield_collisions:
+        player.shield = True
+        player.shield_timer = SHIELD_DURATION
+        play_sound(POWERUP_COLLECT_SOUND)
+
+    missile_powerup_collisions = collider.spritecollide(player, missile_powerups, True)
+    for _ in missile_powerup_collisions:
+        player.missile_shot = True
+        missile_timer = MISSILE_DURATION
+        play_sound(POWERUP_COLLECT_SOUND)
+
+    speed_powerup_collisions = collider.spritecollide(player, speed_powerups, True)
+    for _ in speed_powerup_collisions:
+        player.speed_boost = True
+        player.speed_timer = player.SPEED_DURATION
+        player.speed = player.base_speed * 1.5
+        play_sound(POWERUP_COLLECT_SOUND)
+
+    bomb_powerup_collisions = collider.spritecollide(player, bomb_powerups, True)
+    for _ in bomb_powerup_collisions:
+        if player.bomb_count < player.MAX_BOMBS:
+            player.bomb_count += 1
+        play_sound(POWERUP_COLLECT_SOUND)
+    profiler.mark(PHASE_PICKUPS)
+    return None
+
+def update_projectiles():
+    projectiles.update()
+    artillery_shells.update()
+    profiler.mark(PHASE_PROJECTILES)
+
+# HUD layer: health, score, level, lives, power-up timers and the bomb counter
+# are composited onto their own surface only when something visibly changes,
+# and reach GAME_SURFACE with a single blit
+HUD_RECT = pygame.Rect(0, 0, WIDTH, 175)
+HUD_PANELS = [pygame.Rect(0, 0, WIDTH - 150, 175), pygame.Rect(WIDTH - 150, 0, 150, 175)]
+
+class HudLayer:
+    def __init__(self):
+        self.surface = pygame.Surface(HUD_RECT.size, pygame.SRCALPHA)
+        self.state = None
+        self.regions = []  # Bounds of the drawn pixels in each panel
+        self.stale_regions = []  # Old and new bounds while a recomposite is not yet on screen
+        self.needs_blit = True
+
+    def current_state(self):
+        # Bars are quantized to the pixels they fill so timers only trigger a
+        # redraw when the drawn bar actually shrinks
+        def timer_fill(active, timer, max_timer):
+            return int(timer / max_timer * 100) if active else None
+        return (
+            int(player.health / 100 * 150), score, level, player.lives,
+            timer_fill(player.double_shot, powerup_timer, DOUBLE_SHOT_DURATION),
+            timer_fill(player.shield, player.shield_timer, SHIELD_DURATION),
+            timer_fill(player.missile_shot, missile_timer, MISSILE_DURATION),
+            timer_fill(player.speed_boost, player.speed_timer, player.SPEED_DURATION),
+            player.bomb_count,
+        )
 
-        draw_health_bar(GAME_SURFACE, 10, 10, player.health, 100)
-        GAME_SURFACE.blit(score_text, (10, 40))
-        GAME_SURFACE.blit(level_text, (10, 70))
+    def update(self):
+        state = self.current_state()
+        if state == self.state:
+            return
+        self.state = state
+        surface = self.surface
+        surface.fill((0, 0, 0, 0))
+        draw_health_bar(surface, 10, 10, player.health, 100)
+        blit_text(surface, font, f"Score: {score}", WHITE, (10, 40))
+        blit_text(surface, font, f"Level: {level}", WHITE, (10, 70))
         for i in range(player.lives):
-            GAME_SURFACE.blit(HEART_IMG, (10 + i * (HEART_IMG.get_width() + 5), 100))
+            surface.blit(HEART_IMG, (10 + i * (HEART_IMG.get_width() + 5), 100))
         if player.double_shot:
-            GAME_SURFACE.blit(DOUBLE_ICON, (WIDTH - 140, 20))
-            draw_timer_bar(GAME_SURFACE, WIDTH - 110, 25, powerup_timer, DOUBLE_SHOT_DURATION, YELLOW)
+            surface.blit(DOUBLE_ICON, (WIDTH - 140, 20))
+            draw_timer_bar(surface, WIDTH - 110, 25, powerup_timer, DOUBLE_SHOT_DURATION, YELLOW)
         if player.shield:
-            GAME_SURFACE.blit(SHIELD_ICON, (WIDTH - 140, 50))
-            draw_timer_bar(GAME_SURFACE, WIDTH - 110, 55, player.shield_timer, SHIELD_DURATION, BLUE)
+            surface.blit(SHIELD_ICON, (WIDTH - 140, 50))
+            draw_timer_bar(surface, WIDTH - 110, 55, player.shield_timer, SHIELD_DURATION, BLUE)
         if player.missile_shot:
-            GAME_SURFACE.blit(MISSILE_ICON, (WIDTH - 140, 80))
-            draw_timer_bar(GAME_SURFACE, WIDTH - 110, 85, missile_timer, MISSILE_DURATION, RED)
+            surface.blit(MISSILE_ICON, (WIDTH - 140, 80))
+            draw_timer_bar(surface, WIDTH - 110, 85, missile_timer, MISSILE_DURATION, RED)
         if player.speed_boost:
-            GAME_SURFACE.blit(SPEED_ICON, (WIDTH - 140, 110))
-            draw_timer_bar(GAME_SURFACE, WIDTH - 110, 115, player.speed_timer, player.SPEED_DURATION, GREEN)
+            surface.blit(SPEED_ICON, (WIDTH - 140, 110))
+            draw_timer_bar(surface, WIDTH - 110, 115, player.speed_timer, player.SPEED_DURATION, GREEN)
         if player.bomb_count > 0:
-            GAME_SURFACE.blit(BOMB_ICON, (WIDTH - 140, 140))
-            bomb_count_text = font.render(f"x{player.bomb_count}", True, WHITE)
-            GAME_SURFACE.blit(bomb_count_text, (WIDTH - 110, 140))
+            surface.blit(BOMB_ICON, (WIDTH - 140, 140))
+            blit_text(surface, font, f"x{player.bomb_count}", WHITE, (WIDTH - 110, 140))
+        old_regions = self.regions
+        self.regions = [surface.subsurface(panel).get_bounding_rect().move(panel.topleft) for panel in HUD_PANELS]
+        self.stale_regions = old_regions + self.regions
+
+    def dirty_rects(self, rects):
+        # The HUD is blended over the background, so it may only be blitted where
+        # the background under it was restored: repaint all of its pixels when it
+        # changed or when anything else repainted this frame overlaps them
+        if self.stale_regions:
+            dirty = self.stale_regions
+        elif any(rect.collidelist(self.regions) != -1 for rect in rects):
+            dirty = list(self.regions)
+        else:
+            dirty = []
+        self.needs_blit = bool(dirty)
+        return dirty
+
+    def draw(self, target, rects=None):
+        if rects is None or self.needs_blit:
+            target.blit(self.surface, HUD_RECT)
+        self.stale_regions = []
+        self.needs_blit = False
+
+hud = HudLayer()
+
+# Draw the current game state onto GAME_SURFACE. Returns the rects that changed,
+# or None when the whole frame was redrawn.
+def draw_game():
+    hud.update()
+    profiler.mark(PHASE_HUD)
+    rects = dirty_renderer.plan()
+    if rects is None:
+        GAME_SURFACE.blit(BG, (0, -BG.get_height() + bg_y))
+        GAME_SURFACE.blit(BG, (0, bg_y))
+    else:
+        # Restore the background under every dirty area before redrawing on top
+        for rect in rects:
+            GAME_SURFACE.set_clip(rect)
+            GAME_SURFACE.blit(BG, (0, -BG.get_height() + bg_y))
+            GAME_SURFACE.blit(BG, (0, bg_y))
+        GAME_SURFACE.set_clip(None)
+
+    if bomb_flash_timer > 0:
+        BOMB_FLASH_SURFACE.set_alpha(int(128 * (bomb_flash_timer / 10)))
+        GAME_SURFACE.blit(BOMB_FLASH_SURFACE, (0, 0))
+    profiler.mark(PHASE_BACKGROUND)
+    
+    for bullet in bullets:
+        GAME_SURFACE.blit(bullet.image, bullet.rect)
+
+    for missile in missiles:
+        GAME_SURFACE.blit(missile.image, missile.rect)
+
+    for enemy in enemies:
+        enemy.draw(GAME_SURFACE)
+
+    for boss in boss_group:
+        boss.draw_health_bar(GAME_SURFACE)
+        GAME_SURFACE.blit(boss.image, boss.rect)
+
+    for health_pack in health_packs:
+        GAME_SURFACE.blit(health_pack.image, health_pack.rect)
+
+    for powerup in powerups:
+        GAME_SURFACE.blit(powerup.image, powerup.rect)
+
+    for shield_powerup in shield_powerups:
+        GAME_SURFACE.blit(shield_powerup.image, shield_powerup.rect)
+
+    for missile_powerup in missile_powerups:
+        GAME_SURFACE.blit(missile_powerup.image, missile_powerup.rect)
+
+    for speed_powerup in speed_powerups:
+        GAME_SURFACE.blit(speed_powerup.image, speed_powerup.rect)
+
+    for bomb_powerup in bomb_powerups:
+        GAME_SURFACE.blit(bomb_powerup.image, bomb_powerup.rect)
+
+    for asteroid in asteroids:
+        GAME_SURFACE.blit(asteroid.image, asteroid.rect)
+
+    projectiles.draw(GAME_SURFACE)
+
+    for shell in artillery_shells:
+        shell.draw(GAME_SURFACE)
+
+    player.draw(GAME_SURFACE)
+    profiler.mark(PHASE_SPRITES)
+    hud.draw(GAME_SURFACE, rects)
+
+    draw_debug_info()
+    draw_fps_info()
+    profiler.mark(PHASE_HUD)
+    return rects
+
+# Dirty-rectangle rendering for the gameplay scene
+DIRTY_FULL_FLIP_RATIO = 0.35  # Redraw and flip the whole frame past this share of dirty screen area
+SCREEN_RECT = pygame.Rect(0, 0, WIDTH, HEIGHT)
+
+def scene_rects():
+    # Areas the sprite layer covers this frame, including effects drawn outside sprite rects
+    rects = [pygame.Rect(sprite.rect) for group in (bullets, missiles, health_packs, powerups, shield_powerups, missile_powerups, speed_powerups, bomb_powerups, asteroids) for sprite in group]
+    for enemy in enemies:
+        rects.append(pygame.Rect(enemy.rect))
+        if enemy.is_leech and enemy.tethered_enemy:
+            rects.append(pygame.Rect(enemy.rect.center, (0, 0)).union(pygame.Rect(enemy.tethered_enemy.rect.center, (0, 0))).inflate(4, 4))
+        if enemy.muzzle_flash_timer > 0:
+            rects.append(pygame.Rect(enemy.rect.centerx - 5, enemy.rect.bottom - 5, 10, 10))
+    for boss in boss_group:
+        rects.append(boss.rect.union(pygame.Rect(boss.rect.left, boss.rect.top - 15, boss.rect.width, 10)))
+    for shell in artillery_shells:
+        rects.append(pygame.Rect(shell.rect.centerx - 50, shell.rect.centery - 50, 100, 100) if shell.exploded else pygame.Rect(shell.rect))
+    rects.append(player.rect.union(SHIELD_SURFACE.get_rect(center=player.rect.center)))
+    rects.extend(projectiles.visible_rects())
+    return rects
+
+def overlay_rects():
+    # The F1/F2 overlays are redrawn every frame
+    rects = []
+    if fps_debug:
+        rects.append(pygame.Rect(0, 130, WIDTH, 30))
+        rects.append(PROFILE_BAR_RECT.inflate(4, 8))
+        rects.append(PROFILE_TABLE_RECT)
+    if debug_mode:
+        rects.append(pygame.Rect(0, 160, WIDTH, 22 * 30))
+    return rects
+
+class DirtyRenderer:
+    # The scrolling background is its own layer. While it has not moved since
+    # the last gameplay frame, only the areas the sprite layer covered last frame
+    # and this frame plus the HUD are repainted and pushed. A moving background,
+    # bomb flash, fullscreen scaling, any other screen presented in between, or
+    # a large dirty area falls back to a full redraw and flip.
+    def __init__(self):
+        self.background_key = None
+        self.sprite_rects = []
+        self.last_present = -1
+
+    def plan(self):
+        sprite_rects = scene_rects()
+        # The bomb flash covers the whole background layer, including the frame it ends on
+        background_key = (BG, bg_y, bomb_flash_timer)
+        full = (IS_FULLSCREEN or bomb_flash_timer > 0 or background_key != self.background_key
+                or present_count != self.last_present)
+        dirty = self.sprite_rects + sprite_rects + overlay_rects()
+        dirty = [rect.clip(SCREEN_RECT) for rect in dirty + hud.dirty_rects(dirty)]
+        self.background_key = background_key
+        self.sprite_rects = sprite_rects
+        if full or sum(rect.width * rect.height for rect in dirty) > DIRTY_FULL_FLIP_RATIO * WIDTH * HEIGHT:
+            return None
+        return [rect for rect in dirty if rect.width and rect.height]
+
+    def present(self, rects):
+        render_game(rects)
+        # A transition overlay was drawn into GAME_SURFACE, so the next frame starts over
+        self.last_present = present_count if transition is None else -1
+
+dirty_renderer = DirtyRenderer()
+
+# Gameplay scene
+class GameplayScene(Scene):
+    animated = True
+
+    def __init__(self, ship_image, playback=None, resume=None):
+        self.ship_image = ship_image
+        self.playback = playback  # Replay whose input replaces the keyboard
+        self.resume_snapshot = resume  # Suspended game to continue instead of starting a new one
+        self.recording = None
+
+    def enter(self):
+        asset_loader.require("BACKGROUNDS")
+        self.restart()
+
+    def restart(self):
+        global game_started
+        self.save_replay()
+        resumed = self.resume_snapshot is not None
+        if resumed:
+            restore_snapshot(self.resume_snapshot)
+            self.resume_snapshot = None
+            self.ship_image = player.image
+            music.play("GAME_MUSIC", restart=True)
+            start_transition(pregame_countdown())
+        else:
+            if not self.playback:
+                # A new game replaces the suspended one
+                discard_saved_game()
+            reset_game(self.ship_image, self.playback.seed if self.playback else RUN_SEED)
+            start_transition(pregame_countdown())
+            game_started = False
+        self.accumulator = 0.0
+        self.pending_mash_shots = 0
+        self.ticks = 0
+        self.autosave_ticks = 0
+        self.skip_frame_time = False
+        self.playback_tick = 0
+        if self.playback and REPLAY_SEEK:
+            self.seek(REPLAY_SEEK)
+        # A resumed game did not start from its seed, so it cannot be recorded
+        if REPLAY_RECORD_PATH and not self.playback and not resumed:
+            ship = next((i for i, img in enumerate(PLAYER_IMGS) if img is self.ship_image), 0)
+            self.recording = Replay(rng.seed, ship)
+
+    def leave(self):
+        self.save_replay()
+        if self.playback:
+            return
+        if scenes.running:
+            # The game ended, or was abandoned for the main menu
+            discard_saved_game()
+        else:
+            # Quitting suspends the game until the next start
+            save_game()
+
+    def save_replay(self):
+        # Each game overwrites the recording of the previous one
+        if self.recording and self.recording.ticks:
+            self.recording.save(REPLAY_RECORD_PATH)
+        self.recording = None
+
+    def seek(self, tick):
+        # Jumps the replay being played back to the given tick
+        self.playback_tick, game_over = seek_replay(self.playback, max(0, tick))
+        self.accumulator = 0.0
+        dirty_renderer.last_present = -1
+        if game_over:
+            scenes.switch(MainMenu())
+
+    def tick_input(self, keys):
+        # Keys and SPACE presses for the next tick: live (and recorded), or played back
+        if self.playback:
+            if self.playback_tick == len(self.playback.ticks):
+                return None
+            names, mash_shots = unpack_input(self.playback.ticks[self.playback_tick])
+            self.playback_tick += 1
+            return ScriptedKeys(INPUT_KEYS[name] for name in names), mash_shots
+        mash_shots = self.pending_mash_shots
+        self.pending_mash_shots = 0
+        if self.recording:
+            self.recording.record(keys, mash_shots)
+        return keys, mash_shots
+
+    def resume(self):
+        # Time spent in the pause menu is not simulated
+        self.accumulator = 0.0
+        self.skip_frame_time = True
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN or game_paused_by_transition():
+            return
+        if event.key == pygame.K_SPACE:
+            self.pending_mash_shots += 1
+        if event.key == pygame.K_p or event.key == pygame.K_ESCAPE:
+            scenes.push(PauseMenu(self))
+        if self.playback and event.key == pygame.K_PAGEUP:
+            self.seek(self.playback_tick - REPLAY_SEEK_STEP)
+        if self.playback and event.key == pygame.K_PAGEDOWN:
+            self.seek(self.playback_tick + REPLAY_SEEK_STEP)
+
+    def update(self, frame_ms):
+        global debug_mode, fps_debug
+        keys = pygame.key.get_pressed()
 
-        draw_debug_info()
-        draw_fps_info()
+        if keys[pygame.K_F1]:
+            fps_debug = not fps_debug
+            
+        if keys[pygame.K_F2]:
+            debug_mode = not debug_mode
+        profiler.enabled = fps_debug or tracer.enabled
+
+        self.ticks = 0
+        if self.skip_frame_time:
+            self.skip_frame_time = False
+            frame_ms = 0
+        if game_paused_by_transition():
+            self.accumulator = 0.0
+            self.pending_mash_shots = 0
+            return
 
-        render_game()
-        last_frame_time = frame_start
+        # Advance the simulation in fixed ticks, dropping any backlog beyond the catch-up cap
+        self.accumulator += frame_ms
+        result = None
+        while self.accumulator >= TICK_MS and self.ticks < MAX_TICKS_PER_FRAME:
+            tick_input = self.tick_input(keys)
+            profiler.mark(PHASE_INPUT)
+            if tick_input is None:
+                result = "replay_over"
+                break
+            result = update_game(*tick_input)
+            self.accumulator -= TICK_MS
+            self.ticks += 1
+            if result == "game_over" or game_paused_by_transition():
+                break
+        if self.ticks == MAX_TICKS_PER_FRAME:
+            self.accumulator = min(self.accumulator, TICK_MS)
+
+        if result and self.playback:
+            # A replay never reaches the high score table
+            scenes.switch(MainMenu())
+        elif result == "game_over":
+            scenes.switch(GameOverScreen(self.ship_image))
+        elif not self.playback:
+            self.autosave_ticks += self.ticks
+            if self.autosave_ticks >= AUTOSAVE_TICKS:
+                self.autosave_ticks = 0
+                save_game()
+                trace_event("autosave")
+            profiler.mark(PHASE_AUTOSAVE)
+
+    def draw(self):
+        if game_paused_by_transition():
+            # The opaque card covers the scene, so only the overlay is presented
+            render_game()
+            return
+        # Nothing changed on frames that ran no simulation tick
+        if self.ticks == 0:
+            return
+        # Sound dispatch and music fades run between the update and the draw
+        profiler.mark(PHASE_AUDIO)
+        dirty_renderer.present(draw_game())
+        profiler.mark(PHASE_PRESENT)
+        profiler.end_frame()
+
+# Headless simulation
+# Key names accepted by HeadlessGame.step, mapped to the keys Player.update reads
+INPUT_KEYS = {
+    "left": pygame.K_LEFT,
+    "right": pygame.K_RIGHT,
+    "up": pygame.K_UP,
+    "down": pygame.K_DOWN,
+    "space": pygame.K_SPACE,
+    "m": pygame.K_m,
+    "b": pygame.K_b,
+}
+
+class ScriptedKeys:
+    # Stands in for pygame.key.get_pressed() with a fixed set of held keys
+    def __init__(self, held=()):
+        self.held = frozenset(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+# Replays: a game is stored as its seed, ship and the input of every
+# simulation tick. A tick's input is a bitmask of the held INPUT_KEYS with the
+# SPACE presses since the previous tick in the high byte; the file holds runs
+# of identical ticks as (mask, count) varint pairs, so a long run of steady
+# input costs a few bytes. Record with --record=PATH, play back at real time
+# with --replay=PATH, or as fast as possible with --headless --replay=PATH.
+#
+# Recordings also carry a keyframe (a full game state snapshot) every
+# REPLAY_KEYFRAME_TICKS. An index after the header gives each keyframe's tick
+# and file offset, so seeking (--seek=TICK, or PAGE UP/PAGE DOWN while a
+# replay plays) restores the nearest earlier keyframe and simulates only the
+# ticks after it.
+REPLAY_MAGIC = b"SFRP"
+REPLAY_VERSION = 4
+REPLAY_HEADER = struct.Struct("<4sBqBII")  # Magic, version, seed, ship, tick count, keyframe count
+REPLAY_INDEX_ENTRY = struct.Struct("<IQI")  # Keyframe tick, file offset, size
+REPLAY_KEYFRAME_TICKS = RNG_EPOCH_TICKS  # Keyframes land on epoch boundaries, so they carry no RNG stream state
+REPLAY_SEEK_STEP = 10 * FPS  # Ticks skipped by PAGE UP/PAGE DOWN during playback
+REPLAY_RECORD_PATH = command_line_value("--record", "STAR_FIGHTER_RECORD")
+REPLAY_PATH = command_line_value("--replay", "STAR_FIGHTER_REPLAY")
+REPLAY_SEEK = int(command_line_value("--seek", "STAR_FIGHTER_SEEK") or 0)
+
+def pack_input(keys, mash_shots=0):
+    mask = sum(1 << i for i, key in enumerate(INPUT_KEYS.values()) if keys[key])
+    return mask | min(mash_shots, 255) << 8
+
+def unpack_input(mask):
+    return tuple(name for i, name in enumerate(INPUT_KEYS) if mask & (1 << i)), mask >> 8
+
+def write_varint(data, value):
+    while value >= 0x80:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, pos
+
+class Replay:
+    def __init__(self, seed, ship=0, ticks=None, path=None, index=None):
+        self.seed = seed
+        self.ship = ship
+        self.ticks = ticks if ticks is not None else []  # One input mask per tick
+        self.keyframes = {}  # Tick -> snapshot of the state before that tick's input
+        self.path = path
+        self.index = index or {}  # Tick -> (offset, size) of keyframes not read from path yet
+
+    def record(self, keys, mash_shots=0):
+        if self.ticks and len(self.ticks) % REPLAY_KEYFRAME_TICKS == 0:
+            self.keyframes[len(self.ticks)] = capture_snapshot()
+        self.ticks.append(pack_input(keys, mash_shots))
+
+    def keyframe_ticks(self):
+        return sorted(set(self.keyframes) | set(self.index))
+
+    def keyframe(self, tick):
+        if tick not in self.keyframes:
+            offset, size = self.index[tick]
+            with open(self.path, "rb") as file:
+                file.seek(offset)
+                self.keyframes[tick] = file.read(size)
+        return self.keyframes[tick]
+
+    def save(self, path):
+        runs = bytearray()
+        start = 0
+        while start < len(self.ticks):
+            end = start + 1
+            while end < len(self.ticks) and self.ticks[end] == self.ticks[start]:
+                end += 1
+            write_varint(runs, self.ticks[start])
+            write_varint(runs, end - start)
+            start = end
+        keyframes = [(tick, self.keyframe(tick)) for tick in self.keyframe_ticks()]
+        data = bytearray(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.ship, len(self.ticks), len(keyframes)))
+        offset = REPLAY_HEADER.size + REPLAY_INDEX_ENTRY.size * len(keyframes) + len(runs)
+        for tick, snapshot in keyframes:
+            data += REPLAY_INDEX_ENTRY.pack(tick, offset, len(snapshot))
+            offset += len(snapshot)
+        data += runs
+        for tick, snapshot in keyframes:
+            data += snapshot
+        # Written aside and renamed, so a crash never leaves half a replay
+        with open(path + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(path + ".tmp", path)
+
+def load_replay(path):
+    # Reads the header, keyframe index and input; keyframes are read on demand
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        header = file.read(REPLAY_HEADER.size)
+        if len(header) < REPLAY_HEADER.size or header[:5] != REPLAY_MAGIC + bytes([REPLAY_VERSION]):
+            raise ValueError(f"{path} is not a version {REPLAY_VERSION} Star Fighter replay")
+        _, _, seed, ship, count, keyframe_count = REPLAY_HEADER.unpack(header)
+        index = {}
+        for _ in range(keyframe_count):
+            tick, offset, length = REPLAY_INDEX_ENTRY.unpack(file.read(REPLAY_INDEX_ENTRY.size))
+            index[tick] = (offset, length)
+        runs_end = min((offset for offset, _ in index.values()), default=size)
+        data = file.read(runs_end - file.tell())
+    ticks = []
+    pos = 0
+    while pos < len(data):
+        mask, pos = read_varint(data, pos)
+        run, pos = read_varint(data, pos)
+        ticks.extend([mask] * run)
+    if len(ticks) != count:
+        raise ValueError(f"{path} is truncated")
+    return Replay(seed, ship, ticks, path, index)
+
+# Game state snapshots, used for replay keyframes and suspended games. Each
+# sprite is written as a typed record of the fields SNAPSHOT_RECORDS lists for
+# its class; surfaces become indices into a table of the asset paths they came
+# from and sprite references become positions in the snapshot. Nothing is
+# pickled, so reading a snapshot cannot run code. Field kinds:
+#   i int, d float, b bool, n number (float, read back as int when whole),
+#   rect, pair (two ints), image (asset surface), sprite (None when the sprite
+#   is in no group), enemy_type (an entry of enemy_types()); a trailing ? marks
+#   a field only some instances have.
+# Bump SNAPSHOT_VERSION whenever a record, the globals or the layout changes.
+SNAPSHOT_VERSION = 2
+SNAPSHOT_GLOBALS = (
+    ("score", "i"), ("level", "i"), ("wave", "i"), ("max_waves", "i"), ("enemies_per_wave", "i"),
+    ("base_enemies", "i"), ("enemies_spawned", "i"), ("boss_spawned", "b"), ("spawn_timer", "i"),
+    ("powerup_timer", "i"), ("missile_timer", "i"), ("bg_y", "i"), ("game_started", "b"),
+    ("level_transition_delay", "b"), ("delay_timer", "i"), ("bomb_flash_timer", "i"), ("BG", "image"),
+    ("asteroid_spawn_timer", "i"), ("max_asteroids", "i"), ("sim_tick", "i"),
+)
+DROP_RECORD = (("image", "image"), ("rect", "rect"), ("speed", "i"))
+BULLET_RECORD = (("image", "image"), ("rect", "rect"), ("speed", "i"), ("damage", "i"))
+SNAPSHOT_RECORDS = {
+    Player: (
+        ("image", "image"), ("rect", "rect"), ("base_speed", "i"), ("speed", "n"), ("speed_boost", "b"),
+        ("speed_timer", "i"), ("SPEED_DURATION", "i"), ("health", "i"), ("double_shot", "b"), ("shield", "b"),
+        ("missile_shot", "b"), ("shield_timer", "i"), ("missile_timer", "i"), ("lives", "i"), ("invincible", "b"),
+        ("invincibility_timer", "i"), ("INVINCIBILITY_DURATION", "i"), ("blink_timer", "i"), ("visible", "b"),
+        ("shoot_timer", "i"), ("missile_shoot_timer", "i"), ("SHOOT_DELAY", "i"), ("MISSILE_SHOOT_DELAY", "i"),
+        ("is_tethered", "b"), ("tether_timer", "i"), ("bomb_count", "i"), ("MAX_BOMBS", "i"),
+        ("bomb_cooldown", "i"), ("BOMB_COOLDOWN_DURATION", "i"),
+    ),
+    Bullet: BULLET_RECORD,
+    Missile: BULLET_RECORD + (("target", "sprite"),),
+    Asteroid: (
+        ("image", "image"), ("rect", "rect"), ("health", "i"), ("speed", "d"), ("angle", "d"),
+        ("vx", "d"), ("vy", "d"), ("damage", "i"),
+    ),
+    ArtilleryShell: (
+        ("image", "image"), ("rect", "rect"), ("speed", "i"), ("start_pos", "pair"), ("max_distance", "i"),
+        ("damage", "i"), ("blast_radius", "i"), ("explosion_timer", "i"), ("exploded", "b"), ("vx", "d"), ("vy", "d"),
+    ),
+    Enemy: (
+        ("type_data", "enemy_type"), ("image", "image"), ("rect", "rect"), ("base_speed", "i"), ("speed", "i"),
+        ("health", "i"), ("can_shoot", "b"), ("is_tank", "b"), ("is_bomber", "b"), ("is_sniper", "b"),
+        ("is_leech", "b"), ("is_artillery", "b"), ("score_value", "i"), ("is_shooting", "b"),
+        ("shooting_pause_timer", "i"), ("timer", "i"), ("muzzle_flash_timer", "i"), ("missile_hits", "i"),
+        # Set only for the enemy types that use them
+        ("shoot_timer", "i?"), ("shoot_delay", "i?"), ("aim_timer", "i?"), ("recoil_timer", "i?"),
+        ("shoot_pause_timer", "i?"), ("flash_timer", "i?"), ("tethered_enemy", "sprite?"), ("pulse_timer", "i?"),
+        ("tether_sound_played", "b?"),
+    ),
+    Boss: (
+        ("image", "image"), ("rect", "rect"), ("speed_y", "i"), ("health", "i"), ("max_health", "i"),
+        ("direction", "i"), ("speed_x", "i"), ("shoot_timer", "i"), ("shoot_delay", "i"), ("phase", "i"),
+        ("bomb_timer", "i"), ("bomb_delay", "i"),
+    ),
+    HealthPack: DROP_RECORD,
+    PowerUp: DROP_RECORD,
+    ShieldPowerUp: DROP_RECORD,
+    MissilePowerUp: DROP_RECORD,
+    SpeedPowerUp: DROP_RECORD,
+    BombPowerUp: DROP_RECORD,
+}
+SNAPSHOT_CLASSES = tuple(SNAPSHOT_RECORDS)
+SNAPSHOT_FIELDS = {
+    "i": struct.Struct("<i"),
+    "d": struct.Struct("<d"),
+    "b": struct.Struct("<?"),
+    "n": struct.Struct("<d"),
+    "rect": struct.Struct("<4i"),
+    "pair": struct.Struct("<2i"),
+    "image": struct.Struct("<H"),
+    "sprite": struct.Struct("<i"),
+    "enemy_type": struct.Struct("<B"),
+}
+SNAPSHOT_COUNT = struct.Struct("<I")
+SNAPSHOT_RNG = struct.Struct("<qB?")  # Seed, stream state version, stream states follow
+SNAPSHOT_RNG_STREAM = struct.Struct("<625I?d")  # Mersenne Twister words and position, cached gauss
+SNAPSHOT_SURFACE_TABLES = ("LEECH_PULSE_FRAMES", "SNIPER_BLINK_FRAMES", "PROJECTILE_IMAGES")
+PROJECTILE_ARRAYS = ("x", "y", "vx", "vy", "w", "h", "damage", "age", "kind", "image", "trail")  # Saved for live slots
+
+def snapshot_groups():
+    return (player_group,) + all_sprite_groups()
+
+def surface_paths():
+    # id of every surface a sprite can show -> (global name, index or key, ...)
+    paths = {}
+    def walk(value, path):
+        if isinstance(value, pygame.Surface):
+            paths.setdefault(id(value), path)
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                walk(item, path + (i,))
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                # The frame tables are keyed by the enemy image they were built from
+                walk(item, path + (("surface", paths[id(key)]) if isinstance(key, pygame.Surface) else key,))
+    for name in IMAGE_ASSET_NAMES + list(SNAPSHOT_SURFACE_TABLES):
+        walk(globals()[name], (name,))
+    return paths
+
+def resolve_surface(path):
+    if path[0] == "PROJECTILE_IMAGES":
+        # Built on first use, so it may not exist yet in this process
+        return projectile_image(*path[1])
+    value = globals()[path[0]]
+    for step in path[1:]:
+        if isinstance(step, tuple) and step[0] == "surface":
+            step = resolve_surface(step[1])
+        value = value[step]
+    return value
+
+class SnapshotWriter:
+    def __init__(self, sprites):
+        self.data = bytearray()
+        self.paths = surface_paths()
+        self.table = []  # Asset paths of the surfaces written so far
+        self.surfaces = {}  # Surface id -> index into table
+        self.sprites = {id(sprite): i for i, sprite in enumerate(sprites)}
+        self.types = enemy_types()
+
+    def pack(self, fmt, *values):
+        self.data += fmt.pack(*values)
+
+    def surface(self, surface):
+        index = self.surfaces.get(id(surface))
+        if index is None:
+            if id(surface) not in self.paths:
+                raise ValueError(f"{surface} is not an asset surface and cannot be snapshotted")
+            index = self.surfaces[id(surface)] = len(self.table)
+            self.table.append(self.paths[id(surface)])
+        return index
+
+    def field(self, kind, value):
+        if kind == "image":
+            value = self.surface(value)
+        elif kind == "sprite":
+            value = self.sprites.get(id(value), -1)
+        elif kind == "enemy_type":
+            value = self.types.index(value)
+        elif kind == "n":
+            value = float(value)
+        if kind in ("rect", "pair"):
+            self.pack(SNAPSHOT_FIELDS[kind], *value)
+        else:
+            self.pack(SNAPSHOT_FIELDS[kind], value)
+
+    def record(self, fields, values):
+        for name, kind in fields:
+            if kind.endswith("?"):
+                present = name in values
+                self.pack(SNAPSHOT_FIELDS["b"], present)
+                if present:
+                    self.field(kind[:-1], values[name])
+            else:
+                self.field(kind, values[name])
+
+class SnapshotReader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+        self.table = []  # Resolved surfaces
+        self.sprites = []
+        self.types = enemy_types()
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def take(self, size):
+        self.pos += size
+        return self.data[self.pos - size:self.pos]
+
+    def field(self, kind):
+        values = self.unpack(SNAPSHOT_FIELDS[kind])
+        if kind == "rect":
+            return pygame.Rect(values)
+        if kind == "pair":
+            return values
+        value = values[0]
+        if kind == "image":
+            return self.table[value]
+        if kind == "sprite":
+            return self.sprites[value] if value >= 0 else None
+        if kind == "enemy_type":
+            return self.types[value]
+        if kind == "n" and value.is_integer():
+            return int(value)
+        return value
+
+    def record(self, fields):
+        values = {}
+        for name, kind in fields:
+            if kind.endswith("?"):
+                if self.field("b"):
+                    values[name] = self.field(kind[:-1])
+            else:
+                values[name] = self.field(kind)
+        return values
+
+def capture_snapshot():
+    return pack_snapshot(snapshot_payload())
+
+def pack_snapshot(payload):
+    return bytes([SNAPSHOT_VERSION]) + zlib.compress(payload)
+
+def snapshot_payload():
+    # The uncompressed snapshot. Call between ticks: the collision grid and
+    # target index are rebuilt every tick
+    groups = snapshot_groups()
+    sprites = [sprite for group in groups for sprite in group]
+    writer = SnapshotWriter(sprites)
+    writer.pack(SNAPSHOT_COUNT, len(groups))
+    for group in groups:
+        writer.pack(SNAPSHOT_COUNT, len(group))
+        writer.data += bytes(SNAPSHOT_CLASSES.index(type(sprite)) for sprite in group)
+    for sprite in sprites:
+        fields = SNAPSHOT_RECORDS[type(sprite)]
+        values = {name: value for name, value in vars(sprite).items() if not name.startswith("_Sprite")}
+        unknown = values.keys() - {name for name, kind in fields}
+        if unknown:
+            raise ValueError(f"{type(sprite).__name__} has fields missing from SNAPSHOT_RECORDS: {sorted(unknown)}")
+        writer.record(fields, values)
+    writer.record(SNAPSHOT_GLOBALS, globals())
+    # On an epoch boundary the next tick reseeds every stream, so their states are left out
+    streams = sim_tick % RNG_EPOCH_TICKS != 0
+    writer.pack(SNAPSHOT_RNG, rng.seed, getattr(rng, RNG_STREAMS[0]).getstate()[0], streams)
+    for name in RNG_STREAMS if streams else ():
+        version, words, gauss = getattr(rng, name).getstate()
+        writer.pack(SNAPSHOT_RNG_STREAM, *words, gauss is not None, gauss or 0.0)
+    # Only live slots are written; restored free slots are zeroed, as spawn() overwrites them
+    live = np.flatnonzero(projectiles.alive).astype(np.uint32)
+    free = np.array(projectiles.free, dtype=np.uint32)
+    for values in (projectiles.alive.size, free.size, live.size):
+        writer.pack(SNAPSHOT_COUNT, values)
+    writer.data += free.tobytes() + live.tobytes()
+    for name in PROJECTILE_ARRAYS:
+        writer.data += getattr(projectiles, name)[live].tobytes()
+    writer.pack(SNAPSHOT_COUNT, len(projectiles.images))
+    for image in projectiles.images:
+        writer.field("image", image)
+    # The surface table goes first, but is only complete once everything else is written
+    table = repr(writer.table).encode()
+    return SNAPSHOT_COUNT.pack(len(table)) + table + writer.data
+
+def restore_snapshot(snapshot):
+    global player
+    if not snapshot or snapshot[0] != SNAPSHOT_VERSION:
+        raise ValueError(f"unsupported snapshot version {snapshot[0] if snapshot else None}")
+    # Surface references resolve against the asset globals
+    asset_loader.require_all()
+    reader = SnapshotReader(zlib.decompress(snapshot[1:]))
+    size, = reader.unpack(SNAPSHOT_COUNT)
+    reader.table = [resolve_surface(path) for path in ast.literal_eval(reader.take(size).decode())]
+    group_count, = reader.unpack(SNAPSHOT_COUNT)
+    groups = snapshot_groups()
+    if group_count != len(groups):
+        raise ValueError(f"snapshot has {group_count} sprite groups, expected {len(groups)}")
+    # Every sprite exists before any record is read, so references can point forward
+    layout = []
+    for group in groups:
+        count, = reader.unpack(SNAPSHOT_COUNT)
+        created = []
+        for class_id in reader.take(count):
+            cls = SNAPSHOT_CLASSES[class_id]
+            sprite = cls.__new__(cls)
+            pygame.sprite.Sprite.__init__(sprite)
+            created.append(sprite)
+        layout.append(created)
+        reader.sprites.extend(created)
+    for sprite in reader.sprites:
+        vars(sprite).update(reader.record(SNAPSHOT_RECORDS[type(sprite)]))
+    globals().update(reader.record(SNAPSHOT_GLOBALS))
+    rng.seed, version, streams = reader.unpack(SNAPSHOT_RNG)
+    if not streams:
+        rng.start_epoch(sim_tick)
+    for name in RNG_STREAMS if streams else ():
+        *words, has_gauss, gauss = reader.unpack(SNAPSHOT_RNG_STREAM)
+        getattr(rng, name).setstate((version, tuple(words), gauss if has_gauss else None))
+    for group, created in zip(groups, layout):
+        group.empty()
+        group.add(*created)
+    player = player_group.sprite
+
+    capacity, free_count, live_count = (reader.unpack(SNAPSHOT_COUNT)[0] for _ in range(3))
+    free = np.frombuffer(reader.take(4 * free_count), dtype=np.uint32)
+    live = np.frombuffer(reader.take(4 * live_count), dtype=np.uint32)
+    for name in PROJECTILE_ARRAYS:
+        dtype = getattr(projectiles, name).dtype
+        array = np.zeros(capacity, dtype=dtype)
+        array[live] = np.frombuffer(reader.take(dtype.itemsize * live_count), dtype=dtype)
+        setattr(projectiles, name, array)
+    projectiles.alive = np.zeros(capacity, dtype=bool)
+    projectiles.alive[live] = True
+    projectiles.free = free.tolist()
+    image_count, = reader.unpack(SNAPSHOT_COUNT)
+    projectiles.images = [reader.field("image") for _ in range(image_count)]
+    projectiles.image_ids = {image: i for i, image in enumerate(projectiles.images)}
+    target_index.clear()
+
+# Suspended games: quitting mid-run (closing the window, or Quit in the pause
+# menu) writes the game state to SAVE_PATH, and the main menu offers to
+# continue it on the next start. The running game is also saved every
+# AUTOSAVE_TICKS, so a cabinet that loses power resumes close to where it was.
+# The file is SAVE_MAGIC followed by a snapshot, which carries its own version.
+# Only capturing the state happens on the game thread; compressing and writing
+# it, and removing the file, run on one writer thread in the order they were
+# asked for, so an autosave never stalls a frame.
+SAVE_MAGIC = b"SFSV"
+SAVE_PATH = command_line_value("--save", "STAR_FIGHTER_SAVE") or "suspended_game.sav"
+AUTOSAVE_TICKS = 10 * FPS
+save_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save-writer")
+save_queued = None  # The last write or removal handed to save_writer
+
+def queue_save_work(task, *args):
+    global save_queued
+    save_queued = save_writer.submit(task, *args)
+
+def finish_saves():
+    # Waits for queued writes and removals to reach the disk
+    if save_queued is not None:
+        save_queued.result()
+
+def save_game():
+    queue_save_work(write_saved_game, snapshot_payload())
+
+def write_saved_game(payload):
+    # Writer thread
+    data = SAVE_MAGIC + pack_snapshot(payload)
+    try:
+        # Written aside, synced and renamed, so a crash or power cut never leaves half a save
+        with open(SAVE_PATH + ".tmp", "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(SAVE_PATH + ".tmp", SAVE_PATH)
+    except OSError as e:
+        if DEBUG_PRINT:
+            print(f"Error saving game: {e}")
+
+def load_saved_game():
+    # The suspended game's snapshot, or None when there is no usable one
+    finish_saves()
+    try:
+        with open(SAVE_PATH, "rb") as file:
+            data = file.read()
+    except OSError:
+        return None
+    snapshot = data[len(SAVE_MAGIC):]
+    if not data.startswith(SAVE_MAGIC) or not snapshot or snapshot[0] != SNAPSHOT_VERSION:
+        if DEBUG_PRINT:
+            print(f"Ignoring {SAVE_PATH}: not a saved game of this version")
+        return None
+    return snapshot
+
+def discard_saved_game():
+    queue_save_work(remove_saved_game)
+
+def remove_saved_game():
+    # Writer thread
+    try:
+        os.remove(SAVE_PATH)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        if DEBUG_PRINT:
+            print(f"Error removing saved game: {e}")
+
+def seek_replay(replay, tick):
+    # Puts the simulation where the replay was after `tick` ticks, restoring the
+    # nearest earlier keyframe. Returns the tick reached and whether the game
+    # ended on the way.
+    global game_started
+    start = max((t for t in replay.keyframe_ticks() if t <= tick), default=0)
+    if start:
+        restore_snapshot(replay.keyframe(start))
+    else:
+        reset_game(PLAYER_IMGS[replay.ship], replay.seed)
+        game_started = False
+    for reached, mask in enumerate(replay.ticks[start:tick], start + 1):
+        names, mash_shots = unpack_input(mask)
+        if update_game(ScriptedKeys(INPUT_KEYS[name] for name in names), mash_shots) == "game_over":
+            return reached, True
+    return min(tick, len(replay.ticks)), False
+
+def game_state():
+    return {
+        "score": score,
+        "level": level,
+        "wave": wave,
+        "max_waves": max_waves,
+        "boss_spawned": boss_spawned,
+        "boss_health": boss_group.sprites()[0].health if boss_group else None,
+        "player_health": player.health,
+        "player_lives": player.lives,
+        "bomb_count": player.bomb_count,
+        "enemies": len(enemies),
+        "asteroids": len(asteroids),
+        "bullets": len(bullets),
+        "missiles": len(missiles),
+        "boss_bullets": projectiles.count(KIND_BOSS_BULLET),
+        "enemy_bullets": projectiles.count(KIND_ENEMY_BULLET),
+        "bombs": projectiles.count(KIND_BOMB),
+        "artillery_shells": len(artillery_shells),
+    }
+
+class HeadlessGame:
+    # Runs the GameplayScene simulation without a display, one tick per step() call.
+    # Inputs are iterables of INPUT_KEYS names held during that tick; unless
+    # mash_shots is given, SPACE counts as pressed when it was not held on the
+    # previous tick.
+    def __init__(self, ship=0, seed=RUN_SEED):
+        self.ship = ship
+        asset_loader.require_all()
+        self.reset(seed)
+
+    def reset(self, seed=RUN_SEED):
+        global game_started
+        reset_game(PLAYER_IMGS[self.ship], seed)
+        self.seed = rng.seed
+        game_started = False
+        self.tick = 0
+        self.game_over = False
+        self.held = frozenset()
+
+    def step(self, inputs=(), mash_shots=None):
+        self.advance(inputs, mash_shots)
+        return self.state()
+
+    def advance(self, inputs=(), mash_shots=None):
+        # step() without building the state dict, for long runs that only need the end state
+        held = frozenset(INPUT_KEYS[name] for name in inputs)
+        if mash_shots is None:
+            mash_shots = 1 if pygame.K_SPACE in held and pygame.K_SPACE not in self.held else 0
+        self.held = held
+        if not self.game_over:
+            # Drain the dummy driver's queue so SDL never fills up during long runs
+            pygame.event.pump()
+            self.game_over = update_game(ScriptedKeys(held), mash_shots) == "game_over"
+            self.tick += 1
+
+    def state(self):
+        state = game_state()
+        state["tick"] = self.tick
+        state["game_over"] = self.game_over
+        return state
+
+    def seek(self, replay, tick):
+        self.tick, self.game_over = seek_replay(replay, tick)
+        self.held = frozenset()
+
+    def run(self, frames, inputs=()):
+        for _ in range(frames):
+            self.advance(inputs)
+            if self.game_over:
+                break
+        return self.state()
+
+def soak_inputs(tick):
+    # Sweeps the ship left and right every second while tapping fire, missiles and bombs
+    direction = "left" if (tick // 60) % 2 else "right"
+    return (direction, "space", "m") if tick % 2 == 0 else (direction, "m", "b")
+
+# Headless soak test: runs soak_inputs for the given number of ticks
+def run_headless(frames=36000, ship=0, seed=RUN_SEED):
+    game = HeadlessGame(ship, seed)
+    start = pygame.time.get_ticks()
+    for tick in range(frames):
+        game.advance(soak_inputs(tick))
+        if game.game_over:
+            break
+    elapsed = max(1, pygame.time.get_ticks() - start)
+    state = game.state()
+    print(f"Simulated {game.tick} ticks in {elapsed}ms ({game.tick * 1000 / elapsed / FPS:.1f}x real time, seed {game.seed})")
+    print("Pooled sprites allocated: " + ", ".join(f"{cls.__name__} {cls.allocated}" for cls in PooledSprite.__subclasses__()))
+    print(state)
+    return state
+
+# Plays a replay back through the simulation as fast as possible
+def run_replay(path):
+    replay = load_replay(path)
+    game = HeadlessGame(replay.ship, replay.seed)
+    if REPLAY_SEEK:
+        start = pygame.time.get_ticks()
+        game.seek(replay, REPLAY_SEEK)
+        print(f"Seeked to tick {game.tick} in {pygame.time.get_ticks() - start}ms")
+    start = pygame.time.get_ticks()
+    first_tick = game.tick
+    for mask in replay.ticks[game.tick:]:
+        game.advance(*unpack_input(mask))
+        if game.game_over:
+            break
+    elapsed = max(1, pygame.time.get_ticks() - start)
+    state = game.state()
+    print(f"Replayed {game.tick - first_tick} ticks in {elapsed}ms ({(game.tick - first_tick) * 1000 / elapsed / FPS:.1f}x real time, seed {game.seed})")
+    print(state)
+    return state
+
+# Benchmarks: fixed, seeded scenarios run headless (--benchmark [TICKS]),
+# timing the world update, the collision block and the draw of every tick
+# separately. Results are printed as JSON, or written to --benchmark-out=PATH,
+# so they can be compared from release to release. A scenario's setup builds
+# its load once and its refill tops it back up before each tick, outside the
+# timed phases, so every tick measures the same load.
+BENCHMARK_SEED = 1
+BENCHMARK_TICKS = 600
+BENCHMARK_WARMUP_TICKS = 30  # Untimed, so one-off costs like building projectile images stay out of the results
+BENCHMARK_OUT = command_line_value("--benchmark-out", "STAR_FIGHTER_BENCHMARK_OUT")
+
+def benchmark_arena(level_number, static_background=False):
+    # A new game at the given level with wave progression held: no enemy,
+    # asteroid or boss spawns, so only the scenario's sprites are in play.
+    # Scenarios pick the background scroll themselves, whatever the command line says.
+    global level, max_waves, base_enemies, enemies_per_wave, enemies_spawned, boss_spawned, max_asteroids, BG_SCROLL_SPEED
+    reset_game(PLAYER_IMGS[0], BENCHMARK_SEED)
+    BG_SCROLL_SPEED = 0 if static_background else BG_SCROLL_PIXELS
+    level = level_number
+    max_waves = min(10, 6 + level - 1)
+    base_enemies = 3 + level
+    enemies_per_wave = enemies_spawned = math.ceil(base_enemies * 0.5)
+    max_asteroids = max(5, min(8, level - 1)) if level >= 2 else 0
+    boss_spawned = True
+
+def scatter(sprite):
+    # Places a sprite anywhere in the upper two thirds of the screen
+    sprite.rect.center = (rng.spawn.randint(20, WIDTH - 20), rng.spawn.randint(60, HEIGHT * 2 // 3))
+    return sprite
+
+def top_up(group, count, make):
+    while len(group) < count:
+        group.add(make())
+
+def add_falling_bullet(y):
+    projectiles.add_enemy_bullet(rng.spawn.randint(0, WIDTH), y, angle=rng.spawn.uniform(60, 120))
+
+def setup_boss_barrage():
+    benchmark_arena(5)
+    boss = Boss()
+    boss.rect.top = 50
+    boss_group.add(boss)
+    for _ in range(500):
+        add_falling_bullet(rng.spawn.randint(0, HEIGHT))
+    refill_boss_barrage()
+
+def refill_boss_barrage():
+    for boss in boss_group:
+        boss.health = boss.max_health // 4  # Phase 3: fastest fire, plus bombs
+    for _ in range(500 - projectiles.count(KIND_ENEMY_BULLET)):
+        add_falling_bullet(0)
+
+def setup_leeches():
+    benchmark_arena(5)
+    top_up(enemies, 50, lambda: scatter(Enemy(5)))
+
+def refill_leeches():
+    top_up(enemies, 50, lambda: Enemy(5))
+
+def setup_missile_swarm():
+    benchmark_arena(3)
+    refill_missile_swarm()
+
+def refill_missile_swarm():
+    top_up(enemies, 60, lambda: scatter(Enemy(0)))
+    top_up(asteroids, 40, lambda: scatter(Asteroid()))
+    top_up(missiles, 20, lambda: Missile.acquire(rng.spawn.randint(20, WIDTH - 20), HEIGHT - 100))
+
+def setup_level_ten_wave(static_background=False):
+    # A real wave: enemies and asteroids spawn as they would in play
+    global wave, enemies_per_wave, enemies_spawned, boss_spawned
+    benchmark_arena(10, static_background)
+    wave = 5
+    enemies_per_wave = math.ceil(base_enemies * 1.5)
+    enemies_spawned = 0
+    boss_spawned = False
+    for _ in range(max_asteroids):
+        asteroids.add(scatter(Asteroid()))
+
+def refill_level_ten_wave():
+    # Holds the wave open so enemies keep spawning at the normal rate, and
+    # replaces destroyed asteroids straight away
+    global enemies_spawned
+    enemies_spawned = 0
+    top_up(asteroids, max_asteroids, lambda: scatter(Asteroid()))
+
+BENCHMARK_SCENARIOS = (
+    ("boss_phase3_500_bullets", setup_boss_barrage, refill_boss_barrage),
+    ("leeches_50", setup_leeches, refill_leeches),
+    ("missiles_20_on_100_targets", setup_missile_swarm, refill_missile_swarm),
+    ("level_10_wave_asteroids", setup_level_ten_wave, refill_level_ten_wave),
+    # The same wave over a still background, so draws go through DirtyRenderer's partial path
+    ("level_10_wave_static_background", lambda: setup_level_ten_wave(static_background=True), refill_level_ten_wave),
+)
+
+def timing_summary(samples):
+    ms = np.array(samples, dtype=np.float64) / 1e6
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99)).tolist()
+    return {"mean": round(float(ms.mean()), 4), "p50": round(p50, 4), "p95": round(p95, 4), "p99": round(p99, 4), "max": round(float(ms.max()), 4)}
+
+def run_benchmark_scenario(setup, refill, ticks):
+    setup()
+    dirty_renderer.last_present = -1
+    timings = {"update": [], "collision": [], "draw": []}
+    partial_frames = 0
+    allocated = {cls.__name__: cls.allocated for cls in PooledSprite.__subclasses__()}
+    held = frozenset()
+    for tick in range(BENCHMARK_WARMUP_TICKS + ticks):
+        refill()
+        # A lost life would clear the scenario's sprites
+        player.health = 100
+        player.lives = 3
+        keys = frozenset(INPUT_KEYS[name] for name in soak_inputs(tick))
+        mash_shots = 1 if pygame.K_SPACE in keys and pygame.K_SPACE not in held else 0
+        held = keys
+        pygame.event.pump()
+        start = time.perf_counter_ns()
+        update_world(ScriptedKeys(keys), mash_shots)
+        moved = time.perf_counter_ns()
+        resolve_collisions()
+        collided = time.perf_counter_ns()
+        update_projectiles()
+        updated = time.perf_counter_ns()
+        rects = draw_game()
+        dirty_renderer.present(rects)
+        drawn = time.perf_counter_ns()
+        if tick >= BENCHMARK_WARMUP_TICKS:
+            timings["update"].append(moved - start + updated - collided)
+            timings["collision"].append(collided - moved)
+            timings["draw"].append(drawn - updated)
+            partial_frames += rects is not None
+    result = {phase: timing_summary(samples) for phase, samples in timings.items()}
+    result["partial_frames"] = partial_frames  # Frames drawn and presented as dirty rects only
+    # Pooled sprites created rather than reused during the scenario
+    result["pooled_allocations"] = {cls.__name__: cls.allocated - allocated[cls.__name__] for cls in PooledSprite.__subclasses__()}
+    result["final_state"] = game_state()
+    return result
+
+def run_benchmarks(ticks=BENCHMARK_TICKS):
+    asset_loader.require_all()
+    results = {
+        "ticks": ticks,
+        "seed": BENCHMARK_SEED,
+        "python": sys.version.split()[0],
+        "pygame": pygame.version.ver,
+        "scenarios": {name: run_benchmark_scenario(setup, refill, ticks) for name, setup, refill in BENCHMARK_SCENARIOS},
+    }
+    report = json.dumps(results, indent=2)
+    if BENCHMARK_OUT:
+        with open(BENCHMARK_OUT, "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+    return results
 
 # Main execution
 if __name__ == "__main__":
-    start_screen()
-    while True:
-        choice = main_menu()
-        if choice == "new_game":
-            selected_ship = ship_selection_menu()
-            if selected_ship == "main_menu":
-                continue
-            elif selected_ship:
-                result = run_game(selected_ship)
-                if result == "main_menu":
-                    continue
-                elif result == "quit":
-                    pygame.quit()
-                    sys.exit()
-        elif choice == "quit":
-            pygame.quit()
-            sys.exit()
+    if HEADLESS:
+        ticks = next((int(arg) for arg in sys.argv[1:] if arg.isdigit()), None)
+        if BENCHMARK:
+            run_benchmarks(ticks or BENCHMARK_TICKS)
+        elif REPLAY_PATH:
+            run_replay(REPLAY_PATH)
+        else:
+            run_headless(ticks or 36000)
+        pygame.quit()
+        sys.exit()
+    main()